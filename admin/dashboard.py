@@ -1,6 +1,7 @@
 import streamlit as st
 from functions.f_read import get_expense_statistics, get_recent_expenses, get_all_users
-from functions.f_read import get_pending_expenses, get_approved_expenses, get_paid_expenses
+from functions.f_read import get_pending_expenses, get_approved_expenses, get_paid_expenses, get_review_queue
+from functions.f_money import format_money
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
@@ -23,7 +24,7 @@ with col1:
 with col2:
     st.metric(
         label="Total Monto",
-        value=f"${stats.get('total_amount', 0):,.2f}",
+        value=format_money(stats.get('total_amount_cents', 0)),
         delta=None
     )
 
@@ -61,6 +62,17 @@ if sum(status_data.values()) > 0:
     )
     st.plotly_chart(fig_pie, use_container_width=True)
 
+# Head of the approval queue
+st.markdown("---")
+st.subheader("Próximos a Revisar")
+
+review_queue = get_review_queue('Creado', 5)
+if review_queue:
+    for expense in review_queue:
+        st.write(f"**{expense.get('priority', 'Media')}** · ${expense['amount']:.2f} - {expense['description']} ({expense['created_at'][:10]})")
+else:
+    st.info("No hay gastos pendientes de revisión.")
+
 # Recent expenses
 st.markdown("---")
 st.subheader("Gastos Recientes")
@@ -1,6 +1,9 @@
 import streamlit as st
 from functions.f_read import get_expense_statistics, get_all_expenses, get_expenses_by_status
-from functions.f_read import get_expenses_by_date_range, get_users_by_role
+from functions.f_read import get_expenses_by_date_range, get_users_by_role, get_all_users, get_user_names, get_categories
+from functions.f_analytics import get_lead_time_percentiles, lead_time_percentiles
+from functions.f_frame import ExpenseFrame
+from functions.f_money import format_money, mean_cents
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
@@ -50,8 +53,13 @@ else:  # Personalizado
 # Get expenses for the period
 period_expenses = get_expenses_by_date_range(
     start_date.strftime("%Y-%m-%d"),
-    end_date.strftime("%Y-%m-%d")
+    end_date.strftime("%Y-%m-%d"),
+    include_archived=True,
+    with_categories=True
 )
+# Columnar copy for the aggregations below
+category_names = {c['id']: c['description'] for c in get_categories()}
+frame = ExpenseFrame.from_rows(period_expenses, category_names)
 
 # Summary metrics
 st.subheader("Métricas Principales")
@@ -59,33 +67,30 @@ st.subheader("Métricas Principales")
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_amount = sum(e['amount'] for e in period_expenses)
     st.metric(
         label="Total Gastos",
-        value=f"${total_amount:,.2f}",
+        value=format_money(frame.total_cents()),
         delta=None
     )
 
 with col2:
-    avg_amount = total_amount / len(period_expenses) if period_expenses else 0
     st.metric(
         label="Promedio",
-        value=f"${avg_amount:,.2f}",
+        value=format_money(frame.mean_cents()),
         delta=None
     )
 
 with col3:
     st.metric(
         label="Cantidad",
-        value=len(period_expenses),
+        value=len(frame),
         delta=None
     )
 
 with col4:
-    pending_count = len([e for e in period_expenses if e['phase'] == 'Creado'])
     st.metric(
         label="Pendientes",
-        value=pending_count,
+        value=len(frame.filter(phase='Creado')),
         delta=None
     )
 
@@ -94,106 +99,107 @@ st.markdown("---")
 st.subheader("Gráficos")
 
 # Status distribution
-if period_expenses:
-    status_counts = {}
-    for expense in period_expenses:
-        status = expense['phase']
-        status_counts[status] = status_counts.get(status, 0) + 1
+if len(frame):
+    status_counts = frame.count_by('phase')
     
-    if status_counts:
+    if not status_counts.empty:
         fig_pie = px.pie(
-            values=list(status_counts.values()),
-            names=list(status_counts.keys()),
+            values=status_counts.values,
+            names=status_counts.index.astype(str),
             title="Distribución por Estado"
         )
         st.plotly_chart(fig_pie, use_container_width=True)
 
 # Monthly trend
-if period_expenses:
-    # Group by month
-    monthly_data = {}
-    for expense in period_expenses:
-        month = expense['created_at'][:7]  # YYYY-MM
-        if month not in monthly_data:
-            monthly_data[month] = {'amount': 0, 'count': 0}
-        monthly_data[month]['amount'] += expense['amount']
-        monthly_data[month]['count'] += 1
+if len(frame):
+    monthly_data = frame.resample('MS')
+    months = monthly_data.index.strftime('%Y-%m')
     
-    if monthly_data:
-        months = sorted(monthly_data.keys())
-        amounts = [monthly_data[m]['amount'] for m in months]
-        counts = [monthly_data[m]['count'] for m in months]
-        
-        # Amount trend
-        fig_amount = px.line(
-            x=months,
-            y=amounts,
-            title="Tendencia de Montos por Mes",
-            labels={'x': 'Mes', 'y': 'Monto ($)'}
-        )
-        st.plotly_chart(fig_amount, use_container_width=True)
-        
-        # Count trend
-        fig_count = px.bar(
-            x=months,
-            y=counts,
-            title="Cantidad de Gastos por Mes",
-            labels={'x': 'Mes', 'y': 'Cantidad'}
-        )
-        st.plotly_chart(fig_count, use_container_width=True)
+    # Amount trend
+    fig_amount = px.line(
+        x=months,
+        y=monthly_data['amount'],
+        title="Tendencia de Montos por Mes",
+        labels={'x': 'Mes', 'y': 'Monto ($)'}
+    )
+    st.plotly_chart(fig_amount, use_container_width=True)
+    
+    # Count trend
+    fig_count = px.bar(
+        x=months,
+        y=monthly_data['count'],
+        title="Cantidad de Gastos por Mes",
+        labels={'x': 'Mes', 'y': 'Cantidad'}
+    )
+    st.plotly_chart(fig_count, use_container_width=True)
 
 # Category analysis
-if period_expenses:
-    category_data = {}
-    for expense in period_expenses:
-        category = expense.get('category', 'Sin categoría')
-        if category not in category_data:
-            category_data[category] = {'amount': 0, 'count': 0}
-        category_data[category]['amount'] += expense['amount']
-        category_data[category]['count'] += 1
+if len(frame):
+    # An expense with several categories counts in each of them
+    category_data = frame.sum_by_category()
     
-    if category_data:
-        categories = list(category_data.keys())
-        amounts = [category_data[c]['amount'] for c in categories]
-        counts = [category_data[c]['count'] for c in categories]
-        
-        # Category amount chart
-        fig_category_amount = px.bar(
-            x=categories,
-            y=amounts,
-            title="Monto por Categoría",
-            labels={'x': 'Categoría', 'y': 'Monto ($)'}
-        )
-        st.plotly_chart(fig_category_amount, use_container_width=True)
+    # Category amount chart
+    fig_category_amount = px.bar(
+        x=category_data.index.astype(str),
+        y=category_data['amount'],
+        title="Monto por Categoría",
+        labels={'x': 'Categoría', 'y': 'Monto ($)'}
+    )
+    st.plotly_chart(fig_category_amount, use_container_width=True)
+
+# Lead times
+st.markdown("---")
+st.subheader("⏱️ Tiempos de Aprobación y Pago")
+
+group_labels = {"Mes": "month", "Categoría": "category", "Aprobador": "approver"}
+group_label = st.selectbox("Agrupar por", list(group_labels.keys()))
+
+# Percentiles are computed in the database; only one row per group comes back
+lead_time_rows = get_lead_time_percentiles(
+    start_date.strftime("%Y-%m-%d"),
+    (end_date + timedelta(days=1)).strftime("%Y-%m-%d"),
+    group_labels[group_label]
+)
+
+if lead_time_rows:
+    percentiles_df = lead_time_percentiles(lead_time_rows)
+    if group_labels[group_label] == "approver":
+        user_names = {u['id']: u['name'] for u in get_all_users()}
+        percentiles_df['group_key'] = percentiles_df['group_key'].map(lambda uid: user_names.get(uid, uid))
+
+    st.dataframe(
+        percentiles_df.rename(columns={
+            'group_key': group_label,
+            'expenses': 'Gastos',
+            'approval_p50': 'Aprobación p50 (h)',
+            'approval_p90': 'Aprobación p90 (h)',
+            'approval_p99': 'Aprobación p99 (h)',
+            'payment_p50': 'Pago p50 (h)',
+            'payment_p90': 'Pago p90 (h)',
+            'payment_p99': 'Pago p99 (h)'
+        }).round(1),
+        hide_index=True,
+        use_container_width=True
+    )
+else:
+    st.info("No hay transiciones registradas para el período seleccionado.")
 
 # User analysis
 st.markdown("---")
 st.subheader("👥 Análisis por Usuario")
 
-# Get all users with expenses
-user_expenses = {}
-for expense in period_expenses:
-    user_id = expense['user_id']
-    if user_id not in user_expenses:
-        user_expenses[user_id] = {'amount': 0, 'count': 0}
-    user_expenses[user_id]['amount'] += expense['amount']
-    user_expenses[user_id]['count'] += 1
+user_data = frame.sum_by('requester_id')
 
-if user_expenses:
+if not user_data.empty:
     # Create user summary table
-    user_summary = []
-    for user_id, data in user_expenses.items():
-        # Get user name (you'll need to implement this)
-        user_name = f"Usuario {user_id}"  # Placeholder
-        user_summary.append({
-            'Usuario': user_name,
-            'Total Gastos': data['count'],
-            'Monto Total': f"${data['amount']:,.2f}",
-            'Promedio': f"${data['amount']/data['count']:,.2f}" if data['count'] > 0 else "$0.00"
-        })
-    
-    df = pd.DataFrame(user_summary)
-    st.dataframe(df, use_container_width=True)
+    user_names = get_user_names(list(user_data.index))
+    df = pd.DataFrame({
+        'Usuario': [user_names.get(user_id, f"Usuario {user_id}") for user_id in user_data.index],
+        'Total Gastos': user_data['count'].to_numpy(),
+        'Monto Total': [format_money(cents) for cents in user_data['amount_cents']],
+        'Promedio': [format_money(mean_cents(cents, count)) for cents, count in zip(user_data['amount_cents'], user_data['count'])]
+    })
+    st.dataframe(df, use_container_width=True, hide_index=True)
 
 # Export functionality
 st.markdown("---")
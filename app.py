@@ -3,6 +3,7 @@ import os
 from dotenv import load_dotenv
 from functions.f_cud import send_otp_email, verify_otp, get_user_roles
 from functions.f_read import get_user_by_email
+from functions.f_working_set import reset_working_set
 import time
 
 # Load environment variables
@@ -112,6 +113,8 @@ def main_app():
     # User info and logout in sidebar
     st.sidebar.markdown(f"**Usuario:** {user['name']}")
     if st.sidebar.button("Cerrar Sesión"):
+        # Loaded expense lists belong to the previous user's roles
+        reset_working_set()
         st.session_state.user = None
         st.session_state.user_roles = []
         st.session_state.otp_sent = False
@@ -1,7 +1,10 @@
 import streamlit as st
-from functions.f_read import get_pending_expenses, get_user_by_id
-from functions.f_cud import approve_expense, reject_expense
-from datetime import datetime
+from functions.f_read import ExpenseQuery, get_categories
+from functions.f_cud import approve_expense, reject_expense, get_claimed_batch, release_expenses, batch_released
+from functions.f_components import show_expense_detail, show_expense_table
+from functions.f_working_set import get_working_set
+from functions.f_records import expense_records
+from functions.f_money import sum_cents, format_money
 
 st.subheader("Gastos Pendientes")
 
@@ -12,18 +15,35 @@ if not user:
     st.error("❌ No hay usuario autenticado.")
     st.stop()
 
-# Get pending expenses
-pending_expenses = get_pending_expenses()
+# Work mode: claim a personal batch so approvers don't open the same expenses
+col1, col2, col3 = st.columns([2, 1, 1])
+
+with col1:
+    view_mode = st.radio("📥 Vista", ["Mi lote", "Todos"], horizontal=True)
+
+with col2:
+    batch_size = st.number_input("Tamaño del lote", min_value=1, max_value=50, value=5, step=1)
+
+take_batch = False
+with col3:
+    if view_mode == "Mi lote":
+        if batch_released('Creado'):
+            take_batch = st.button("📥 Tomar lote")
+        elif st.button("↩️ Liberar lote"):
+            release_expenses(user['id'], 'Creado')
+            st.rerun()
 
 # Filters
 st.subheader("🔍 Filtros")
 
+categories = {c['description']: c['id'] for c in get_categories()}
+
 col1, col2, col3 = st.columns(3)
 
 with col1:
     category_filter = st.selectbox(
         "📂 Categoría",
-        ["Todas", "Alimentación", "Transporte", "Hospedaje", "Materiales", "Equipamiento", "Servicios", "Otros"]
+        ["Todas"] + list(categories)
     )
 
 with col2:
@@ -41,20 +61,29 @@ with col3:
         step=100.0
     )
 
-# Filter expenses
-filtered_expenses = pending_expenses
-
-if category_filter != "Todas":
-    filtered_expenses = [e for e in filtered_expenses if e.get('category') == category_filter]
-
-if priority_filter != "Todas":
-    filtered_expenses = [e for e in filtered_expenses if e.get('priority') == priority_filter]
-
-filtered_expenses = [e for e in filtered_expenses if amount_range[0] <= e['amount'] <= amount_range[1]]
+# Filters are applied by the database: most urgent, then oldest first
+query = (ExpenseQuery()
+         .phase('Creado')
+         .category_in([categories[category_filter]] if category_filter != "Todas" else [])
+         .priority_in([priority_filter] if priority_filter != "Todas" else [])
+         .amount_between(*amount_range)
+         .order_by('priority_rank', desc=True)
+         .order_by('created_at'))
+
+if view_mode == "Mi lote":
+    # Claim (a database write) only when returning to "Mi lote" or taking a new batch; other reruns
+    # reuse the session's batch
+    claimed_ids = get_claimed_batch(user['id'], 'Creado', int(batch_size),
+                                    refresh=take_batch or st.session_state.get('pending_view_mode') != "Mi lote")
+    filtered_expenses = expense_records(query.ids(claimed_ids).fetch()) if claimed_ids else []
+else:
+    # Loaded once per session and patched by each approval/rejection
+    filtered_expenses = get_working_set(query)
+st.session_state.pending_view_mode = view_mode
 
 # Summary metrics
 if filtered_expenses:
-    total_amount = sum(e['amount'] for e in filtered_expenses)
+    total_cents = sum_cents(e['amount'] for e in filtered_expenses)
     urgent_count = len([e for e in filtered_expenses if e.get('priority') == 'Urgente'])
     high_count = len([e for e in filtered_expenses if e.get('priority') == 'Alta'])
     
@@ -64,7 +93,7 @@ if filtered_expenses:
         st.metric("📋 Total Pendientes", len(filtered_expenses))
     
     with col2:
-        st.metric("💰 Monto Total", f"${total_amount:,.2f}")
+        st.metric("💰 Monto Total", format_money(total_cents))
     
     with col3:
         st.metric("🚨 Urgentes", urgent_count)
@@ -75,67 +104,39 @@ if filtered_expenses:
 # Display expenses
 st.subheader(f"📋 Gastos Pendientes ({len(filtered_expenses)})")
 
-if filtered_expenses:
-    # Sort by priority and creation date
-    priority_order = {"Urgente": 4, "Alta": 3, "Media": 2, "Baja": 1}
-    filtered_expenses.sort(key=lambda x: (priority_order.get(x.get('priority', 'Media'), 0), x['created_at']), reverse=True)
+@st.fragment
+def review_panel(expenses):
+    """Grid, row actions and confirm forms; clicks rerun only this fragment, not the page"""
+    # A new key clears the grid selection once the selected row has left the list
+    table_version = st.session_state.get('pending_table_version', 0)
+    selected_id = show_expense_table(expenses, key=f"pending_expenses_table_{table_version}")
+    expense = next((e for e in expenses if e['id'] == selected_id), None)
     
-    for expense in filtered_expenses:
-        # Get requester info
-        requester = get_user_by_id(expense['user_id'])
-        requester_name = requester['name'] if requester else 'Usuario Desconocido'
-        
-        # Priority color
-        priority_colors = {
-            'Urgente': '🔴',
-            'Alta': '🟠',
-            'Media': '🟡',
-            'Baja': '🟢'
-        }
-        
-        priority_icon = priority_colors.get(expense.get('priority', 'Media'), '⚪')
-        
-        with st.expander(f"{priority_icon} ${expense['amount']:.2f} - {expense['description']} (por {requester_name})"):
-            col1, col2, col3 = st.columns([2, 2, 1])
-            
-            with col1:
-                st.write(f"**ID:** {expense['id']}")
-                st.write(f"**Solicitante:** {requester_name}")
-                st.write(f"**Descripción:** {expense['description']}")
-                st.write(f"**Categoría:** {expense.get('category', 'N/A')}")
-                st.write(f"**Fecha de gasto:** {expense.get('expense_date', expense['created_at'][:10])}")
-            
-            with col2:
-                st.write(f"**Monto:** ${expense['amount']:.2f}")
-                st.write(f"**Prioridad:** {expense.get('priority', 'N/A')}")
-                st.write(f"**Proveedor:** {expense.get('vendor', 'N/A')}")
-                st.write(f"**Método de pago:** {expense.get('payment_method', 'N/A')}")
-                st.write(f"**Solicitado:** {expense['created_at'][:10]}")
-            
-            with col3:
-                # Approval actions
-                if st.button("✅ Aprobar", key=f"approve_{expense['id']}"):
-                    st.session_state.approve_expense = expense
-                    st.rerun()
-                
-                if st.button("❌ Rechazar", key=f"reject_{expense['id']}"):
-                    st.session_state.reject_expense = expense
-                    st.rerun()
-                
-                if st.button("👁️ Ver Detalles", key=f"view_{expense['id']}"):
-                    st.session_state.view_expense = expense
-                    st.rerun()
-            
-            # Show comments if any
-            if expense.get('comments'):
-                st.markdown("---")
-                st.write("**💬 Comentarios del solicitante:**")
-                st.write(expense['comments'])
+    if not expense:
+        return
+    
+    col1, col2, col3 = st.columns([1, 1, 3])
+    
+    with col1:
+        if st.button("✅ Aprobar", key=f"approve_{expense['id']}"):
+            st.session_state.pending_action = ('approve', expense['id'])
+    
+    with col2:
+        if st.button("❌ Rechazar", key=f"reject_{expense['id']}"):
+            st.session_state.pending_action = ('reject', expense['id'])
+    
+    action, action_id = st.session_state.get('pending_action', (None, None))
+    
+    def finish(message):
+        # The expense has left the Creado phase: drop it from the list in place
+        expenses.remove(expense)
+        st.session_state.pop('pending_action', None)
+        st.session_state.pending_table_version = table_version + 1
+        st.toast(message)
+        st.rerun(scope="fragment")
     
     # Approval form
-    if 'approve_expense' in st.session_state:
-        expense = st.session_state.approve_expense
-        
+    if action == 'approve' and action_id == expense['id']:
         st.markdown("---")
         st.subheader("✅ Aprobar Gasto")
         
@@ -151,20 +152,18 @@ if filtered_expenses:
             with col1:
                 submitted = st.form_submit_button("✅ Confirmar Aprobación")
             with col2:
-                if st.form_submit_button("❌ Cancelar"):
-                    del st.session_state.approve_expense
-                    st.rerun()
+                cancelled = st.form_submit_button("❌ Cancelar")
+            
+            if cancelled:
+                del st.session_state.pending_action
+                st.rerun(scope="fragment")
             
             if submitted:
-                if approve_expense(expense['id'], user['id'], comments):
-                    st.success("✅ Gasto aprobado exitosamente!")
-                    del st.session_state.approve_expense
-                    st.rerun()
+                if approve_expense(expense['id'], user['id'], comments, expense.get('updated_at')):
+                    finish("✅ Gasto aprobado exitosamente!")
     
     # Rejection form
-    if 'reject_expense' in st.session_state:
-        expense = st.session_state.reject_expense
-        
+    if action == 'reject' and action_id == expense['id']:
         st.markdown("---")
         st.subheader("❌ Rechazar Gasto")
         
@@ -173,61 +172,36 @@ if filtered_expenses:
             
             comments = st.text_area(
                 "💬 Motivo del rechazo",
-                placeholder="Explica por qué se rechaza este gasto...",
-                required=True
+                placeholder="Explica por qué se rechaza este gasto..."
             )
             
             col1, col2 = st.columns(2)
             with col1:
                 submitted = st.form_submit_button("❌ Confirmar Rechazo")
             with col2:
-                if st.form_submit_button("❌ Cancelar"):
-                    del st.session_state.reject_expense
-                    st.rerun()
+                cancelled = st.form_submit_button("❌ Cancelar")
+            
+            if cancelled:
+                del st.session_state.pending_action
+                st.rerun(scope="fragment")
             
             if submitted:
                 if comments.strip():
-                    if reject_expense(expense['id'], user['id'], comments):
-                        st.success("❌ Gasto rechazado exitosamente!")
-                        del st.session_state.reject_expense
-                        st.rerun()
+                    if reject_expense(expense['id'], user['id'], comments, expense.get('updated_at')):
+                        finish("❌ Gasto rechazado exitosamente!")
                 else:
                     st.error("❌ Por favor proporciona un motivo para el rechazo.")
     
-    # View expense details
-    if 'view_expense' in st.session_state:
-        expense = st.session_state.view_expense
-        requester = get_user_by_id(expense['user_id'])
-        
-        st.markdown("---")
-        st.subheader("👁️ Detalles del Gasto")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write(f"**ID:** {expense['id']}")
-            st.write(f"**Solicitante:** {requester['name'] if requester else 'N/A'}")
-            st.write(f"**Email:** {requester['email'] if requester else 'N/A'}")
-            st.write(f"**Descripción:** {expense['description']}")
-            st.write(f"**Categoría:** {expense.get('category', 'N/A')}")
-            st.write(f"**Monto:** ${expense['amount']:.2f}")
-        
-        with col2:
-            st.write(f"**Estado:** {expense['status']}")
-            st.write(f"**Prioridad:** {expense.get('priority', 'N/A')}")
-            st.write(f"**Fecha de gasto:** {expense.get('expense_date', expense['created_at'][:10])}")
-            st.write(f"**Proveedor:** {expense.get('vendor', 'N/A')}")
-            st.write(f"**Método de pago:** {expense.get('payment_method', 'N/A')}")
-            st.write(f"**Tipo de reembolso:** {expense.get('reimbursement_type', 'N/A')}")
-        
-        if expense.get('comments'):
-            st.markdown("---")
-            st.write("**💬 Comentarios del solicitante:**")
-            st.write(expense['comments'])
-        
-        if st.button("❌ Cerrar"):
-            del st.session_state.view_expense
-            st.rerun()
+    st.markdown("---")
+    st.subheader("👁️ Detalles del Gasto")
+    show_expense_detail(expense['id'])
+
+if filtered_expenses:
+    # Already ordered by priority and age on the server (priority_rank)
+    review_panel(filtered_expenses)
+
+elif view_mode == "Mi lote" and batch_released('Creado'):
+    st.info("↩️ Lote liberado. Pulsa \"📥 Tomar lote\" para reclamar uno nuevo.")
 
 else:
-    st.success("🎉 ¡No hay gastos pendientes para revisar!") 
\ No newline at end of file
+    st.success("🎉 ¡No hay gastos pendientes para revisar!")
@@ -1,5 +1,8 @@
 import streamlit as st
-from functions.f_read import get_rejected_expenses, get_user_by_id
+from functions.f_read import ExpenseQuery, get_categories
+from functions.f_components import show_expense_detail, show_expense_table
+from functions.f_working_set import get_working_set
+from functions.f_money import sum_cents, mean_cents, format_money
 from datetime import datetime, timedelta
 
 st.subheader("Gastos Rechazados")
@@ -11,18 +14,17 @@ if not user:
     st.error("❌ No hay usuario autenticado.")
     st.stop()
 
-# Get rejected expenses
-rejected_expenses = get_rejected_expenses()
-
 # Filters
 st.subheader("🔍 Filtros")
 
+categories = {c['description']: c['id'] for c in get_categories()}
+
 col1, col2, col3 = st.columns(3)
 
 with col1:
     category_filter = st.selectbox(
         "📂 Categoría",
-        ["Todas", "Alimentación", "Transporte", "Hospedaje", "Materiales", "Equipamiento", "Servicios", "Otros"]
+        ["Todas"] + list(categories)
     )
 
 with col2:
@@ -41,24 +43,21 @@ with col3:
         step=100.0
     )
 
-# Filter expenses
-filtered_expenses = rejected_expenses
-
-if category_filter != "Todas":
-    filtered_expenses = [e for e in filtered_expenses if e.get('category') == category_filter]
-
-if len(date_range) == 2:
-    start_date = date_range[0].strftime("%Y-%m-%d")
-    end_date = date_range[1].strftime("%Y-%m-%d")
-    filtered_expenses = [e for e in filtered_expenses if start_date <= e['approved_at'][:10] <= end_date]
-
-filtered_expenses = [e for e in filtered_expenses if amount_range[0] <= e['amount'] <= amount_range[1]]
+# Rejected expense summaries; there is no approved_at column, the decision is the expense's last update
+# Filters are applied by the database, newest decision first.
+query = (ExpenseQuery()
+         .phase('Rechazado')
+         .category_in([categories[category_filter]] if category_filter != "Todas" else [])
+         .date_between(*(date_range if len(date_range) == 2 else (None, None)), column='updated_at')
+         .amount_between(*amount_range)
+         .order_by('updated_at', desc=True))
+filtered_expenses = get_working_set(query)
 
 # Summary metrics
 if filtered_expenses:
-    total_amount = sum(e['amount'] for e in filtered_expenses)
-    avg_amount = total_amount / len(filtered_expenses)
-    recent_count = len([e for e in filtered_expenses if e['approved_at'][:10] >= (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")])
+    total_cents = sum_cents(e['amount'] for e in filtered_expenses)
+    avg_cents = mean_cents(total_cents, len(filtered_expenses))
+    recent_count = len([e for e in filtered_expenses if e['updated_at'][:10] >= (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")])
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -66,10 +65,10 @@ if filtered_expenses:
         st.metric("❌ Total Rechazados", len(filtered_expenses))
     
     with col2:
-        st.metric("💰 Monto Total", f"${total_amount:,.2f}")
+        st.metric("💰 Monto Total", format_money(total_cents))
     
     with col3:
-        st.metric("📊 Promedio", f"${avg_amount:,.2f}")
+        st.metric("📊 Promedio", format_money(avg_cents))
     
     with col4:
         st.metric("🕒 Últimos 7 días", recent_count)
@@ -78,92 +77,13 @@ if filtered_expenses:
 st.subheader(f"📋 Gastos Rechazados ({len(filtered_expenses)})")
 
 if filtered_expenses:
-    # Sort by rejection date (newest first)
-    filtered_expenses.sort(key=lambda x: x['approved_at'], reverse=True)
     
-    for expense in filtered_expenses:
-        # Get user info
-        requester = get_user_by_id(expense['user_id'])
-        approver = get_user_by_id(expense['approved_by'])
-        
-        requester_name = requester['name'] if requester else 'Usuario Desconocido'
-        approver_name = approver['name'] if approver else 'Aprobador Desconocido'
-        
-        with st.expander(f"❌ ${expense['amount']:.2f} - {expense['description']} (por {requester_name})"):
-            col1, col2, col3 = st.columns([2, 2, 1])
-            
-            with col1:
-                st.write(f"**ID:** {expense['id']}")
-                st.write(f"**Solicitante:** {requester_name}")
-                st.write(f"**Descripción:** {expense['description']}")
-                st.write(f"**Categoría:** {expense.get('category', 'N/A')}")
-                st.write(f"**Fecha de gasto:** {expense.get('expense_date', expense['created_at'][:10])}")
-            
-            with col2:
-                st.write(f"**Monto:** ${expense['amount']:.2f}")
-                st.write(f"**Rechazado por:** {approver_name}")
-                st.write(f"**Fecha de rechazo:** {expense['approved_at'][:10]}")
-                st.write(f"**Proveedor:** {expense.get('vendor', 'N/A')}")
-                st.write(f"**Método de pago:** {expense.get('payment_method', 'N/A')}")
-            
-            with col3:
-                if st.button("👁️ Ver Detalles", key=f"view_{expense['id']}"):
-                    st.session_state.view_expense = expense
-                    st.rerun()
-            
-            # Show comments if any
-            if expense.get('comments'):
-                st.markdown("---")
-                st.write("**💬 Comentarios del solicitante:**")
-                st.write(expense['comments'])
-            
-            if expense.get('approver_comments'):
-                st.markdown("---")
-                st.write("**💬 Motivo del rechazo:**")
-                st.write(expense['approver_comments'])
+    selected_id = show_expense_table(filtered_expenses, key="rechazado_expenses_table")
     
-    # View expense details
-    if 'view_expense' in st.session_state:
-        expense = st.session_state.view_expense
-        requester = get_user_by_id(expense['user_id'])
-        approver = get_user_by_id(expense['approved_by'])
-        
+    if selected_id:
         st.markdown("---")
         st.subheader("👁️ Detalles del Gasto")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write(f"**ID:** {expense['id']}")
-            st.write(f"**Solicitante:** {requester['name'] if requester else 'N/A'}")
-            st.write(f"**Email del solicitante:** {requester['email'] if requester else 'N/A'}")
-            st.write(f"**Descripción:** {expense['description']}")
-            st.write(f"**Categoría:** {expense.get('category', 'N/A')}")
-            st.write(f"**Monto:** ${expense['amount']:.2f}")
-            st.write(f"**Prioridad:** {expense.get('priority', 'N/A')}")
-        
-        with col2:
-            st.write(f"**Estado:** {expense['status']}")
-            st.write(f"**Rechazado por:** {approver['name'] if approver else 'N/A'}")
-            st.write(f"**Fecha de rechazo:** {expense['approved_at'][:10]}")
-            st.write(f"**Fecha de gasto:** {expense.get('expense_date', expense['created_at'][:10])}")
-            st.write(f"**Proveedor:** {expense.get('vendor', 'N/A')}")
-            st.write(f"**Método de pago:** {expense.get('payment_method', 'N/A')}")
-            st.write(f"**Tipo de reembolso:** {expense.get('reimbursement_type', 'N/A')}")
-        
-        if expense.get('comments'):
-            st.markdown("---")
-            st.write("**💬 Comentarios del solicitante:**")
-            st.write(expense['comments'])
-        
-        if expense.get('approver_comments'):
-            st.markdown("---")
-            st.write("**💬 Motivo del rechazo:**")
-            st.write(expense['approver_comments'])
-        
-        if st.button("❌ Cerrar"):
-            del st.session_state.view_expense
-            st.rerun()
+        show_expense_detail(selected_id)
 
 else:
     st.success("🎉 ¡No hay gastos rechazados!") 
\ No newline at end of file
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Archive closed expenses (Pagado / Rechazado) older than a retention window
+"""
+
+import os
+import time
+import argparse
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+# Load environment variables
+load_dotenv()
+
+def get_supabase_admin_client() -> Client:
+    """Initialize Supabase client with the service role key"""
+    url = os.environ.get("SUPABASE_URL")
+    service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not service_key:
+        print("❌ Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY environment variables.")
+        return None
+    return create_client(url, service_key)
+
+def archive_closed_expenses(retention_days: int, batch_size: int) -> int:
+    """Move closed expenses into the archive tables in batches, returns total moved"""
+    supabase_admin = get_supabase_admin_client()
+    if not supabase_admin:
+        return 0
+
+    total_archived = 0
+    started = time.time()
+
+    while True:
+        response = supabase_admin.rpc('archive_closed_expenses', {
+            'retention_days': retention_days,
+            'batch_size': batch_size
+        }).execute()
+
+        archived = response.data or 0
+        if archived == 0:
+            break
+
+        total_archived += archived
+        print(f"   📦 Archived batch of {archived} expenses ({total_archived} total)")
+
+    elapsed = time.time() - started
+    print(f"✅ Archived {total_archived} expenses in {elapsed:.1f}s")
+    return total_archived
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Archive closed expenses older than a retention window")
+    parser.add_argument("--retention-days", type=int, default=365, help="Archive expenses closed more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=500, help="Expenses moved per transaction")
+    args = parser.parse_args()
+
+    print("🧊 Archiving closed expenses")
+    print("=" * 40)
+    print(f"   Retention: {args.retention_days} days")
+    print(f"   Batch size: {args.batch_size}")
+
+    try:
+        archive_closed_expenses(args.retention_days, args.batch_size)
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compare the per-session memory of expense lists kept as summary-row dicts vs compact Expense records
+"""
+
+import json
+import random
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Any
+from functions.f_records import expense_records, record_size
+
+PHASES = ['Creado', 'Aprobado', 'Rechazado', 'Pagado']
+PRIORITIES = ['Baja', 'Media', 'Alta', 'Urgente']
+
+def _timestamp(moment: datetime) -> str:
+    return moment.isoformat(timespec='microseconds')
+
+def synthetic_rows(count: int, requesters: int = 50, seed: int = 7) -> List[Dict[str, Any]]:
+    """Rows shaped like an EXPENSE_SUMMARY_SELECT response after f_read flattens it (requester_name,
+    category_ids), decoded from JSON the way the client decodes a PostgREST response (no shared
+    strings between rows). Both sides hold the same columns, so only the representation differs."""
+    rng = random.Random(seed)
+    users = [(f"{rng.getrandbits(128):032x}", f"Usuario {i}") for i in range(requesters)]
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for i in range(count):
+        created = start + timedelta(minutes=rng.randint(0, 500_000))
+        user_id, name = rng.choice(users)
+        priority = rng.choice(PRIORITIES)
+        rows.append({
+            "id": i + 1,
+            "description": f"Compra de materiales para proyecto {rng.randint(1, 999)} - orden {rng.randint(1000, 9999)}",
+            "amount": round(rng.uniform(5, 5000), 2),
+            "phase": rng.choice(PHASES),
+            "priority": priority,
+            "priority_rank": PRIORITIES.index(priority),
+            "payment_method": rng.choice(["Transferencia", "Efectivo", "Tarjeta"]),
+            "created_at": _timestamp(created),
+            "updated_at": _timestamp(created + timedelta(hours=rng.randint(1, 300))),
+            "requester_id": user_id,
+            "requester_name": name,
+            "category_ids": rng.sample(range(1, 13), rng.randint(1, 2))
+        })
+    return json.loads(json.dumps(rows))
+
+def measure(build: Callable[[], Any]) -> int:
+    """Bytes allocated (and still alive) while building a structure"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del kept
+    return allocated
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Per-session memory of expense working sets")
+    parser.add_argument("--rows", type=int, default=2000, help="Rows per list")
+    parser.add_argument("--lists", type=int, default=4, help="Lists a session keeps loaded")
+    args = parser.parse_args()
+
+    # Each session keeps its own copies: build the lists from separate responses
+    responses = [synthetic_rows(args.rows, seed=seed) for seed in range(args.lists)]
+
+    def as_dicts():
+        return [json.loads(json.dumps(rows)) for rows in responses]
+
+    def as_records():
+        users = {}
+        return [expense_records(json.loads(json.dumps(rows)), users) for rows in responses]
+
+    dict_bytes = measure(as_dicts)
+    record_bytes = measure(as_records)
+
+    print("🧮 Session memory benchmark")
+    print("=" * 40)
+    print(f"   Lists: {args.lists} × {args.rows} rows")
+    print(f"   Summary dicts:      {dict_bytes / 1024 / 1024:8.2f} MB  ({dict_bytes / (args.rows * args.lists):6.0f} B/row)")
+    print(f"   Expense records:    {record_bytes / 1024 / 1024:8.2f} MB  ({record_bytes / (args.rows * args.lists):6.0f} B/row)")
+    print(f"   Reduction: {dict_bytes / record_bytes:.1f}×")
+    print(f"   Deep size of one row: dict {record_size(responses[0][0])} B, "
+          f"record {record_size(expense_records(responses[0][:1])[0])} B")
+
+if __name__ == "__main__":
+    main()
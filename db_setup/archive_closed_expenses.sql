@@ -0,0 +1,114 @@
+-- 🧊 Cold archive for closed expenses
+-- Paid (Pagado) and rejected (Rechazado) expenses older than a retention window are moved,
+-- together with their related rows, into *_archive tables so the hot tables stay small.
+-- The application reads them back only when asked (include_archived=True in f_read).
+
+-- ========================================
+-- 1. ARCHIVE TABLES
+-- ========================================
+
+-- Archive tables mirror the hot tables column by column, plus archived_at.
+-- Rows are copied by column name, so when a column is added to a hot table add it to the
+-- matching *_archive table too (ALTER TABLE ... ADD COLUMN IF NOT EXISTS) or it is not archived.
+CREATE TABLE IF NOT EXISTS expenses_archive (LIKE expenses);
+ALTER TABLE expenses_archive ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL;
+ALTER TABLE expenses_archive DROP CONSTRAINT IF EXISTS expenses_archive_pkey;
+ALTER TABLE expenses_archive ADD CONSTRAINT expenses_archive_pkey PRIMARY KEY (id);
+
+CREATE TABLE IF NOT EXISTS expense_categories_archive (LIKE expense_categories);
+CREATE TABLE IF NOT EXISTS expense_accounts_archive (LIKE expense_accounts);
+CREATE TABLE IF NOT EXISTS payment_receipts_archive (LIKE payment_receipts);
+CREATE TABLE IF NOT EXISTS reembolsos_archive (LIKE reembolsos);
+CREATE TABLE IF NOT EXISTS quotes_archive (LIKE quotes);
+CREATE TABLE IF NOT EXISTS comments_archive (LIKE comments);
+CREATE TABLE IF NOT EXISTS logs_archive (LIKE logs);
+
+-- ========================================
+-- 2. INDEXES
+-- ========================================
+
+-- Same access paths the application uses on the hot tables
+CREATE INDEX IF NOT EXISTS idx_expenses_archive_requester_id ON expenses_archive(requester_id);
+CREATE INDEX IF NOT EXISTS idx_expenses_archive_phase ON expenses_archive(phase);
+CREATE INDEX IF NOT EXISTS idx_expenses_archive_created_at ON expenses_archive(created_at);
+CREATE INDEX IF NOT EXISTS idx_expenses_archive_updated_at ON expenses_archive(updated_at);
+CREATE INDEX IF NOT EXISTS idx_expense_categories_archive_expense_id ON expense_categories_archive(expense_id);
+CREATE INDEX IF NOT EXISTS idx_expense_accounts_archive_expense_id ON expense_accounts_archive(expense_id);
+CREATE INDEX IF NOT EXISTS idx_payment_receipts_archive_expense_id ON payment_receipts_archive(expense_id);
+CREATE INDEX IF NOT EXISTS idx_reembolsos_archive_expense_id ON reembolsos_archive(expense_id);
+CREATE INDEX IF NOT EXISTS idx_quotes_archive_expense_id ON quotes_archive(expense_id);
+CREATE INDEX IF NOT EXISTS idx_comments_archive_expense_id ON comments_archive(expense_id);
+CREATE INDEX IF NOT EXISTS idx_logs_archive_expense_id ON logs_archive(expense_id);
+
+-- Index that makes the archival scan cheap: closed, not deleted, ordered by age
+CREATE INDEX IF NOT EXISTS idx_expenses_closed_updated_at ON expenses(updated_at)
+    WHERE phase IN ('Pagado', 'Rechazado') AND deleted_at IS NULL;
+
+-- ========================================
+-- 3. ROW LEVEL SECURITY
+-- ========================================
+
+-- No policies: archive tables are only read and written with the service role key
+ALTER TABLE expenses_archive ENABLE ROW LEVEL SECURITY;
+ALTER TABLE expense_categories_archive ENABLE ROW LEVEL SECURITY;
+ALTER TABLE expense_accounts_archive ENABLE ROW LEVEL SECURITY;
+ALTER TABLE payment_receipts_archive ENABLE ROW LEVEL SECURITY;
+ALTER TABLE reembolsos_archive ENABLE ROW LEVEL SECURITY;
+ALTER TABLE quotes_archive ENABLE ROW LEVEL SECURITY;
+ALTER TABLE comments_archive ENABLE ROW LEVEL SECURITY;
+ALTER TABLE logs_archive ENABLE ROW LEVEL SECURITY;
+
+-- ========================================
+-- 4. ARCHIVAL FUNCTION
+-- ========================================
+
+-- Moves one batch of closed expenses older than retention_days into the archive.
+-- Returns the number of expenses moved; call it repeatedly until it returns 0.
+-- Each call is its own short transaction and skips rows locked by other sessions.
+CREATE OR REPLACE FUNCTION archive_closed_expenses(
+    retention_days INTEGER DEFAULT 365,
+    batch_size INTEGER DEFAULT 500
+)
+RETURNS INTEGER AS $$
+DECLARE
+    batch_ids BIGINT[];
+BEGIN
+    SELECT array_agg(id) INTO batch_ids
+    FROM (
+        SELECT id
+        FROM expenses
+        WHERE phase IN ('Pagado', 'Rechazado')
+        AND deleted_at IS NULL
+        AND updated_at < NOW() - make_interval(days => retention_days)
+        ORDER BY updated_at
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ) candidates;
+
+    IF batch_ids IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    -- Copy related rows first; they are removed by ON DELETE CASCADE below
+    INSERT INTO expense_categories_archive SELECT (jsonb_populate_record(NULL::expense_categories_archive, to_jsonb(t))).* FROM expense_categories t WHERE t.expense_id = ANY(batch_ids);
+    INSERT INTO expense_accounts_archive SELECT (jsonb_populate_record(NULL::expense_accounts_archive, to_jsonb(t))).* FROM expense_accounts t WHERE t.expense_id = ANY(batch_ids);
+    INSERT INTO payment_receipts_archive SELECT (jsonb_populate_record(NULL::payment_receipts_archive, to_jsonb(t))).* FROM payment_receipts t WHERE t.expense_id = ANY(batch_ids);
+    INSERT INTO reembolsos_archive SELECT (jsonb_populate_record(NULL::reembolsos_archive, to_jsonb(t))).* FROM reembolsos t WHERE t.expense_id = ANY(batch_ids);
+    INSERT INTO quotes_archive SELECT (jsonb_populate_record(NULL::quotes_archive, to_jsonb(t))).* FROM quotes t WHERE t.expense_id = ANY(batch_ids);
+    INSERT INTO comments_archive SELECT (jsonb_populate_record(NULL::comments_archive, to_jsonb(t))).* FROM comments t WHERE t.expense_id = ANY(batch_ids);
+    INSERT INTO logs_archive SELECT (jsonb_populate_record(NULL::logs_archive, to_jsonb(t))).* FROM logs t WHERE t.expense_id = ANY(batch_ids);
+
+    INSERT INTO expenses_archive SELECT (jsonb_populate_record(NULL::expenses_archive, to_jsonb(e) || jsonb_build_object('archived_at', NOW()))).* FROM expenses e WHERE e.id = ANY(batch_ids);
+
+    DELETE FROM expenses WHERE id = ANY(batch_ids);
+
+    RETURN array_length(batch_ids, 1);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Only the service role may run the archival job
+REVOKE ALL ON FUNCTION archive_closed_expenses(INTEGER, INTEGER) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION archive_closed_expenses(INTEGER, INTEGER) TO service_role;
+
+-- 🎉 Archive setup complete!
+-- Run `python archive_expenses.py --retention-days 365` to move closed expenses into the archive.
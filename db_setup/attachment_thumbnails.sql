@@ -0,0 +1,13 @@
+-- 🖼️ Thumbnails for quotes and payment receipts
+-- Photo attachments are normalised before upload (functions/f_images.py) and a small
+-- JPEG thumbnail is stored next to them, so list pages can preview without downloading
+-- the original. Non-image attachments (PDF, Word) have no thumbnail.
+
+ALTER TABLE quotes ADD COLUMN IF NOT EXISTS thumbnail_url TEXT;
+ALTER TABLE payment_receipts ADD COLUMN IF NOT EXISTS thumbnail_url TEXT;
+
+-- Keep the archive tables (archive_closed_expenses.sql) column-compatible
+ALTER TABLE quotes_archive ADD COLUMN IF NOT EXISTS thumbnail_url TEXT;
+ALTER TABLE payment_receipts_archive ADD COLUMN IF NOT EXISTS thumbnail_url TEXT;
+
+-- 🎉 Thumbnails ready!
@@ -0,0 +1,259 @@
+-- 📝 Structured expense events and lead-time analytics
+-- Extends the logs table so every expense mutation records a structured event
+-- (event type, from phase, to phase, actor, timestamp), and adds the server-side
+-- functions behind the approval/payment lead-time report.
+-- Run after expense_phase_transitions.sql.
+
+-- ========================================
+-- 1. STRUCTURED COLUMNS ON LOGS
+-- ========================================
+
+ALTER TABLE logs ADD COLUMN IF NOT EXISTS event_type TEXT;
+ALTER TABLE logs ADD COLUMN IF NOT EXISTS from_phase expense_phase;
+ALTER TABLE logs ADD COLUMN IF NOT EXISTS to_phase expense_phase;
+ALTER TABLE logs ADD COLUMN IF NOT EXISTS details JSONB;
+
+-- Archived logs (archive_closed_expenses.sql) keep the structured columns
+ALTER TABLE logs_archive ADD COLUMN IF NOT EXISTS event_type TEXT;
+ALTER TABLE logs_archive ADD COLUMN IF NOT EXISTS from_phase expense_phase;
+ALTER TABLE logs_archive ADD COLUMN IF NOT EXISTS to_phase expense_phase;
+ALTER TABLE logs_archive ADD COLUMN IF NOT EXISTS details JSONB;
+
+-- Existing free-text rows written by transition_expense_phase() look like 'Creado -> Aprobado'
+UPDATE logs SET
+    event_type = 'phase_transition',
+    from_phase = split_part(content, ' -> ', 1)::expense_phase,
+    to_phase = split_part(content, ' -> ', 2)::expense_phase
+WHERE event_type IS NULL
+AND content ~ '^(Creado|Aprobado|Pagado|Rechazado) -> (Creado|Aprobado|Pagado|Rechazado)$';
+
+-- Lead-time queries walk each expense's events in time order
+CREATE INDEX IF NOT EXISTS idx_logs_expense_id_created_at ON logs(expense_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_logs_phase_transitions ON logs(created_at) WHERE event_type = 'phase_transition';
+
+-- ========================================
+-- 2. TRANSITION FUNCTION WITH STRUCTURED EVENTS
+-- ========================================
+
+CREATE OR REPLACE FUNCTION transition_expense_phase(
+    p_expense_id BIGINT,
+    p_target_phase expense_phase,
+    p_actor_id UUID,
+    p_expected_phase expense_phase DEFAULT NULL,
+    p_expected_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_comments TEXT DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    current_row expenses%ROWTYPE;
+    updated_row expenses%ROWTYPE;
+BEGIN
+    SELECT * INTO current_row
+    FROM expenses
+    WHERE id = p_expense_id AND deleted_at IS NULL
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('status', 'not_found');
+    END IF;
+
+    IF (p_expected_phase IS NOT NULL AND current_row.phase <> p_expected_phase)
+       OR (p_expected_updated_at IS NOT NULL AND current_row.updated_at <> p_expected_updated_at) THEN
+        RETURN jsonb_build_object('status', 'conflict', 'expense', to_jsonb(current_row));
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM expense_phase_transitions
+        WHERE from_phase = current_row.phase AND to_phase = p_target_phase
+    ) THEN
+        RETURN jsonb_build_object('status', 'invalid_transition', 'expense', to_jsonb(current_row));
+    END IF;
+
+    UPDATE expenses SET
+        phase = p_target_phase,
+        approver_id = CASE WHEN p_target_phase IN ('Aprobado', 'Rechazado') THEN p_actor_id ELSE approver_id END,
+        payer_id = CASE WHEN p_target_phase = 'Pagado' THEN p_actor_id ELSE payer_id END,
+        description = COALESCE(NULLIF(p_comments, ''), description)
+    WHERE id = p_expense_id
+    RETURNING * INTO updated_row;
+
+    INSERT INTO logs (expense_id, created_by, content, event_type, from_phase, to_phase, details)
+    VALUES (
+        p_expense_id,
+        p_actor_id,
+        format('%s -> %s', current_row.phase, p_target_phase),
+        'phase_transition',
+        current_row.phase,
+        p_target_phase,
+        CASE WHEN NULLIF(p_comments, '') IS NOT NULL THEN jsonb_build_object('comments', p_comments) END
+    );
+
+    RETURN jsonb_build_object('status', 'ok', 'expense', to_jsonb(updated_row));
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Admin correction of an expense's phase: any phase to any phase, bypassing
+-- expense_phase_transitions but keeping the conflict check. Logged as 'phase_override'
+-- rather than 'phase_transition', so corrections do not count as workflow steps in the
+-- lead-time report. Approver and payer are left as they were.
+CREATE OR REPLACE FUNCTION override_expense_phase(
+    p_expense_id BIGINT,
+    p_target_phase expense_phase,
+    p_actor_id UUID,
+    p_expected_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    current_row expenses%ROWTYPE;
+    updated_row expenses%ROWTYPE;
+BEGIN
+    SELECT * INTO current_row
+    FROM expenses
+    WHERE id = p_expense_id AND deleted_at IS NULL
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('status', 'not_found');
+    END IF;
+
+    IF p_expected_updated_at IS NOT NULL AND current_row.updated_at <> p_expected_updated_at THEN
+        RETURN jsonb_build_object('status', 'conflict', 'expense', to_jsonb(current_row));
+    END IF;
+
+    UPDATE expenses SET phase = p_target_phase
+    WHERE id = p_expense_id
+    RETURNING * INTO updated_row;
+
+    INSERT INTO logs (expense_id, created_by, content, event_type, from_phase, to_phase)
+    VALUES (
+        p_expense_id,
+        p_actor_id,
+        format('%s -> %s (admin)', current_row.phase, p_target_phase),
+        'phase_override',
+        current_row.phase,
+        p_target_phase
+    );
+
+    RETURN jsonb_build_object('status', 'ok', 'expense', to_jsonb(updated_row));
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION override_expense_phase(BIGINT, expense_phase, UUID, TIMESTAMP WITH TIME ZONE) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION override_expense_phase(BIGINT, expense_phase, UUID, TIMESTAMP WITH TIME ZONE) TO service_role;
+
+-- ========================================
+-- 3. LEAD TIMES PER EXPENSE
+-- ========================================
+
+-- One row per expense created in [p_start, p_end), with the names of all its categories.
+-- approval_hours: time spent in Creado before being approved or rejected.
+-- payment_hours: time spent in Aprobado before being paid.
+-- The time in the previous phase comes from LAG over the expense's transitions; expenses
+-- created before events were recorded fall back to expenses.created_at.
+-- Grouped by category, expense_lead_time_percentiles expands categories, so an expense with
+-- several categories counts once in each of them and once everywhere else.
+DROP FUNCTION IF EXISTS expense_lead_time_percentiles(TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE, TEXT);
+DROP FUNCTION IF EXISTS expense_phase_lead_times(TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE);
+CREATE FUNCTION expense_phase_lead_times(
+    p_start TIMESTAMP WITH TIME ZONE,
+    p_end TIMESTAMP WITH TIME ZONE
+)
+RETURNS TABLE (
+    expense_id BIGINT,
+    categories TEXT[],
+    approver_id UUID,
+    month TEXT,
+    approval_hours DOUBLE PRECISION,
+    payment_hours DOUBLE PRECISION
+) AS $$
+    WITH transitions AS (
+        SELECT
+            l.expense_id,
+            l.created_by,
+            l.to_phase,
+            EXTRACT(EPOCH FROM l.created_at - COALESCE(
+                LAG(l.created_at) OVER (PARTITION BY l.expense_id ORDER BY l.created_at),
+                e.created_at
+            )) / 3600.0 AS hours_in_previous_phase
+        FROM logs l
+        JOIN expenses e ON e.id = l.expense_id
+        WHERE l.event_type = 'phase_transition'
+        AND e.created_at >= p_start AND e.created_at < p_end
+        AND e.deleted_at IS NULL
+    ),
+    per_expense AS (
+        SELECT
+            t.expense_id,
+            (array_agg(t.created_by) FILTER (WHERE t.to_phase IN ('Aprobado', 'Rechazado')))[1] AS approver_id,
+            MAX(t.hours_in_previous_phase) FILTER (WHERE t.to_phase IN ('Aprobado', 'Rechazado')) AS approval_hours,
+            MAX(t.hours_in_previous_phase) FILTER (WHERE t.to_phase = 'Pagado') AS payment_hours
+        FROM transitions t
+        GROUP BY t.expense_id
+    )
+    SELECT
+        p.expense_id,
+        COALESCE(
+            (SELECT array_agg(c.description::TEXT ORDER BY c.description)
+             FROM expense_categories ec
+             JOIN categories c ON c.id = ec.category_id
+             WHERE ec.expense_id = p.expense_id),
+            ARRAY['Sin categoría']
+        ) AS categories,
+        p.approver_id,
+        to_char(date_trunc('month', e.created_at), 'YYYY-MM') AS month,
+        p.approval_hours,
+        p.payment_hours
+    FROM per_expense p
+    JOIN expenses e ON e.id = p.expense_id;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+-- ========================================
+-- 4. LEAD-TIME PERCENTILES
+-- ========================================
+
+-- p50/p90/p99 of approval and payment lead times (hours), grouped by
+-- 'approver', 'category' or 'month'. Each expense counts once per group (once in each of
+-- its categories). percentile_cont skips NULLs, so expenses that are not paid yet only
+-- count towards the approval percentiles.
+CREATE OR REPLACE FUNCTION expense_lead_time_percentiles(
+    p_start TIMESTAMP WITH TIME ZONE,
+    p_end TIMESTAMP WITH TIME ZONE,
+    p_group_by TEXT DEFAULT 'month'
+)
+RETURNS TABLE (
+    group_key TEXT,
+    expenses BIGINT,
+    approval_p50 DOUBLE PRECISION,
+    approval_p90 DOUBLE PRECISION,
+    approval_p99 DOUBLE PRECISION,
+    payment_p50 DOUBLE PRECISION,
+    payment_p90 DOUBLE PRECISION,
+    payment_p99 DOUBLE PRECISION
+) AS $$
+    SELECT
+        g.group_key,
+        COUNT(*) AS expenses,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY lt.approval_hours),
+        percentile_cont(0.9) WITHIN GROUP (ORDER BY lt.approval_hours),
+        percentile_cont(0.99) WITHIN GROUP (ORDER BY lt.approval_hours),
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY lt.payment_hours),
+        percentile_cont(0.9) WITHIN GROUP (ORDER BY lt.payment_hours),
+        percentile_cont(0.99) WITHIN GROUP (ORDER BY lt.payment_hours)
+    FROM expense_phase_lead_times(p_start, p_end) lt
+    CROSS JOIN LATERAL unnest(
+        CASE p_group_by
+            WHEN 'approver' THEN ARRAY[COALESCE(lt.approver_id::TEXT, 'N/A')]
+            WHEN 'category' THEN lt.categories
+            ELSE ARRAY[lt.month]
+        END
+    ) AS g(group_key)
+    GROUP BY g.group_key
+    ORDER BY g.group_key;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION expense_phase_lead_times(TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) FROM PUBLIC;
+REVOKE ALL ON FUNCTION expense_lead_time_percentiles(TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE, TEXT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION expense_phase_lead_times(TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE) TO service_role;
+GRANT EXECUTE ON FUNCTION expense_lead_time_percentiles(TIMESTAMP WITH TIME ZONE, TIMESTAMP WITH TIME ZONE, TEXT) TO service_role;
+
+-- 🎉 Expense events ready!
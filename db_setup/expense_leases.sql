@@ -0,0 +1,122 @@
+-- 🎟️ Work-queue leases for approvers and payers
+-- Instead of every reviewer seeing the same full list, claim_expense_batch() hands each
+-- reviewer their own batch of up to K expenses in a phase, leased for a limited time.
+-- Leases live in their own table so claiming never touches expenses.updated_at, which the
+-- transition RPC uses for optimistic concurrency.
+
+-- ========================================
+-- 1. LEASES TABLE
+-- ========================================
+
+CREATE TABLE IF NOT EXISTS expense_leases (
+    expense_id BIGINT PRIMARY KEY REFERENCES expenses(id) ON DELETE CASCADE,
+    phase expense_phase NOT NULL,
+    claimed_by UUID REFERENCES users(id) ON DELETE CASCADE,
+    leased_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL,
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_expense_leases_claimed_by ON expense_leases(claimed_by, phase);
+CREATE INDEX IF NOT EXISTS idx_expense_leases_expires_at ON expense_leases(expires_at);
+
+-- Work-queue scans: live expenses in a phase, oldest first
+CREATE INDEX IF NOT EXISTS idx_expenses_phase_created_at ON expenses(phase, created_at) WHERE deleted_at IS NULL;
+
+-- Only accessed through the functions below with the service role key
+ALTER TABLE expense_leases ENABLE ROW LEVEL SECURITY;
+
+-- ========================================
+-- 2. CLAIM FUNCTION
+-- ========================================
+
+-- Returns the caller's batch for a phase: leases they already hold are renewed, and the batch
+-- is topped up to p_batch_size with unclaimed expenses ordered by priority and age.
+-- FOR UPDATE SKIP LOCKED lets concurrent callers take disjoint batches without waiting on each other.
+CREATE OR REPLACE FUNCTION claim_expense_batch(
+    p_actor_id UUID,
+    p_phase expense_phase,
+    p_batch_size INTEGER DEFAULT 5,
+    p_lease_minutes INTEGER DEFAULT 30
+)
+RETURNS SETOF expenses AS $$
+DECLARE
+    held_count INTEGER;
+BEGIN
+    -- Drop expired leases and leases on expenses that already left the phase
+    DELETE FROM expense_leases l
+    WHERE l.expires_at < NOW()
+    OR NOT EXISTS (
+        SELECT 1 FROM expenses e
+        WHERE e.id = l.expense_id AND e.phase = l.phase AND e.deleted_at IS NULL
+    );
+
+    -- Renew what the caller already holds
+    UPDATE expense_leases
+    SET expires_at = NOW() + make_interval(mins => p_lease_minutes)
+    WHERE claimed_by = p_actor_id AND phase = p_phase;
+
+    GET DIAGNOSTICS held_count = ROW_COUNT;
+
+    IF held_count < p_batch_size THEN
+        INSERT INTO expense_leases (expense_id, phase, claimed_by, expires_at)
+        SELECT c.id, p_phase, p_actor_id, NOW() + make_interval(mins => p_lease_minutes)
+        FROM (
+            SELECT e.id
+            FROM expenses e
+            WHERE e.phase = p_phase
+            AND e.deleted_at IS NULL
+            AND NOT EXISTS (SELECT 1 FROM expense_leases l WHERE l.expense_id = e.id)
+            -- priority is read through to_jsonb so this works whether or not the column exists
+            ORDER BY CASE to_jsonb(e)->>'priority'
+                        WHEN 'Urgente' THEN 4
+                        WHEN 'Alta' THEN 3
+                        WHEN 'Media' THEN 2
+                        WHEN 'Baja' THEN 1
+                        ELSE 2
+                     END DESC,
+                     e.created_at
+            LIMIT p_batch_size - held_count
+            FOR UPDATE OF e SKIP LOCKED
+        ) c
+        ON CONFLICT (expense_id) DO NOTHING;
+    END IF;
+
+    RETURN QUERY
+    SELECT e.*
+    FROM expenses e
+    JOIN expense_leases l ON l.expense_id = e.id
+    WHERE l.claimed_by = p_actor_id AND l.phase = p_phase
+    ORDER BY e.created_at;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- ========================================
+-- 3. RELEASE FUNCTION
+-- ========================================
+
+-- Gives back one expense (p_expense_id) or, when it is NULL, the caller's whole batch for p_phase
+CREATE OR REPLACE FUNCTION release_expense_leases(
+    p_actor_id UUID,
+    p_phase expense_phase,
+    p_expense_id BIGINT DEFAULT NULL
+)
+RETURNS INTEGER AS $$
+DECLARE
+    released INTEGER;
+BEGIN
+    DELETE FROM expense_leases
+    WHERE claimed_by = p_actor_id
+    AND phase = p_phase
+    AND (p_expense_id IS NULL OR expense_id = p_expense_id);
+
+    GET DIAGNOSTICS released = ROW_COUNT;
+    RETURN released;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION claim_expense_batch(UUID, expense_phase, INTEGER, INTEGER) FROM PUBLIC;
+REVOKE ALL ON FUNCTION release_expense_leases(UUID, expense_phase, BIGINT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION claim_expense_batch(UUID, expense_phase, INTEGER, INTEGER) TO service_role;
+GRANT EXECUTE ON FUNCTION release_expense_leases(UUID, expense_phase, BIGINT) TO service_role;
+
+-- 🎉 Work-queue leases ready!
@@ -0,0 +1,92 @@
+-- 🔀 Expense phase transitions with optimistic concurrency
+-- approve_expense, reject_expense and mark_expense_as_paid go through transition_expense_phase(),
+-- which checks the caller's expected state, validates the move against expense_phase_transitions,
+-- applies it and appends to logs in a single transaction.
+
+-- ========================================
+-- 1. TRANSITION TABLE
+-- ========================================
+
+CREATE TABLE IF NOT EXISTS expense_phase_transitions (
+    from_phase expense_phase NOT NULL,
+    to_phase expense_phase NOT NULL,
+    PRIMARY KEY (from_phase, to_phase)
+);
+
+INSERT INTO expense_phase_transitions (from_phase, to_phase) VALUES
+('Creado', 'Aprobado'),
+('Creado', 'Rechazado'),
+('Aprobado', 'Pagado')
+ON CONFLICT DO NOTHING;
+
+ALTER TABLE expense_phase_transitions ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Anyone can read phase transitions" ON expense_phase_transitions;
+CREATE POLICY "Anyone can read phase transitions" ON expense_phase_transitions
+    FOR SELECT USING (true);
+
+-- ========================================
+-- 2. TRANSITION FUNCTION
+-- ========================================
+
+-- Returns a JSON object {"status": ..., "expense": {...}} where status is one of:
+--   ok                  the transition was applied; expense is the updated row
+--   conflict            expected_phase / expected_updated_at no longer match; expense is the current row
+--   invalid_transition  the move is not in expense_phase_transitions; expense is the current row
+--   not_found           no live expense with that id
+CREATE OR REPLACE FUNCTION transition_expense_phase(
+    p_expense_id BIGINT,
+    p_target_phase expense_phase,
+    p_actor_id UUID,
+    p_expected_phase expense_phase DEFAULT NULL,
+    p_expected_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_comments TEXT DEFAULT NULL
+)
+RETURNS JSONB AS $$
+DECLARE
+    current_row expenses%ROWTYPE;
+    updated_row expenses%ROWTYPE;
+BEGIN
+    -- Row lock serialises concurrent reviewers of the same expense for the rest of this call only
+    SELECT * INTO current_row
+    FROM expenses
+    WHERE id = p_expense_id AND deleted_at IS NULL
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('status', 'not_found');
+    END IF;
+
+    IF (p_expected_phase IS NOT NULL AND current_row.phase <> p_expected_phase)
+       OR (p_expected_updated_at IS NOT NULL AND current_row.updated_at <> p_expected_updated_at) THEN
+        RETURN jsonb_build_object('status', 'conflict', 'expense', to_jsonb(current_row));
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM expense_phase_transitions
+        WHERE from_phase = current_row.phase AND to_phase = p_target_phase
+    ) THEN
+        RETURN jsonb_build_object('status', 'invalid_transition', 'expense', to_jsonb(current_row));
+    END IF;
+
+    UPDATE expenses SET
+        phase = p_target_phase,
+        approver_id = CASE WHEN p_target_phase IN ('Aprobado', 'Rechazado') THEN p_actor_id ELSE approver_id END,
+        payer_id = CASE WHEN p_target_phase = 'Pagado' THEN p_actor_id ELSE payer_id END,
+        -- Same behaviour as the previous client-side update: reviewer comments replace the description
+        description = COALESCE(NULLIF(p_comments, ''), description)
+    WHERE id = p_expense_id
+    RETURNING * INTO updated_row;
+
+    INSERT INTO logs (expense_id, created_by, content)
+    VALUES (p_expense_id, p_actor_id, format('%s -> %s', current_row.phase, p_target_phase));
+
+    RETURN jsonb_build_object('status', 'ok', 'expense', to_jsonb(updated_row));
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Called from the application with the service role key
+REVOKE ALL ON FUNCTION transition_expense_phase(BIGINT, expense_phase, UUID, expense_phase, TIMESTAMP WITH TIME ZONE, TEXT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION transition_expense_phase(BIGINT, expense_phase, UUID, expense_phase, TIMESTAMP WITH TIME ZONE, TEXT) TO service_role;
+
+-- 🎉 Phase transitions ready!
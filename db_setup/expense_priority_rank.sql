@@ -0,0 +1,91 @@
+-- ⚡ Server-side priority ordering for the approval and payment queues
+-- Adds a stored priority_rank computed from priority and an index matching the queue order,
+-- so "most urgent, then oldest" comes straight from the index instead of sorting in Python.
+-- Run after expense_leases.sql.
+
+-- ========================================
+-- 1. PRIORITY COLUMNS
+-- ========================================
+
+-- The pages read and edit expenses.priority (Baja, Media, Alta, Urgente)
+ALTER TABLE expenses ADD COLUMN IF NOT EXISTS priority TEXT DEFAULT 'Media';
+
+ALTER TABLE expenses ADD COLUMN IF NOT EXISTS priority_rank SMALLINT
+    GENERATED ALWAYS AS (
+        CASE priority
+            WHEN 'Urgente' THEN 4
+            WHEN 'Alta' THEN 3
+            WHEN 'Media' THEN 2
+            WHEN 'Baja' THEN 1
+            ELSE 2
+        END
+    ) STORED;
+
+-- Archived expenses keep their priority (plain columns in the archive)
+ALTER TABLE expenses_archive ADD COLUMN IF NOT EXISTS priority TEXT;
+ALTER TABLE expenses_archive ADD COLUMN IF NOT EXISTS priority_rank SMALLINT;
+
+-- ========================================
+-- 2. QUEUE INDEX
+-- ========================================
+
+CREATE INDEX IF NOT EXISTS idx_expenses_queue
+    ON expenses(phase, priority_rank DESC, created_at)
+    WHERE deleted_at IS NULL;
+
+-- The (phase, created_at) index from expense_leases.sql is covered by the queue index
+DROP INDEX IF EXISTS idx_expenses_phase_created_at;
+
+-- ========================================
+-- 3. CLAIM FUNCTION ON THE QUEUE INDEX
+-- ========================================
+
+CREATE OR REPLACE FUNCTION claim_expense_batch(
+    p_actor_id UUID,
+    p_phase expense_phase,
+    p_batch_size INTEGER DEFAULT 5,
+    p_lease_minutes INTEGER DEFAULT 30
+)
+RETURNS SETOF expenses AS $$
+DECLARE
+    held_count INTEGER;
+BEGIN
+    DELETE FROM expense_leases l
+    WHERE l.expires_at < NOW()
+    OR NOT EXISTS (
+        SELECT 1 FROM expenses e
+        WHERE e.id = l.expense_id AND e.phase = l.phase AND e.deleted_at IS NULL
+    );
+
+    UPDATE expense_leases
+    SET expires_at = NOW() + make_interval(mins => p_lease_minutes)
+    WHERE claimed_by = p_actor_id AND phase = p_phase;
+
+    GET DIAGNOSTICS held_count = ROW_COUNT;
+
+    IF held_count < p_batch_size THEN
+        INSERT INTO expense_leases (expense_id, phase, claimed_by, expires_at)
+        SELECT c.id, p_phase, p_actor_id, NOW() + make_interval(mins => p_lease_minutes)
+        FROM (
+            SELECT e.id
+            FROM expenses e
+            WHERE e.phase = p_phase
+            AND e.deleted_at IS NULL
+            AND NOT EXISTS (SELECT 1 FROM expense_leases l WHERE l.expense_id = e.id)
+            ORDER BY e.priority_rank DESC, e.created_at
+            LIMIT p_batch_size - held_count
+            FOR UPDATE OF e SKIP LOCKED
+        ) c
+        ON CONFLICT (expense_id) DO NOTHING;
+    END IF;
+
+    RETURN QUERY
+    SELECT e.*
+    FROM expenses e
+    JOIN expense_leases l ON l.expense_id = e.id
+    WHERE l.claimed_by = p_actor_id AND l.phase = p_phase
+    ORDER BY e.priority_rank DESC, e.created_at;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 🎉 Priority queue ready!
@@ -0,0 +1,44 @@
+-- 🧾 Approved expenses still waiting for a payment receipt
+-- The payer's receipt worklist is computed in one query with an anti-join (NOT EXISTS)
+-- on idx_payment_receipts_expense_id, instead of listing every Aprobado expense.
+-- Run after expense_priority_rank.sql and upload_jobs.sql.
+
+-- ========================================
+-- 1. EXPENSES WITHOUT RECEIPTS
+-- ========================================
+
+-- Approved, live expenses with no payment_receipts row and no receipt upload still in flight,
+-- most urgent and oldest first (same order as the payment queue).
+CREATE OR REPLACE FUNCTION approved_expenses_without_receipts()
+RETURNS SETOF expenses AS $$
+    SELECT e.*
+    FROM expenses e
+    WHERE e.phase = 'Aprobado'
+    AND e.deleted_at IS NULL
+    AND NOT EXISTS (SELECT 1 FROM payment_receipts pr WHERE pr.expense_id = e.id)
+    AND NOT EXISTS (
+        SELECT 1 FROM upload_jobs j
+        WHERE j.expense_id = e.id AND j.kind = 'receipt' AND j.status IN ('pending', 'uploading')
+    )
+    ORDER BY e.priority_rank DESC, e.created_at;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+-- ========================================
+-- 2. RECEIPT COUNTS FOR LIST VIEWS
+-- ========================================
+
+-- One row per requested expense, 0 when it has no receipts
+CREATE OR REPLACE FUNCTION expense_receipt_counts(p_expense_ids BIGINT[])
+RETURNS TABLE (expense_id BIGINT, receipts BIGINT) AS $$
+    SELECT ids.id, COUNT(pr.id)
+    FROM unnest(p_expense_ids) AS ids(id)
+    LEFT JOIN payment_receipts pr ON pr.expense_id = ids.id
+    GROUP BY ids.id;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+REVOKE ALL ON FUNCTION approved_expenses_without_receipts() FROM PUBLIC;
+REVOKE ALL ON FUNCTION expense_receipt_counts(BIGINT[]) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION approved_expenses_without_receipts() TO service_role;
+GRANT EXECUTE ON FUNCTION expense_receipt_counts(BIGINT[]) TO service_role;
+
+-- 🎉 Receipt status ready!
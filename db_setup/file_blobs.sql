@@ -0,0 +1,39 @@
+-- 🗂️ Content-addressed storage for quotes and payment receipts
+-- Uploaded files are keyed by their SHA-256. When the same bytes are uploaded again
+-- (the same quotation attached to several expenses, a re-uploaded bank receipt) the
+-- existing storage object is linked instead of uploading a new copy.
+
+-- ========================================
+-- 1. BLOBS TABLE
+-- ========================================
+
+CREATE TABLE IF NOT EXISTS file_blobs (
+    id BIGSERIAL PRIMARY KEY,
+    bucket TEXT NOT NULL,
+    content_hash TEXT NOT NULL, -- SHA-256, hex
+    storage_path TEXT NOT NULL, -- <content_hash>.<ext> inside the bucket
+    file_size BIGINT NOT NULL,
+    content_type TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL,
+
+    CONSTRAINT file_blobs_bucket_hash_unique UNIQUE (bucket, content_hash)
+);
+
+-- Only accessed with the service role key
+ALTER TABLE file_blobs ENABLE ROW LEVEL SECURITY;
+
+-- ========================================
+-- 2. REFERENCES FROM QUOTES AND RECEIPTS
+-- ========================================
+
+ALTER TABLE quotes ADD COLUMN IF NOT EXISTS blob_id BIGINT REFERENCES file_blobs(id) ON DELETE RESTRICT;
+ALTER TABLE payment_receipts ADD COLUMN IF NOT EXISTS blob_id BIGINT REFERENCES file_blobs(id) ON DELETE RESTRICT;
+
+CREATE INDEX IF NOT EXISTS idx_quotes_blob_id ON quotes(blob_id);
+CREATE INDEX IF NOT EXISTS idx_payment_receipts_blob_id ON payment_receipts(blob_id);
+
+-- Keep the archive tables (archive_closed_expenses.sql) column-compatible
+ALTER TABLE quotes_archive ADD COLUMN IF NOT EXISTS blob_id BIGINT;
+ALTER TABLE payment_receipts_archive ADD COLUMN IF NOT EXISTS blob_id BIGINT;
+
+-- 🎉 File blobs ready!
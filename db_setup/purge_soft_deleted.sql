@@ -0,0 +1,136 @@
+-- 🧹 Purge of soft-deleted rows
+-- delete_expense() and delete_receiver() only set deleted_at. These functions hard-delete
+-- (or archive, for expenses) rows soft-deleted more than N days ago, one small batch per call.
+-- Batches walk the primary key (keyset iteration: id > after_id) so every call is a short
+-- transaction that touches at most batch_size rows, which keeps locks brief and lets
+-- autovacuum reclaim the dead tuples between batches.
+
+-- ========================================
+-- 1. INDEXES
+-- ========================================
+
+-- Partial indexes so the purge scan only visits soft-deleted rows, in id order
+CREATE INDEX IF NOT EXISTS idx_expenses_soft_deleted ON expenses(id) WHERE deleted_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_receivers_soft_deleted ON receivers(id) WHERE deleted_at IS NOT NULL;
+
+-- Child tables are deleted by expense_id; quotes, reembolsos, comments and logs already have
+-- expense_id indexes in database_schema.sql, payment_receipts in payment_receipts_table.sql and
+-- the junction tables in multiple_categories_accounts.sql.
+
+-- ========================================
+-- 2. EXPENSES
+-- ========================================
+
+-- Purges one batch of expenses soft-deleted more than older_than_days ago with id > after_id.
+-- With archive = TRUE the rows are copied into the *_archive tables (archive_closed_expenses.sql) first.
+-- Returns the number of expenses purged and the last id seen; pass last_id as after_id on the next call.
+CREATE OR REPLACE FUNCTION purge_deleted_expenses(
+    older_than_days INTEGER DEFAULT 30,
+    batch_size INTEGER DEFAULT 500,
+    after_id BIGINT DEFAULT 0,
+    archive BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (purged INTEGER, last_id BIGINT) AS $$
+DECLARE
+    batch_ids BIGINT[];
+BEGIN
+    SELECT array_agg(id ORDER BY id) INTO batch_ids
+    FROM (
+        SELECT id
+        FROM expenses
+        WHERE deleted_at IS NOT NULL
+        AND deleted_at < NOW() - make_interval(days => older_than_days)
+        AND id > after_id
+        ORDER BY id
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ) candidates;
+
+    IF batch_ids IS NULL THEN
+        RETURN QUERY SELECT 0, after_id;
+        RETURN;
+    END IF;
+
+    IF archive THEN
+        INSERT INTO expense_categories_archive SELECT (jsonb_populate_record(NULL::expense_categories_archive, to_jsonb(t))).* FROM expense_categories t WHERE t.expense_id = ANY(batch_ids);
+        INSERT INTO expense_accounts_archive SELECT (jsonb_populate_record(NULL::expense_accounts_archive, to_jsonb(t))).* FROM expense_accounts t WHERE t.expense_id = ANY(batch_ids);
+        INSERT INTO payment_receipts_archive SELECT (jsonb_populate_record(NULL::payment_receipts_archive, to_jsonb(t))).* FROM payment_receipts t WHERE t.expense_id = ANY(batch_ids);
+        INSERT INTO reembolsos_archive SELECT (jsonb_populate_record(NULL::reembolsos_archive, to_jsonb(t))).* FROM reembolsos t WHERE t.expense_id = ANY(batch_ids);
+        INSERT INTO quotes_archive SELECT (jsonb_populate_record(NULL::quotes_archive, to_jsonb(t))).* FROM quotes t WHERE t.expense_id = ANY(batch_ids);
+        INSERT INTO comments_archive SELECT (jsonb_populate_record(NULL::comments_archive, to_jsonb(t))).* FROM comments t WHERE t.expense_id = ANY(batch_ids);
+        INSERT INTO logs_archive SELECT (jsonb_populate_record(NULL::logs_archive, to_jsonb(t))).* FROM logs t WHERE t.expense_id = ANY(batch_ids);
+        INSERT INTO expenses_archive SELECT (jsonb_populate_record(NULL::expenses_archive, to_jsonb(e) || jsonb_build_object('archived_at', NOW()))).* FROM expenses e WHERE e.id = ANY(batch_ids);
+    END IF;
+
+    -- Children explicitly, in the same order as the cascade would, so each delete uses its expense_id index
+    DELETE FROM expense_categories WHERE expense_id = ANY(batch_ids);
+    DELETE FROM expense_accounts WHERE expense_id = ANY(batch_ids);
+    DELETE FROM payment_receipts WHERE expense_id = ANY(batch_ids);
+    DELETE FROM reembolsos WHERE expense_id = ANY(batch_ids);
+    UPDATE expenses SET approved_quote_id = NULL WHERE id = ANY(batch_ids) AND approved_quote_id IS NOT NULL;
+    DELETE FROM quotes WHERE expense_id = ANY(batch_ids);
+    DELETE FROM expenses WHERE id = ANY(batch_ids);
+
+    RETURN QUERY SELECT array_length(batch_ids, 1), batch_ids[array_length(batch_ids, 1)];
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- ========================================
+-- 3. RECEIVERS
+-- ========================================
+
+-- Purges one batch of receivers soft-deleted more than older_than_days ago with id > after_id.
+-- Receivers still referenced by quotes, reembolsos or expenses (hot or archived) are kept so
+-- history never loses its supplier; receiver_categories, receiver_accounts and
+-- people_suppliers rows go with the receiver through ON DELETE CASCADE.
+CREATE OR REPLACE FUNCTION purge_deleted_receivers(
+    older_than_days INTEGER DEFAULT 30,
+    batch_size INTEGER DEFAULT 500,
+    after_id BIGINT DEFAULT 0
+)
+RETURNS TABLE (purged INTEGER, last_id BIGINT) AS $$
+DECLARE
+    scanned_ids BIGINT[];
+    deleted_count INTEGER;
+BEGIN
+    SELECT array_agg(id ORDER BY id) INTO scanned_ids
+    FROM (
+        SELECT id
+        FROM receivers
+        WHERE deleted_at IS NOT NULL
+        AND deleted_at < NOW() - make_interval(days => older_than_days)
+        AND id > after_id
+        ORDER BY id
+        LIMIT batch_size
+        FOR UPDATE SKIP LOCKED
+    ) candidates;
+
+    IF scanned_ids IS NULL THEN
+        RETURN QUERY SELECT 0, after_id;
+        RETURN;
+    END IF;
+
+    DELETE FROM receivers r
+    WHERE r.id = ANY(scanned_ids)
+    AND NOT EXISTS (SELECT 1 FROM quotes q WHERE q.receiver_id = r.id)
+    AND NOT EXISTS (SELECT 1 FROM reembolsos rb WHERE rb.receiver_id = r.id)
+    AND NOT EXISTS (SELECT 1 FROM expenses e WHERE e.receiver_id = r.id)
+    AND NOT EXISTS (SELECT 1 FROM quotes_archive qa WHERE qa.receiver_id = r.id)
+    AND NOT EXISTS (SELECT 1 FROM reembolsos_archive ra WHERE ra.receiver_id = r.id)
+    AND NOT EXISTS (SELECT 1 FROM expenses_archive ea WHERE ea.receiver_id = r.id);
+
+    GET DIAGNOSTICS deleted_count = ROW_COUNT;
+
+    -- last_id advances past kept receivers too, so the walk always terminates
+    RETURN QUERY SELECT deleted_count, scanned_ids[array_length(scanned_ids, 1)];
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Only the service role may run the purge job
+REVOKE ALL ON FUNCTION purge_deleted_expenses(INTEGER, INTEGER, BIGINT, BOOLEAN) FROM PUBLIC;
+REVOKE ALL ON FUNCTION purge_deleted_receivers(INTEGER, INTEGER, BIGINT) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION purge_deleted_expenses(INTEGER, INTEGER, BIGINT, BOOLEAN) TO service_role;
+GRANT EXECUTE ON FUNCTION purge_deleted_receivers(INTEGER, INTEGER, BIGINT) TO service_role;
+
+-- 🎉 Purge setup complete!
+-- Run `python purge_deleted.py --older-than-days 30` to purge soft-deleted rows.
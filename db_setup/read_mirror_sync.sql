@@ -0,0 +1,97 @@
+-- 🪞 Read mirror sync
+-- functions/f_read_mirror.py keeps a local SQLite copy of the tables below and pulls only what
+-- changed since its last pass: rows whose updated_at (created_at for tables that are only ever
+-- inserted and deleted) is past its watermark. Soft deletes arrive as ordinary updates.
+-- Hard deletes leave no row to find, so an AFTER DELETE trigger records each one in
+-- mirror_tombstones: junction rows replaced by update_expense/update_receiver, remove_role_from_user,
+-- and expenses moved out by the purge and archive functions (including their cascades).
+
+-- ========================================
+-- 1. WATERMARK INDEXES
+-- ========================================
+
+CREATE INDEX IF NOT EXISTS idx_users_updated_at ON users(updated_at);
+CREATE INDEX IF NOT EXISTS idx_categories_updated_at ON categories(updated_at);
+CREATE INDEX IF NOT EXISTS idx_accounts_updated_at ON accounts(updated_at);
+CREATE INDEX IF NOT EXISTS idx_receivers_updated_at ON receivers(updated_at);
+CREATE INDEX IF NOT EXISTS idx_expenses_updated_at ON expenses(updated_at);
+CREATE INDEX IF NOT EXISTS idx_user_roles_created_at ON user_roles(created_at);
+CREATE INDEX IF NOT EXISTS idx_expense_categories_created_at ON expense_categories(created_at);
+CREATE INDEX IF NOT EXISTS idx_expense_accounts_created_at ON expense_accounts(created_at);
+CREATE INDEX IF NOT EXISTS idx_receiver_categories_created_at ON receiver_categories(created_at);
+CREATE INDEX IF NOT EXISTS idx_receiver_accounts_created_at ON receiver_accounts(created_at);
+
+-- ========================================
+-- 2. TOMBSTONES
+-- ========================================
+
+CREATE TABLE IF NOT EXISTS mirror_tombstones (
+    id BIGSERIAL PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    row_key JSONB NOT NULL, -- primary key columns of the deleted row
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_mirror_tombstones_deleted_at ON mirror_tombstones(deleted_at);
+
+-- Trigger arguments are the table's primary key columns
+CREATE OR REPLACE FUNCTION record_mirror_tombstone()
+RETURNS TRIGGER AS $$
+DECLARE
+    old_row JSONB := to_jsonb(OLD);
+    key_column TEXT;
+    row_key JSONB := '{}'::jsonb;
+BEGIN
+    FOREACH key_column IN ARRAY TG_ARGV LOOP
+        row_key := row_key || jsonb_build_object(key_column, old_row -> key_column);
+    END LOOP;
+    INSERT INTO mirror_tombstones (table_name, row_key) VALUES (TG_TABLE_NAME, row_key);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS mirror_tombstone_users ON users;
+CREATE TRIGGER mirror_tombstone_users AFTER DELETE ON users FOR EACH ROW EXECUTE FUNCTION record_mirror_tombstone('id');
+DROP TRIGGER IF EXISTS mirror_tombstone_user_roles ON user_roles;
+CREATE TRIGGER mirror_tombstone_user_roles AFTER DELETE ON user_roles FOR EACH ROW EXECUTE FUNCTION record_mirror_tombstone('user_id', 'role');
+DROP TRIGGER IF EXISTS mirror_tombstone_categories ON categories;
+CREATE TRIGGER mirror_tombstone_categories AFTER DELETE ON categories FOR EACH ROW EXECUTE FUNCTION record_mirror_tombstone('id');
+DROP TRIGGER IF EXISTS mirror_tombstone_accounts ON accounts;
+CREATE TRIGGER mirror_tombstone_accounts AFTER DELETE ON accounts FOR EACH ROW EXECUTE FUNCTION record_mirror_tombstone('id');
+DROP TRIGGER IF EXISTS mirror_tombstone_receivers ON receivers;
+CREATE TRIGGER mirror_tombstone_receivers AFTER DELETE ON receivers FOR EACH ROW EXECUTE FUNCTION record_mirror_tombstone('id');
+DROP TRIGGER IF EXISTS mirror_tombstone_expenses ON expenses;
+CREATE TRIGGER mirror_tombstone_expenses AFTER DELETE ON expenses FOR EACH ROW EXECUTE FUNCTION record_mirror_tombstone('id');
+DROP TRIGGER IF EXISTS mirror_tombstone_expense_categories ON expense_categories;
+CREATE TRIGGER mirror_tombstone_expense_categories AFTER DELETE ON expense_categories FOR EACH ROW EXECUTE FUNCTION record_mirror_tombstone('expense_id', 'category_id');
+DROP TRIGGER IF EXISTS mirror_tombstone_expense_accounts ON expense_accounts;
+CREATE TRIGGER mirror_tombstone_expense_accounts AFTER DELETE ON expense_accounts FOR EACH ROW EXECUTE FUNCTION record_mirror_tombstone('expense_id', 'account_id');
+DROP TRIGGER IF EXISTS mirror_tombstone_receiver_categories ON receiver_categories;
+CREATE TRIGGER mirror_tombstone_receiver_categories AFTER DELETE ON receiver_categories FOR EACH ROW EXECUTE FUNCTION record_mirror_tombstone('receiver_id', 'category_id');
+DROP TRIGGER IF EXISTS mirror_tombstone_receiver_accounts ON receiver_accounts;
+CREATE TRIGGER mirror_tombstone_receiver_accounts AFTER DELETE ON receiver_accounts FOR EACH ROW EXECUTE FUNCTION record_mirror_tombstone('receiver_id', 'account_id');
+
+-- ========================================
+-- 3. RETENTION
+-- ========================================
+
+-- Mirrors that have not synced for longer than this rebuild from scratch
+-- (TOMBSTONE_RETENTION_DAYS in f_read_mirror.py), so older tombstones can go.
+-- Called by purge_deleted.py; returns the number of tombstones removed.
+CREATE OR REPLACE FUNCTION prune_mirror_tombstones(older_than_days INTEGER DEFAULT 7)
+RETURNS INTEGER AS $$
+DECLARE
+    removed INTEGER;
+BEGIN
+    DELETE FROM mirror_tombstones WHERE deleted_at < NOW() - make_interval(days => older_than_days);
+    GET DIAGNOSTICS removed = ROW_COUNT;
+    RETURN removed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ========================================
+-- 4. SECURITY
+-- ========================================
+
+-- Only the service role (which bypasses RLS) reads tombstones
+ALTER TABLE mirror_tombstones ENABLE ROW LEVEL SECURITY;
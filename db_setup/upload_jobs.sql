@@ -0,0 +1,56 @@
+-- 📤 Background upload jobs
+-- Quotes and payment receipts are uploaded to storage by an in-process worker pool
+-- (functions/f_upload_queue.py) after the expense is saved, so the submit button never
+-- waits on storage. Each upload is a row here; the pages poll it to show progress.
+-- An expense's attachment status is the status of its latest job. It is kept here rather
+-- than on expenses so uploads never bump expenses.updated_at, which the transition RPC
+-- uses for optimistic concurrency (same reason as expense_leases.sql).
+-- Run after file_blobs.sql.
+
+-- ========================================
+-- 1. JOBS TABLE
+-- ========================================
+
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    expense_id BIGINT REFERENCES expenses(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL, -- 'quote' or 'receipt'
+    bucket TEXT NOT NULL,
+    file_name TEXT,
+    file_size BIGINT,
+    status TEXT DEFAULT 'pending' NOT NULL,
+    attempts INTEGER DEFAULT 0 NOT NULL,
+    error TEXT,
+    payload JSONB, -- extra columns for the quotes / payment_receipts row
+    result_id BIGINT, -- id of the quotes / payment_receipts row once done
+    created_by UUID REFERENCES users(id) ON DELETE SET NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() NOT NULL,
+
+    CONSTRAINT upload_jobs_kind_check CHECK (kind IN ('quote', 'receipt')),
+    CONSTRAINT upload_jobs_status_check CHECK (status IN ('pending', 'uploading', 'done', 'failed'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_expense_id ON upload_jobs(expense_id);
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_created_by ON upload_jobs(created_by, created_at DESC);
+
+-- The app process (host:pid) holding the file bytes, and its last sign of life. Open jobs
+-- whose owner is gone or whose heartbeat is stale are failed by the other workers.
+ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS owner TEXT;
+ALTER TABLE upload_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP WITH TIME ZONE;
+
+-- Open jobs, checked by every worker's heartbeat (the file bytes live in the owner process)
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_open ON upload_jobs(id) WHERE status IN ('pending', 'uploading');
+
+-- Only accessed with the service role key
+ALTER TABLE upload_jobs ENABLE ROW LEVEL SECURITY;
+
+-- ========================================
+-- 2. TRIGGERS
+-- ========================================
+
+DROP TRIGGER IF EXISTS update_upload_jobs_updated_at ON upload_jobs;
+CREATE TRIGGER update_upload_jobs_updated_at BEFORE UPDATE ON upload_jobs
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- 🎉 Upload jobs ready!
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Export every payment receipt and quote for a period (or a payment run) as a ZIP with a CSV manifest
+"""
+
+import os
+import csv
+import time
+import hashlib
+import argparse
+import tempfile
+import zipfile
+import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Any
+from archive_expenses import get_supabase_admin_client
+
+PAGE_SIZE = 1000
+STREAM_CHUNK = 1024 * 1024
+
+MANIFEST_COLUMNS = ["kind", "expense_id", "record_id", "file_name", "zip_path", "file_size", "sha256", "uploaded_at", "file_url", "status"]
+
+def iter_rows(supabase_admin, table: str, apply_filters) -> Iterator[Dict[str, Any]]:
+    """Keyset-paginate a table by id so no page holds more than PAGE_SIZE rows"""
+    after_id = 0
+    while True:
+        query = supabase_admin.table(table).select('*').gt('id', after_id)
+        response = apply_filters(query).order('id').limit(PAGE_SIZE).execute()
+        if not response.data:
+            return
+        yield from response.data
+        after_id = response.data[-1]['id']
+
+def iter_attachments(supabase_admin, start: date = None, end: date = None, expense_ids: List[int] = None) -> Iterator[Dict[str, Any]]:
+    """Receipts uploaded in [start, end] (or of the given expenses), then the quotes of the same expenses
+
+    Hot and archived tables are both read, so closed periods can be audited too.
+    """
+    def receipt_filters(query):
+        if expense_ids:
+            return query.in_('expense_id', expense_ids)
+        return query.gte('uploaded_at', start.isoformat()).lt('uploaded_at', (end + timedelta(days=1)).isoformat())
+
+    seen_expenses = set(expense_ids or [])
+    for table in ('payment_receipts', 'payment_receipts_archive'):
+        for row in iter_rows(supabase_admin, table, receipt_filters):
+            seen_expenses.add(row['expense_id'])
+            yield {**row, "kind": "receipt"}
+
+    ids = sorted(seen_expenses)
+    # Keep the IN lists short enough for the request URL
+    for i in range(0, len(ids), 200):
+        batch = ids[i:i + 200]
+        for table in ('quotes', 'quotes_archive'):
+            for row in iter_rows(supabase_admin, table, lambda query: query.in_('expense_id', batch)):
+                yield {**row, "kind": "quote"}
+
+def _object_url(file_url: str) -> str:
+    """Authenticated download URL for a stored public URL, so private buckets work too"""
+    return file_url.replace("/storage/v1/object/public/", "/storage/v1/object/authenticated/", 1)
+
+def download_to_temp(session: requests.Session, headers: Dict[str, str], row: Dict[str, Any], temp_dir: str) -> Dict[str, Any]:
+    """Stream one object to a temp file, hashing on the way; returns the row with path/status"""
+    fd, path = tempfile.mkstemp(dir=temp_dir)
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as f, session.get(_object_url(row['file_url']), headers=headers, stream=True, timeout=120) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(STREAM_CHUNK):
+                f.write(chunk)
+                hasher.update(chunk)
+                size += len(chunk)
+        return {**row, "temp_path": path, "downloaded_size": size, "sha256": hasher.hexdigest(), "status": "ok"}
+    except Exception as e:
+        os.remove(path)
+        return {**row, "temp_path": None, "downloaded_size": 0, "sha256": "", "status": f"error: {str(e)}"}
+
+def _zip_path(row: Dict[str, Any]) -> str:
+    file_name = (row.get('file_name') or os.path.basename(row['file_url'])).replace('/', '_')
+    folder = "comprobantes" if row['kind'] == "receipt" else "cotizaciones"
+    return f"{folder}/{row['expense_id']}/{row['id']}_{file_name}"
+
+def export_audit_bundle(output_path: str, start: date = None, end: date = None, expense_ids: List[int] = None,
+                        workers: int = 4) -> int:
+    """Write the bundle incrementally; memory stays bounded by workers x chunk size"""
+    supabase_admin = get_supabase_admin_client()
+    if not supabase_admin:
+        return 0
+
+    service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    headers = {"Authorization": f"Bearer {service_key}", "apikey": service_key}
+    session = requests.Session()
+    started = time.time()
+    written = 0
+    total_bytes = 0
+
+    with tempfile.TemporaryDirectory() as temp_dir, \
+            zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as bundle, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        manifest_path = os.path.join(temp_dir, "manifest.csv")
+        with open(manifest_path, "w", newline="", encoding="utf-8") as manifest_file:
+            manifest = csv.DictWriter(manifest_file, fieldnames=MANIFEST_COLUMNS)
+            manifest.writeheader()
+
+            def write_entry(result: Dict[str, Any]) -> None:
+                nonlocal written, total_bytes
+                zip_path = _zip_path(result) if result['temp_path'] else ""
+                if result['temp_path']:
+                    # Already-compressed formats are stored, the rest deflated
+                    compress = zipfile.ZIP_STORED if zip_path.lower().endswith(('.jpg', '.jpeg', '.png', '.pdf', '.zip')) else zipfile.ZIP_DEFLATED
+                    bundle.write(result['temp_path'], zip_path, compress_type=compress)
+                    os.remove(result['temp_path'])
+                    written += 1
+                    total_bytes += result['downloaded_size']
+                manifest.writerow({
+                    "kind": result['kind'],
+                    "expense_id": result['expense_id'],
+                    "record_id": result['id'],
+                    "file_name": result.get('file_name'),
+                    "zip_path": zip_path,
+                    "file_size": result['downloaded_size'],
+                    "sha256": result['sha256'],
+                    "uploaded_at": result.get('uploaded_at'),
+                    "file_url": result['file_url'],
+                    "status": result['status']
+                })
+                if written and written % 50 == 0:
+                    print(f"   📦 {written} files ({total_bytes / 1024 / 1024:.1f} MB)")
+
+            # At most 2 x workers downloads in flight, consumed in submission order
+            in_flight = deque()
+            for row in iter_attachments(supabase_admin, start, end, expense_ids):
+                in_flight.append(pool.submit(download_to_temp, session, headers, row, temp_dir))
+                if len(in_flight) >= workers * 2:
+                    write_entry(in_flight.popleft().result())
+            while in_flight:
+                write_entry(in_flight.popleft().result())
+
+        bundle.write(manifest_path, "manifest.csv")
+
+    elapsed = time.time() - started
+    print(f"✅ Wrote {written} files ({total_bytes / 1024 / 1024:.1f} MB) to {output_path} in {elapsed:.1f}s")
+    return written
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Export receipts and quotes as a ZIP with a CSV manifest")
+    parser.add_argument("--start", type=date.fromisoformat, help="First receipt upload date (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="Last receipt upload date (YYYY-MM-DD)")
+    parser.add_argument("--expense-ids", type=int, nargs="+", help="Export a payment run: these expenses only")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent downloads")
+    parser.add_argument("--output", default=None, help="ZIP file to write")
+    args = parser.parse_args()
+
+    if not args.expense_ids and not (args.start and args.end):
+        parser.error("Pass --start and --end, or --expense-ids")
+
+    output = args.output or (f"auditoria_{args.start}_{args.end}.zip" if args.start else "auditoria_lote.zip")
+
+    print("🗂️ Exporting audit bundle")
+    print("=" * 40)
+    if args.expense_ids:
+        print(f"   Expenses: {len(args.expense_ids)}")
+    else:
+        print(f"   Period: {args.start} → {args.end}")
+    print(f"   Workers: {args.workers}")
+
+    try:
+        export_audit_bundle(output, args.start, args.end, args.expense_ids, args.workers)
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import streamlit as st
+import os
+import pandas as pd
+from supabase import create_client
+from typing import Dict, List, Any
+
+# Percentiles reported for approval and payment lead times
+LEAD_TIME_PERCENTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+LEAD_TIME_COLUMNS = ['group_key', 'expenses'] + [
+    f"{stage}_{name}" for stage in ('approval', 'payment') for name in LEAD_TIME_PERCENTILES
+]
+
+def get_lead_time_percentiles(start_date: str, end_date: str, group_by: str = 'month') -> List[Dict[str, Any]]:
+    """Get p50/p90/p99 lead times (hours) grouped by 'approver', 'category' or 'month', aggregated server-side"""
+    try:
+        # Use service role key; lead-time functions read logs, which has no RLS policies
+        url = os.environ.get("SUPABASE_URL")
+        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not service_key:
+            st.error("Missing Supabase service role key. Cannot fetch lead times.")
+            return []
+
+        supabase_admin = create_client(url, service_key)
+        response = supabase_admin.rpc('expense_lead_time_percentiles', {
+            'p_start': start_date,
+            'p_end': end_date,
+            'p_group_by': group_by
+        }).execute()
+        return response.data or []
+    except Exception as e:
+        st.error(f"Error getting lead time percentiles: {str(e)}")
+        return []
+
+def lead_time_percentiles(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Table of get_lead_time_percentiles() rows with numeric columns, in report column order"""
+    df = pd.DataFrame(rows, columns=LEAD_TIME_COLUMNS)
+    for column in LEAD_TIME_COLUMNS[1:]:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    return df
@@ -0,0 +1,247 @@
+import os
+import time
+import pickle
+import sqlite3
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set
+
+try:
+    import redis
+except ImportError:  # only needed for PAGOS_CACHE_BACKEND=redis
+    redis = None
+
+# Storage for f_shared_cache. Values are stored as bytes (pickle protocol 5) with a TTL and
+# optional tags; invalidate_tags() drops every key carrying one of the tags.
+#  - memory: per-process LRU (default)
+#  - sqlite: one WAL-mode file shared by every app process on the host; survives restarts
+#  - redis:  any client speaking the Redis commands used here (redis.Redis, or a local stand-in)
+# Selected with PAGOS_CACHE_BACKEND; see cache_backend_from_env().
+CACHE_BACKEND = os.environ.get("PAGOS_CACHE_BACKEND", "memory")
+CACHE_PATH = os.environ.get("PAGOS_CACHE_PATH", os.path.join(tempfile.gettempdir(), "pagos-cache.sqlite3"))
+REDIS_URL = os.environ.get("PAGOS_REDIS_URL", "redis://localhost:6379/0")
+MEMORY_MAX_ENTRIES = 1024
+
+PICKLE_PROTOCOL = 5
+
+def dumps(value) -> bytes:
+    return pickle.dumps(value, protocol=PICKLE_PROTOCOL)
+
+def loads(data: bytes):
+    return pickle.loads(data)
+
+class CacheBackend(ABC):
+    """Byte store with per-key TTL and tag invalidation"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def invalidate_tags(self, *tags: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+class MemoryLRUBackend(CacheBackend):
+    """In-process store bounded by entry count, least recently used evicted first"""
+
+    def __init__(self, max_entries: int = MEMORY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, tags)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    def _drop(self, key: str) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None:
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, time.time() + ttl, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def invalidate_tags(self, *tags: str) -> None:
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+class SQLiteBackend(CacheBackend):
+    """Store in a local SQLite file; WAL lets every worker process read while one writes"""
+
+    PRUNE_EVERY = 200
+
+    def __init__(self, path: str = CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_tags (
+                tag TEXT NOT NULL,
+                key TEXT NOT NULL,
+                PRIMARY KEY (tag, key)
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_expires_at ON cache_entries(expires_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_tags_key ON cache_tags(key)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, sqlite3.Binary(value), time.time() + ttl)
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)", [(tag, key) for tag in tags]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune()
+
+    def _prune(self) -> None:
+        """Delete expired entries and their tags (caller holds the lock)"""
+        self._conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+        self._conn.execute("DELETE FROM cache_tags WHERE key NOT IN (SELECT key FROM cache_entries)")
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            self._conn.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+
+    def invalidate_tags(self, *tags: str) -> None:
+        if not tags:
+            return
+        placeholders = ", ".join("?" for _ in tags)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    f"DELETE FROM cache_entries WHERE key IN (SELECT key FROM cache_tags WHERE tag IN ({placeholders}))", tags
+                )
+                self._conn.execute(f"DELETE FROM cache_tags WHERE tag IN ({placeholders})", tags)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache_entries")
+            self._conn.execute("DELETE FROM cache_tags")
+
+class RedisBackend(CacheBackend):
+    """Store in Redis (7.0 or later); uses only GET, SET PX, DELETE, SADD, PEXPIRE NX/GT, SMEMBERS and SCAN"""
+
+    def __init__(self, client, prefix: str = "pagos:cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self._key(key))
+
+    def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str] = ()) -> None:
+        ttl_ms = max(1, int(ttl * 1000))
+        self.client.set(self._key(key), value, px=ttl_ms)
+        for tag in tags:
+            self.client.sadd(self._tag_key(tag), key)
+            # A tag set lives as long as its longest-lived key: NX gives a new set its TTL,
+            # GT only ever extends it, so a short-TTL write cannot orphan longer-lived keys
+            self.client.pexpire(self._tag_key(tag), ttl_ms, nx=True)
+            self.client.pexpire(self._tag_key(tag), ttl_ms, gt=True)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self._key(key))
+
+    def invalidate_tags(self, *tags: str) -> None:
+        for tag in tags:
+            members = self.client.smembers(self._tag_key(tag))
+            keys = [self._key(m.decode() if isinstance(m, bytes) else m) for m in members]
+            self.client.delete(*keys, self._tag_key(tag))
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+def cache_backend_from_env() -> CacheBackend:
+    """Backend named by PAGOS_CACHE_BACKEND (memory, sqlite or redis)"""
+    if CACHE_BACKEND == "sqlite":
+        return SQLiteBackend(CACHE_PATH)
+    if CACHE_BACKEND == "redis":
+        if redis is None:
+            raise RuntimeError("PAGOS_CACHE_BACKEND=redis requires the redis package")
+        return RedisBackend(redis.Redis.from_url(REDIS_URL))
+    return MemoryLRUBackend()
@@ -0,0 +1,123 @@
+import streamlit as st
+import pandas as pd
+from typing import Dict, List, Optional, Any
+from functions.f_read import get_expense_detail, get_user_names
+
+def _name(person) -> str:
+    return person['name'] if person else 'N/A'
+
+def show_expense_detail(expense_id: int) -> None:
+    """Detail panel for one expense, rendered from a single get_expense_detail() request"""
+    expense = get_expense_detail(expense_id)
+    if not expense:
+        st.error("No se pudo obtener la información del gasto.")
+        return
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.write(f"**ID:** {expense['id']}")
+        st.write(f"**Solicitante:** {_name(expense.get('requester'))}")
+        st.write(f"**Email del solicitante:** {expense['requester']['email'] if expense.get('requester') else 'N/A'}")
+        st.write(f"**Descripción:** {expense.get('description') or 'N/A'}")
+        st.write(f"**Monto:** ${expense['amount']:.2f}")
+        st.write(f"**Prioridad:** {expense.get('priority', 'N/A')}")
+        st.write(f"**Categorías:** {', '.join(c['description'] for c in expense['categories']) or 'N/A'}")
+        st.write(f"**Cuentas:** {', '.join(a['description'] for a in expense['accounts']) or 'N/A'}")
+
+    with col2:
+        st.write(f"**Estado:** {expense['phase']}")
+        st.write(f"**Fecha de creación:** {expense['created_at'][:10]}")
+        st.write(f"**Proveedor:** {_name(expense.get('receiver'))}")
+        st.write(f"**Método de pago:** {expense.get('payment_method') or 'N/A'}")
+        st.write(f"**Aprobado por:** {_name(expense.get('approver'))}")
+        st.write(f"**Pagado por:** {_name(expense.get('payer'))}")
+
+    if expense.get('reembolsos'):
+        st.markdown("---")
+        st.write("**💰 Reembolso a:** " + ", ".join(_name(r.get('receiver')) for r in expense['reembolsos']))
+
+    if expense.get('quotes'):
+        st.markdown("---")
+        st.write("**📄 Cotizaciones:**")
+        for quote in expense['quotes']:
+            st.markdown(f"- [{quote.get('file_name') or 'Cotización'}]({quote['file_url']}) — ${float(quote['total']):.2f}")
+
+    if expense.get('payment_receipts'):
+        st.markdown("---")
+        st.write("**🧾 Comprobantes:**")
+        for receipt in expense['payment_receipts']:
+            if receipt.get('thumbnail_url'):
+                st.image(receipt['thumbnail_url'], width=160)
+            st.markdown(f"- [{receipt.get('file_name') or 'Comprobante'}]({receipt['file_url']})")
+
+    if expense.get('comments'):
+        st.markdown("---")
+        st.write("**💬 Comentarios:**")
+        for comment in expense['comments']:
+            st.write(f"**{_name(comment.get('author'))}** ({comment['created_at'][:10]}): {comment['content']}")
+
+PHASE_ICONS = {
+    'Creado': '🟡',
+    'Aprobado': '🟢',
+    'Rechazado': '🔴',
+    'Pagado': '🟦'
+}
+
+PRIORITY_ICONS = {
+    'Urgente': '🔴',
+    'Alta': '🟠',
+    'Media': '🟡',
+    'Baja': '🟢'
+}
+
+def expense_table(expenses: List[Dict[str, Any]], extra_columns: Dict[str, List[Any]] = None) -> pd.DataFrame:
+    """Summary columns of a list of expenses as a DataFrame (the grid is sent to the browser as Arrow)
+
+    extra_columns adds page-specific columns, one value per expense in the same order.
+    """
+    # Summary rows (ExpenseQuery.fetch(), Expense records) carry the requester's name; resolve the rest in one query
+    missing = [e.get('requester_id') for e in expenses if 'requester_name' not in e]
+    names = get_user_names(missing) if missing else {}
+
+    table = pd.DataFrame({
+        "ID": [e['id'] for e in expenses],
+        "Estado": [f"{PHASE_ICONS.get(e['phase'], '⚪')} {e['phase']}" for e in expenses],
+        "Prioridad": [f"{PRIORITY_ICONS.get(e.get('priority') or 'Media', '⚪')} {e.get('priority') or 'Media'}" for e in expenses],
+        "Monto": [float(e['amount']) for e in expenses],
+        "Descripción": [e.get('description') or '' for e in expenses],
+        "Solicitante": [e.get('requester_name') or names.get(e.get('requester_id'), 'N/A') for e in expenses],
+        "Creado": pd.to_datetime([e['created_at'] for e in expenses], utc=True),
+        "Actualizado": pd.to_datetime([e['updated_at'] for e in expenses], utc=True)
+    })
+    for column, values in (extra_columns or {}).items():
+        table[column] = values
+    return table
+
+def show_expense_table(expenses: List[Dict[str, Any]], key: str, extra_columns: Dict[str, List[Any]] = None) -> Optional[int]:
+    """Expense list as a single grid element; returns the id of the selected row
+
+    Sorting and searching happen in the browser on the Arrow table, and row actions
+    go through the selection, so a rerun sends one element however long the list is.
+    Details are only fetched for the selected row.
+    """
+    table = expense_table(expenses, extra_columns)
+
+    event = st.dataframe(
+        table,
+        column_config={
+            "ID": st.column_config.NumberColumn("ID", width="small", format="%d"),
+            "Monto": st.column_config.NumberColumn("Monto", format="$%.2f"),
+            "Descripción": st.column_config.TextColumn("Descripción", width="large"),
+            "Creado": st.column_config.DatetimeColumn("Creado", format="YYYY-MM-DD"),
+            "Actualizado": st.column_config.DatetimeColumn("Actualizado", format="YYYY-MM-DD HH:mm")
+        },
+        hide_index=True,
+        use_container_width=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=key
+    )
+
+    selected = event.selection.rows
+    return int(table["ID"].iloc[selected[0]]) if selected else None
@@ -3,7 +3,11 @@ import os
 from supabase import create_client, Client
 from typing import Dict, List, Optional, Any
 import time
+import traceback
 from datetime import datetime
+from functions.f_storage import upload_file
+from functions.f_read import invalidate_expense_detail, invalidate_shared_reads, EXPENSE_SHARED_QUERIES
+from functions.f_working_set import apply_expense_change, discard_expense
 
 # Initialize Supabase client
 @st.cache_resource
@@ -83,6 +87,45 @@ def get_user_roles(user_id: str) -> List[str]:
         st.error(f"Error getting user roles: {str(e)}")
         return []
 
+def _expense_reads_changed(expense_id) -> None:
+    """Drop cached reads that include an expense after writing to it"""
+    invalidate_expense_detail(expense_id)
+    invalidate_shared_reads(*EXPENSE_SHARED_QUERIES)
+
+def log_expense_event(expense_id: int, actor_id: str, event_type: str, from_phase: str = None,
+                      to_phase: str = None, details: Dict[str, Any] = None) -> bool:
+    """Append a structured event for an expense to the logs table (see db_setup/expense_events.sql)
+
+    Only writes the event; callers invalidate cached reads. Also runs on upload worker threads.
+    """
+    try:
+        # Use service role key; logs has no RLS policies for writes
+        url = os.environ.get("SUPABASE_URL")
+        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not service_key:
+            return False
+            
+        # Create client with service role key to bypass RLS
+        supabase_admin = create_client(url, service_key)
+        
+        content = f"{from_phase or '-'} -> {to_phase}" if to_phase else event_type
+        log_data = {
+            "expense_id": expense_id,
+            "created_by": actor_id,
+            "content": content,
+            "event_type": event_type,
+            "from_phase": from_phase,
+            "to_phase": to_phase,
+            "details": details
+        }
+        
+        response = supabase_admin.table('logs').insert(log_data).execute()
+        return len(response.data) > 0
+    except Exception:
+        # Never fail the mutation because its log entry could not be written
+        traceback.print_exc()
+        return False
+
 def create_expense(expense_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Create a new expense with multiple categories and accounts"""
     try:
@@ -119,25 +162,43 @@ def create_expense(expense_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
             account_relations = [{'expense_id': expense_id, 'account_id': acc_id} for acc_id in account_ids]
             supabase_admin.table('expense_accounts').insert(account_relations).execute()
         
+        log_expense_event(expense_id, expense.get('requester_id') or expense_data.get('user_id'), 'phase_transition',
+                          to_phase=expense.get('phase') or 'Creado')
+        _expense_reads_changed(expense_id)
+        apply_expense_change(expense)
+        
         return expense
     except Exception as e:
         st.error(f"Error creating expense: {str(e)}")
         return None
 
-def update_expense(expense_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-    """Update an existing expense"""
+def update_expense(expense_id: str, update_data: Dict[str, Any], actor_id: str = None,
+                   expected_updated_at: str = None) -> Optional[Dict[str, Any]]:
+    """Update an existing expense's fields (phase changes go through transition_expense / override_expense_phase)
+    
+    With expected_updated_at the update only applies if nobody changed the row since it was read.
+    """
     try:
         supabase = get_supabase_client()
         if not supabase:
             return None
             
-        response = supabase.table('expenses').update(update_data).eq('id', expense_id).execute()
+        query = supabase.table('expenses').update(update_data).eq('id', expense_id)
+        if expected_updated_at:
+            query = query.eq('updated_at', expected_updated_at)
+        response = query.execute()
+        if not response.data and expected_updated_at:
+            st.warning("El gasto fue modificado por otro usuario. Recarga la página e intenta de nuevo.")
+        if response.data:
+            _expense_reads_changed(expense_id)
+            apply_expense_change(response.data[0])
+            log_expense_event(expense_id, actor_id, 'updated', details={'fields': sorted(update_data.keys())})
         return response.data[0] if response.data else None
     except Exception as e:
         st.error(f"Error updating expense: {str(e)}")
         return None
 
-def delete_expense(expense_id: str) -> bool:
+def delete_expense(expense_id: str, actor_id: str = None) -> bool:
     """Delete an expense (soft delete)"""
     try:
         supabase = get_supabase_client()
@@ -145,72 +206,227 @@ def delete_expense(expense_id: str) -> bool:
             return False
             
         response = supabase.table('expenses').update({'deleted_at': 'now()'}).eq('id', expense_id).execute()
+        if response.data:
+            _expense_reads_changed(expense_id)
+            discard_expense(expense_id)
+            log_expense_event(expense_id, actor_id, 'deleted')
         return len(response.data) > 0
     except Exception as e:
         st.error(f"Error deleting expense: {str(e)}")
         return False
 
-def approve_expense(expense_id: str, approver_id: str, comments: str = None) -> bool:
-    """Approve an expense"""
+def transition_expense(expense_id: str, target_phase: str, actor_id: str, expected_phase: str = None,
+                       expected_updated_at: str = None, comments: str = None) -> Optional[Dict[str, Any]]:
+    """Move an expense to another phase through the transition_expense_phase RPC
+    
+    Returns {'status': ..., 'expense': {...}} with status ok, conflict, invalid_transition or not_found.
+    """
     try:
-        supabase = get_supabase_client()
-        if not supabase:
-            return False
+        # Use service role key; the RPC enforces the transition rules itself
+        url = os.environ.get("SUPABASE_URL")
+        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not service_key:
+            st.error("Missing Supabase service role key. Cannot update expense phase.")
+            return None
             
-        update_data = {
-            'phase': 'Aprobado',
-            'approver_id': approver_id,
-            'updated_at': 'now()'
-        }
-        
-        if comments:
-            update_data['description'] = comments
+        # Create client with service role key to bypass RLS
+        supabase_admin = create_client(url, service_key)
         
-        response = supabase.table('expenses').update(update_data).eq('id', expense_id).execute()
-        return len(response.data) > 0
+        response = supabase_admin.rpc('transition_expense_phase', {
+            'p_expense_id': expense_id,
+            'p_target_phase': target_phase,
+            'p_actor_id': actor_id,
+            'p_expected_phase': expected_phase,
+            'p_expected_updated_at': expected_updated_at,
+            'p_comments': comments
+        }).execute()
+        _apply_phase_result(expense_id, response.data)
+        return response.data
     except Exception as e:
-        st.error(f"Error approving expense: {str(e)}")
+        st.error(f"Error updating expense phase: {str(e)}")
+        return None
+
+def _apply_phase_result(expense_id: str, result: Optional[Dict[str, Any]]) -> None:
+    """Bring caches and the session's lists up to date with a phase RPC's result"""
+    _expense_reads_changed(expense_id)
+    result = result or {}
+    if result.get('status') == 'ok':
+        _drop_from_claimed_batches(expense_id)
+    # ok and conflict both return the current row; patch the session's lists with it
+    if result.get('expense'):
+        apply_expense_change(result['expense'])
+    elif result.get('status') == 'not_found':
+        discard_expense(expense_id)
+
+def _report_transition_result(result: Optional[Dict[str, Any]]) -> bool:
+    """Show a message for a failed transition and return whether it was applied"""
+    if not result:
         return False
+    
+    status = result.get('status')
+    if status == 'ok':
+        return True
+    
+    current_phase = (result.get('expense') or {}).get('phase', 'N/A')
+    if status == 'conflict':
+        st.warning(f"El gasto fue modificado por otro usuario (estado actual: {current_phase}). Recarga la página e intenta de nuevo.")
+    elif status == 'invalid_transition':
+        st.warning(f"No se puede cambiar el estado de un gasto en fase {current_phase}.")
+    elif status == 'not_found':
+        st.warning("El gasto ya no existe.")
+    return False
 
-def reject_expense(expense_id: str, approver_id: str, comments: str = None) -> bool:
-    """Reject an expense"""
+def override_expense_phase(expense_id: str, target_phase: str, actor_id: str,
+                           expected_updated_at: str = None) -> Optional[Dict[str, Any]]:
+    """Set any phase on an expense, bypassing the transition rules (admin corrections)
+    
+    Returns the updated expense row, or None after reporting a conflict or error.
+    """
     try:
-        supabase = get_supabase_client()
-        if not supabase:
-            return False
+        # Use service role key; the RPC keeps the conflict check and logs the override
+        url = os.environ.get("SUPABASE_URL")
+        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not service_key:
+            st.error("Missing Supabase service role key. Cannot update expense phase.")
+            return None
             
-        update_data = {
-            'phase': 'Rechazado',
-            'approver_id': approver_id,
-            'updated_at': 'now()'
-        }
+        # Create client with service role key to bypass RLS
+        supabase_admin = create_client(url, service_key)
         
-        if comments:
-            update_data['description'] = comments
+        response = supabase_admin.rpc('override_expense_phase', {
+            'p_expense_id': expense_id,
+            'p_target_phase': target_phase,
+            'p_actor_id': actor_id,
+            'p_expected_updated_at': expected_updated_at
+        }).execute()
+        _apply_phase_result(expense_id, response.data)
+        return response.data['expense'] if _report_transition_result(response.data) else None
+    except Exception as e:
+        st.error(f"Error updating expense phase: {str(e)}")
+        return None
+
+def approve_expense(expense_id: str, approver_id: str, comments: str = None, expected_updated_at: str = None) -> bool:
+    """Approve an expense (only from Creado)"""
+    result = transition_expense(expense_id, 'Aprobado', approver_id, 'Creado', expected_updated_at, comments)
+    return _report_transition_result(result)
+
+def reject_expense(expense_id: str, approver_id: str, comments: str = None, expected_updated_at: str = None) -> bool:
+    """Reject an expense (only from Creado)"""
+    result = transition_expense(expense_id, 'Rechazado', approver_id, 'Creado', expected_updated_at, comments)
+    return _report_transition_result(result)
+
+def mark_expense_as_paid(expense_id: str, payer_id: str, payment_date: str = None, expected_updated_at: str = None) -> bool:
+    """Mark an expense as paid (only from Aprobado)"""
+    result = transition_expense(expense_id, 'Pagado', payer_id, 'Aprobado', expected_updated_at)
+    return _report_transition_result(result)
+
+# Leases last CLAIM_LEASE_MINUTES; a session renews its batch this long before they run out
+CLAIM_LEASE_MINUTES = 30
+CLAIM_RENEW_MARGIN_SECONDS = 5 * 60
+# An empty batch (nothing left to claim) looks for new expenses this often
+CLAIM_EMPTY_RETRY_SECONDS = 60
+
+def claim_expenses(actor_id: str, phase: str, batch_size: int = 5, lease_minutes: int = CLAIM_LEASE_MINUTES) -> List[Dict[str, Any]]:
+    """Claim (or renew) the actor's batch of expenses in a phase through the claim_expense_batch RPC"""
+    try:
+        # Use service role key; leases are only reachable through the RPC
+        url = os.environ.get("SUPABASE_URL")
+        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not service_key:
+            st.error("Missing Supabase service role key. Cannot claim expenses.")
+            return []
+            
+        # Create client with service role key to bypass RLS
+        supabase_admin = create_client(url, service_key)
         
-        response = supabase.table('expenses').update(update_data).eq('id', expense_id).execute()
-        return len(response.data) > 0
+        response = supabase_admin.rpc('claim_expense_batch', {
+            'p_actor_id': actor_id,
+            'p_phase': phase,
+            'p_batch_size': batch_size,
+            'p_lease_minutes': lease_minutes
+        }).execute()
+        return response.data or []
     except Exception as e:
-        st.error(f"Error rejecting expense: {str(e)}")
-        return False
+        st.error(f"Error claiming expenses: {str(e)}")
+        return []
+
+def _claimed_batches() -> Dict[str, Dict[str, Any]]:
+    """This session's claimed batches by phase: ids (most urgent first), batch_size, expires_at,
+    claimed_at and released (set by "Liberar lote" until the user asks for a batch again)"""
+    return st.session_state.setdefault('claimed_batches', {})
+
+def batch_released(phase: str) -> bool:
+    """Whether the session released its batch for a phase and has not claimed one since"""
+    return bool(_claimed_batches().get(phase, {}).get('released'))
+
+def get_claimed_batch(actor_id: str, phase: str, batch_size: int = 5, refresh: bool = False) -> List[int]:
+    """Ids of the actor's claimed batch, kept in the session; the claim RPC (a write) only runs
+    on first load, when refresh is set, when the batch has fewer ids than it was claimed with
+    (some were approved, rejected or paid) or than batch_size asks for, or near the lease's end.
+    A released batch stays empty until refresh is set."""
+    batches = _claimed_batches()
+    batch = batches.get(phase)
+    now = time.time()
+    if batch is not None and batch.get('released') and not refresh:
+        return []
+    
+    if batch is not None and not refresh and batch_size < len(batch['ids']):
+        # Hand the least urgent surplus back to the queue instead of renewing its leases
+        for expense_id in batch['ids'][batch_size:]:
+            release_expenses(actor_id, phase, expense_id)
+        batch['ids'] = batch['ids'][:batch_size]
+        batch['batch_size'] = batch['claimed'] = batch_size
+    
+    if (refresh or batch is None
+            or len(batch['ids']) < min(batch_size, batch['claimed'])
+            or batch_size > batch['batch_size']
+            or (not batch['ids'] and now - batch['claimed_at'] >= CLAIM_EMPTY_RETRY_SECONDS)
+            or now >= batch['expires_at'] - CLAIM_RENEW_MARGIN_SECONDS):
+        claimed = claim_expenses(actor_id, phase, batch_size, CLAIM_LEASE_MINUTES)
+        ids = [e['id'] for e in claimed]
+        batch = batches[phase] = {
+            'ids': ids,
+            'batch_size': batch_size,
+            'claimed': len(ids),
+            'claimed_at': now,
+            'expires_at': now + CLAIM_LEASE_MINUTES * 60,
+            'released': False
+        }
+    return batch['ids']
+
+def _drop_from_claimed_batches(expense_id) -> None:
+    """Forget an expense that left its phase, so the next get_claimed_batch fills the vacancy"""
+    for batch in st.session_state.get('claimed_batches', {}).values():
+        if int(expense_id) in batch.get('ids', []):
+            batch['ids'] = [i for i in batch['ids'] if i != int(expense_id)]
 
-def mark_expense_as_paid(expense_id: str, payer_id: str, payment_date: str = None) -> bool:
-    """Mark an expense as paid"""
+def release_expenses(actor_id: str, phase: str, expense_id: int = None) -> bool:
+    """Release one claimed expense, or the actor's whole batch for a phase when expense_id is None"""
     try:
-        supabase = get_supabase_client()
-        if not supabase:
+        # Use service role key; leases are only reachable through the RPC
+        url = os.environ.get("SUPABASE_URL")
+        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not service_key:
+            st.error("Missing Supabase service role key. Cannot release expenses.")
             return False
             
-        update_data = {
-            'phase': 'Pagado',
-            'payer_id': payer_id,
-            'updated_at': 'now()'
-        }
+        # Create client with service role key to bypass RLS
+        supabase_admin = create_client(url, service_key)
         
-        response = supabase.table('expenses').update(update_data).eq('id', expense_id).execute()
-        return len(response.data) > 0
+        supabase_admin.rpc('release_expense_leases', {
+            'p_actor_id': actor_id,
+            'p_phase': phase,
+            'p_expense_id': expense_id
+        }).execute()
+        batches = st.session_state.get('claimed_batches', {})
+        if expense_id is None:
+            # Stay released; get_claimed_batch claims again only when the user asks for a batch
+            batches[phase] = {'ids': [], 'released': True}
+        elif phase in batches:
+            batches[phase]['ids'] = [i for i in batches[phase]['ids'] if i != int(expense_id)]
+        return True
     except Exception as e:
-        st.error(f"Error marking expense as paid: {str(e)}")
+        st.error(f"Error releasing expenses: {str(e)}")
         return False
 
 def create_user(user_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -308,6 +524,7 @@ def create_category(category_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         supabase_admin = create_client(url, service_key)
         
         response = supabase_admin.table('categories').insert(category_data).execute()
+        invalidate_shared_reads('categories')
         return response.data[0] if response.data else None
     except Exception as e:
         st.error(f"Error creating category: {str(e)}")
@@ -333,39 +550,9 @@ def create_account(account_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         return None
 
 def upload_file_to_supabase(file, bucket_name: str = "quotes") -> Optional[Dict[str, Any]]:
-    """Upload file to Supabase Storage"""
+    """Upload file to Supabase Storage (single read of the buffer, chunked for large files)"""
     try:
-        # Use service role key to bypass RLS for file uploads
-        url = os.environ.get("SUPABASE_URL")
-        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
-        if not url or not service_key:
-            st.error("Missing Supabase service role key. Cannot upload file.")
-            return None
-            
-        # Create client with service role key to bypass RLS
-        supabase_admin = create_client(url, service_key)
-        
-        # Generate unique filename
-        import uuid
-        file_extension = file.name.split('.')[-1] if '.' in file.name else ''
-        unique_filename = f"{uuid.uuid4()}.{file_extension}" if file_extension else f"{uuid.uuid4()}"
-        
-        # Upload file to Supabase Storage
-        response = supabase_admin.storage.from_(bucket_name).upload(
-            path=unique_filename,
-            file=file.getvalue(),
-            file_options={"content-type": file.type}
-        )
-        
-        # Get public URL
-        file_url = supabase_admin.storage.from_(bucket_name).get_public_url(unique_filename)
-        
-        return {
-            "file_url": file_url,
-            "file_name": file.name,
-            "file_size": len(file.getvalue()),
-            "storage_path": unique_filename
-        }
+        return upload_file(file, bucket_name)
     except Exception as e:
         st.error(f"Error uploading file: {str(e)}")
         return None
@@ -390,11 +577,16 @@ def create_quote(quote_data: Dict[str, Any], file=None) -> Optional[Dict[str, An
                 quote_data.update({
                     "file_url": file_info["file_url"],
                     "file_name": file_info["file_name"],
-                    "file_size": file_info["file_size"]
+                    "file_size": file_info["file_size"],
+                    "blob_id": file_info["blob_id"]
                 })
         
         # Create quote
         response = supabase_admin.table('quotes').insert(quote_data).execute()
+        if response.data:
+            if quote_data.get('expense_id'):
+                invalidate_expense_detail(quote_data['expense_id'])
+            log_expense_event(quote_data.get('expense_id'), None, 'quote_created', details={'quote_id': response.data[0]['id']})
         return response.data[0] if response.data else None
     except Exception as e:
         st.error(f"Error creating quote: {str(e)}")
@@ -425,11 +617,15 @@ def upload_payment_receipt(expense_id: int, file, payer_id: str) -> Optional[Dic
             "file_url": file_info["file_url"],
             "file_name": file_info["file_name"],
             "file_size": file_info["file_size"],
+            "blob_id": file_info["blob_id"],
             "uploaded_at": datetime.now().isoformat()
         }
         
         # Insert into receipts table (you may need to create this table)
         response = supabase_admin.table('payment_receipts').insert(receipt_data).execute()
+        if response.data:
+            invalidate_expense_detail(expense_id)
+            log_expense_event(expense_id, payer_id, 'receipt_uploaded', details={'receipt_id': response.data[0]['id']})
         return response.data[0] if response.data else None
     except Exception as e:
         st.error(f"Error uploading payment receipt: {str(e)}")
@@ -553,6 +749,9 @@ def create_reimbursement(expense_id: int, receiver_id: int, created_by: str) ->
         }
         
         response = supabase_admin.table('reembolsos').insert(reimbursement_data).execute()
+        if response.data:
+            invalidate_expense_detail(expense_id)
+            log_expense_event(expense_id, created_by, 'reimbursement_created', details={'receiver_id': receiver_id})
         return response.data[0] if response.data else None
     except Exception as e:
         st.error(f"Error creating reimbursement: {str(e)}")
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+from datetime import date
+from typing import Dict, List, Optional, Any
+from functions.f_money import cents_array, mean_cents, from_cents
+
+# Columnar form of expense rows for the aggregation pages still do in memory
+# (metrics, status counts, monthly trends, per-category and per-user totals).
+# Amounts are int64 cents so sums are exact; labels are categoricals (one byte per row)
+# and timestamps datetime64, which keeps 100k expenses at a few MB.
+# An expense can have several categories. df holds one row per expense, so totals, counts
+# and per-user sums count it once; categories live in a separate (id, category) table.
+# sum_by_category() credits the full amount to each of an expense's categories (so the
+# bars can add up to more than the total), and filter(categories=...) keeps an expense
+# when any of its categories matches.
+PHASES = ['Creado', 'Aprobado', 'Rechazado', 'Pagado']
+PRIORITIES = ['Baja', 'Media', 'Alta', 'Urgente']
+NO_CATEGORY = 'Sin categoría'
+
+class ExpenseFrame:
+    """Immutable columnar set of expenses with vectorised filter, group and resample"""
+
+    def __init__(self, df: pd.DataFrame, categories: pd.DataFrame = None):
+        self.df = df
+        # (id, category) pairs; expenses without categories appear once as NO_CATEGORY
+        self.categories = categories if categories is not None else pd.DataFrame({
+            'id': pd.Series(dtype='int64'), 'category': pd.Series(dtype='category')})
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]], category_names: Dict[int, str] = None) -> "ExpenseFrame":
+        """Build from expense dicts or Expense records; only analytic columns are kept
+
+        Category names come from each row's category_ids looked up in category_names, so
+        rows need category_ids (e.g. an expense_categories embed) for per-category results.
+        """
+        if not rows:
+            return cls.empty()
+
+        # Column by column with get(), so dict rows and Expense records both work
+        raw = pd.DataFrame({column: [row.get(column) for row in rows]
+                            for column in ('id', 'amount', 'phase', 'priority', 'category_ids',
+                                           'requester_id', 'created_at', 'updated_at')})
+        category_names = category_names or {}
+        names = raw['category_ids'].map(lambda ids: [category_names.get(i, NO_CATEGORY) for i in ids]
+                                        if isinstance(ids, (list, tuple)) and ids else [NO_CATEGORY])
+        links = pd.DataFrame({'id': raw['id'].astype('int64'), 'category': names}).explode('category')
+        categories = pd.DataFrame({'id': links['id'].to_numpy(dtype='int64'),
+                                   'category': pd.Categorical(links['category'])}).drop_duplicates()
+        df = pd.DataFrame({
+            'id': raw['id'].astype('int64'),
+            'amount_cents': cents_array(raw['amount']),
+            'phase': pd.Categorical(raw['phase'], categories=PHASES),
+            'priority': pd.Categorical(raw['priority'].fillna('Media'), categories=PRIORITIES),
+            'requester_id': raw['requester_id'].astype('category'),
+            'created_at': pd.to_datetime(raw['created_at'], utc=True, format='ISO8601'),
+            'updated_at': pd.to_datetime(raw['updated_at'], utc=True, format='ISO8601')
+        })
+        return cls(df, categories)
+
+    @classmethod
+    def empty(cls) -> "ExpenseFrame":
+        df = pd.DataFrame({
+            'id': pd.Series(dtype='int64'),
+            'amount_cents': pd.Series(dtype='int64'),
+            'phase': pd.Categorical([], categories=PHASES),
+            'priority': pd.Categorical([], categories=PRIORITIES),
+            'requester_id': pd.Series(dtype='category'),
+            'created_at': pd.Series(dtype='datetime64[ns, UTC]'),
+            'updated_at': pd.Series(dtype='datetime64[ns, UTC]')
+        })
+        return cls(df)
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def filter(self, phase: str = None, priorities: List[str] = None, categories: List[str] = None,
+               start: Optional[date] = None, end: Optional[date] = None, column: str = 'created_at',
+               min_amount: float = None, max_amount: float = None) -> "ExpenseFrame":
+        """Rows matching every given condition; start/end are inclusive days of column"""
+        mask = np.ones(len(self.df), dtype=bool)
+        if phase:
+            mask &= (self.df['phase'] == phase).to_numpy()
+        if priorities:
+            mask &= self.df['priority'].isin(priorities).to_numpy()
+        if categories:
+            matching_ids = self.categories.loc[self.categories['category'].isin(categories), 'id']
+            mask &= self.df['id'].isin(matching_ids).to_numpy()
+        if start:
+            mask &= (self.df[column] >= pd.Timestamp(start, tz='UTC')).to_numpy()
+        if end:
+            mask &= (self.df[column] < pd.Timestamp(end, tz='UTC') + pd.Timedelta(days=1)).to_numpy()
+        if min_amount is not None:
+            mask &= (self.df['amount_cents'] >= round(min_amount * 100)).to_numpy()
+        if max_amount is not None:
+            mask &= (self.df['amount_cents'] <= round(max_amount * 100)).to_numpy()
+        df = self.df[mask]
+        return ExpenseFrame(df, self.categories[self.categories['id'].isin(df['id'])])
+
+    def total_cents(self) -> int:
+        return int(self.df['amount_cents'].sum())
+
+    def mean_cents(self) -> int:
+        return mean_cents(self.total_cents(), len(self.df))
+
+    def count_by(self, column: str) -> pd.Series:
+        """Number of expenses per value of a categorical column (values without rows omitted)"""
+        counts = self.df.groupby(column, observed=True).size()
+        return counts[counts > 0]
+
+    def sum_by(self, column: str) -> pd.DataFrame:
+        """amount_cents and count per value of a column, largest amount first
+
+        amount (currency units, float) is included for charts.
+        """
+        grouped = self.df.groupby(column, observed=True)['amount_cents'].agg(['sum', 'count'])
+        result = pd.DataFrame({'amount_cents': grouped['sum'], 'amount': from_cents(grouped['sum']), 'count': grouped['count']})
+        return result.sort_values('amount_cents', ascending=False)
+
+    def sum_by_category(self) -> pd.DataFrame:
+        """Like sum_by('category'); an expense counts in full under each of its categories"""
+        pairs = self.categories.merge(self.df[['id', 'amount_cents']], on='id')
+        grouped = pairs.groupby('category', observed=True)['amount_cents'].agg(['sum', 'count'])
+        result = pd.DataFrame({'amount_cents': grouped['sum'], 'amount': from_cents(grouped['sum']), 'count': grouped['count']})
+        return result.sort_values('amount_cents', ascending=False)
+
+    def resample(self, freq: str = 'MS', column: str = 'created_at') -> pd.DataFrame:
+        """amount_cents, amount and count per period of a timestamp column, empty periods included"""
+        series = self.df.set_index(column)['amount_cents']
+        grouped = series.resample(freq).agg(['sum', 'count'])
+        return pd.DataFrame({'amount_cents': grouped['sum'], 'amount': from_cents(grouped['sum']), 'count': grouped['count']},
+                            index=grouped.index)
+
+    def memory_bytes(self) -> int:
+        return int(self.df.memory_usage(deep=True).sum() + self.categories.memory_usage(deep=True).sum())
@@ -0,0 +1,53 @@
+import streamlit as st
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple
+from PIL import Image, ImageOps
+
+# Phone photos of receipts are several MB; they are stored downsized and recompressed,
+# without EXIF/GPS metadata, plus a small thumbnail for list pages.
+MAX_IMAGE_SIDE = 2000
+IMAGE_QUALITY = 80
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 70
+IMAGE_WORKERS = 2
+
+IMAGE_TYPES = {"image/jpeg", "image/jpg", "image/png"}
+
+@st.cache_resource
+def get_image_pool() -> ProcessPoolExecutor:
+    """Process pool for image work, so decoding and resizing don't hold the GIL of the app process"""
+    # spawn, not fork: the Streamlit server process is multi-threaded
+    return ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def is_image(file) -> bool:
+    """True for the photo formats that are normalised before upload"""
+    return (file.type or "").lower() in IMAGE_TYPES
+
+def _to_jpeg(image: Image.Image, quality: int) -> bytes:
+    # Saving without exif= drops all metadata
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return output.getvalue()
+
+def normalize_image(data: bytes) -> Tuple[bytes, bytes]:
+    """Return (image, thumbnail) as metadata-free JPEGs; runs in the process pool"""
+    with Image.open(io.BytesIO(data)) as source:
+        # Apply the camera rotation before the EXIF tag that carries it is dropped
+        image = ImageOps.exif_transpose(source)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+        image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.Resampling.LANCZOS)
+        normalized = _to_jpeg(image, IMAGE_QUALITY)
+
+        image.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        thumbnail = _to_jpeg(image, THUMBNAIL_QUALITY)
+
+    return normalized, thumbnail
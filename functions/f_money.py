@@ -0,0 +1,48 @@
+import numpy as np
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable, Union
+
+# Amounts are NUMERIC(10,2) in Postgres. They are parsed once into integer cents,
+# added up as integers, and only turned back into text by format_money() for display.
+CENTS_PER_UNIT = 100
+
+Amount = Union[int, float, str, Decimal, None]
+
+def to_cents(amount: Amount) -> int:
+    """Exact cents of one amount as returned by PostgREST (number or numeric string)"""
+    if amount is None:
+        return 0
+    cents = (Decimal(str(amount)) * CENTS_PER_UNIT).quantize(Decimal('1'), rounding=ROUND_HALF_UP)
+    return int(cents)
+
+def cents_array(amounts: Iterable[Amount]) -> np.ndarray:
+    """int64 cents of many amounts at once (missing amounts count as 0)
+
+    NUMERIC(10,2) values have at most 10 significant digits, well inside float64
+    precision, so scaling and rounding to the nearest cent is exact.
+    """
+    values = np.asarray(list(amounts), dtype=np.float64)
+    return np.rint(np.nan_to_num(values) * CENTS_PER_UNIT).astype(np.int64)
+
+def sum_cents(amounts: Iterable[Amount]) -> int:
+    """Exact total, in cents, of many amounts"""
+    return int(cents_array(amounts).sum())
+
+def mean_cents(total_cents: int, count: int) -> int:
+    """Average in cents, rounded half away from zero; 0 for no rows"""
+    if not count:
+        return 0
+    quotient, remainder = divmod(abs(int(total_cents)), int(count))
+    if 2 * remainder >= count:
+        quotient += 1
+    return quotient if total_cents >= 0 else -quotient
+
+def from_cents(cents: int) -> float:
+    """Currency units for charts and plotting libraries (not for further arithmetic)"""
+    return cents / CENTS_PER_UNIT
+
+def format_money(cents: int) -> str:
+    """'$1,234.56' from cents, without going through a float"""
+    units, rest = divmod(abs(int(cents)), CENTS_PER_UNIT)
+    sign = '-' if cents < 0 else ''
+    return f"{sign}${units:,}.{rest:02d}"
@@ -1,8 +1,23 @@
 import streamlit as st
 import os
+import logging
 from supabase import create_client, Client
-from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Any
+from datetime import date, datetime, timedelta
+from functions.f_money import sum_cents, from_cents
+from functions.f_shared_cache import get_shared_cache
+from functions.f_read_mirror import get_read_mirror, EXPENSE_TABLES
+
+# Serve statistics, dashboard lists, categories and ExpenseQuery results from the local
+# read mirror (f_read_mirror) instead of Supabase. Reads fall back to Supabase whenever the
+# mirror is more than READ_MIRROR_MAX_STALENESS seconds behind.
+READ_FROM_MIRROR = os.environ.get("PAGOS_READ_MIRROR") == "1"
+READ_MIRROR_MAX_STALENESS = float(os.environ.get("PAGOS_READ_MIRROR_MAX_STALENESS", "60"))
+
+logger = logging.getLogger(__name__)
+# Mirror reads also run on shared-cache refresh threads, which have no Streamlit session,
+# so a disabled mirror is reported once per process in the log rather than with st.warning
+_read_mirror_disabled_logged = False
 
 # Initialize Supabase client (reuse from f_cud.py)
 @st.cache_resource
@@ -77,20 +92,61 @@ def get_all_users() -> List[Dict[str, Any]]:
         st.error(f"Error getting users: {str(e)}")
         return []
 
-def get_expense_by_id(expense_id: str) -> Optional[Dict[str, Any]]:
-    """Get expense by ID"""
+def _get_archived_expenses(apply_filters, order_column: str = 'created_at', desc: bool = True) -> List[Dict[str, Any]]:
+    """Read expenses moved to expenses_archive by the archival job (see db_setup/archive_closed_expenses.sql)"""
+    # Archive tables have no RLS policies, so they are read with the service role key
+    url = os.environ.get("SUPABASE_URL")
+    service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not service_key:
+        st.error("Missing Supabase service role key. Cannot read archived expenses.")
+        return []
+        
+    supabase_admin = create_client(url, service_key)
+    query = apply_filters(supabase_admin.table('expenses_archive').select('*').is_('deleted_at', 'null'))
+    response = query.order(order_column, desc=desc).execute()
+    return response.data
+
+def _attach_archived_category_ids(expenses: List[Dict[str, Any]], chunk_size: int = 200) -> None:
+    """Set category_ids on archived rows (archive tables have no foreign keys to embed through)"""
+    by_id = {expense['id']: expense for expense in expenses}
+    for expense in expenses:
+        expense['category_ids'] = []
+    if not by_id:
+        return
+    url = os.environ.get("SUPABASE_URL")
+    service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not service_key:
+        st.error("Missing Supabase service role key. Cannot read archived expense categories.")
+        return
+
+    supabase_admin = create_client(url, service_key)
+    ids = list(by_id)
+    for start in range(0, len(ids), chunk_size):
+        response = supabase_admin.table('expense_categories_archive').select('expense_id, category_id').in_('expense_id', ids[start:start + chunk_size]).execute()
+        for row in response.data or []:
+            by_id[row['expense_id']]['category_ids'].append(row['category_id'])
+
+def get_expense_by_id(expense_id: str, include_archived: bool = False) -> Optional[Dict[str, Any]]:
+    """Get expense by ID, falling back to the archive when include_archived is set"""
     try:
         supabase = get_supabase_client()
         if not supabase:
             return None
             
+        if include_archived:
+            response = supabase.table('expenses').select('*').eq('id', expense_id).is_('deleted_at', 'null').execute()
+            if response.data:
+                return response.data[0]
+            archived = _get_archived_expenses(lambda q: q.eq('id', expense_id))
+            return archived[0] if archived else None
+            
         response = supabase.table('expenses').select('*').eq('id', expense_id).is_('deleted_at', 'null').single().execute()
         return response.data if response.data else None
     except Exception as e:
         st.error(f"Error getting expense: {str(e)}")
         return None
 
-def get_expenses_by_user(user_id: str) -> List[Dict[str, Any]]:
+def get_expenses_by_user(user_id: str, include_archived: bool = False) -> List[Dict[str, Any]]:
     """Get all expenses for a specific user"""
     try:
         supabase = get_supabase_client()
@@ -98,38 +154,63 @@ def get_expenses_by_user(user_id: str) -> List[Dict[str, Any]]:
             return []
             
         response = supabase.table('expenses').select('*').eq('requester_id', user_id).is_('deleted_at', 'null').order('created_at', desc=True).execute()
-        return response.data
+        expenses = response.data
+        if include_archived:
+            expenses = expenses + _get_archived_expenses(lambda q: q.eq('requester_id', user_id))
+            expenses.sort(key=lambda e: e['created_at'], reverse=True)
+        return expenses
     except Exception as e:
         st.error(f"Error getting user expenses: {str(e)}")
         return []
 
 def get_pending_expenses() -> List[Dict[str, Any]]:
-    """Get all pending expenses (Creado phase)"""
+    """Get all pending expenses (Creado phase), most urgent and oldest first"""
     try:
         supabase = get_supabase_client()
         if not supabase:
             return []
             
-        response = supabase.table('expenses').select('*').eq('phase', 'Creado').is_('deleted_at', 'null').order('created_at', desc=True).execute()
+        response = supabase.table('expenses').select('*').eq('phase', 'Creado').is_('deleted_at', 'null').order('priority_rank', desc=True).order('created_at').execute()
         return response.data
     except Exception as e:
         st.error(f"Error getting pending expenses: {str(e)}")
         return []
 
 def get_approved_expenses() -> List[Dict[str, Any]]:
-    """Get all approved expenses (Aprobado phase)"""
+    """Get all approved expenses (Aprobado phase), most urgent and oldest first"""
     try:
         supabase = get_supabase_client()
         if not supabase:
             return []
             
-        response = supabase.table('expenses').select('*').eq('phase', 'Aprobado').is_('deleted_at', 'null').order('updated_at', desc=True).execute()
+        response = supabase.table('expenses').select('*').eq('phase', 'Aprobado').is_('deleted_at', 'null').order('priority_rank', desc=True).order('created_at').execute()
         return response.data
     except Exception as e:
         st.error(f"Error getting approved expenses: {str(e)}")
         return []
 
-def get_rejected_expenses() -> List[Dict[str, Any]]:
+def _fetch_review_queue(phase: str, limit: int) -> List[Dict[str, Any]]:
+    mirror = _read_mirror()
+    if mirror:
+        return mirror.expenses("phase = ?", [phase], [('priority_rank', True), ('created_at', False)], limit)
+    supabase = get_supabase_client()
+    if not supabase:
+        raise RuntimeError("Supabase client is not configured")
+    response = supabase.table('expenses').select('*').eq('phase', phase).is_('deleted_at', 'null').order('priority_rank', desc=True).order('created_at').limit(limit).execute()
+    return response.data
+
+def get_review_queue(phase: str = 'Creado', limit: int = 10) -> List[Dict[str, Any]]:
+    """Get the head of the review queue for a phase: most urgent, then oldest (uses idx_expenses_queue)
+
+    Shared by all sessions, see f_shared_cache.
+    """
+    try:
+        return get_shared_cache().get(('review_queue', phase, limit), lambda: _fetch_review_queue(phase, limit))
+    except Exception as e:
+        st.error(f"Error getting review queue: {str(e)}")
+        return []
+
+def get_rejected_expenses(include_archived: bool = False) -> List[Dict[str, Any]]:
     """Get all rejected expenses (Rechazado phase)"""
     try:
         supabase = get_supabase_client()
@@ -137,12 +218,16 @@ def get_rejected_expenses() -> List[Dict[str, Any]]:
             return []
             
         response = supabase.table('expenses').select('*').eq('phase', 'Rechazado').is_('deleted_at', 'null').order('updated_at', desc=True).execute()
-        return response.data
+        expenses = response.data
+        if include_archived:
+            expenses = expenses + _get_archived_expenses(lambda q: q.eq('phase', 'Rechazado'), 'updated_at')
+            expenses.sort(key=lambda e: e['updated_at'], reverse=True)
+        return expenses
     except Exception as e:
         st.error(f"Error getting rejected expenses: {str(e)}")
         return []
 
-def get_paid_expenses() -> List[Dict[str, Any]]:
+def get_paid_expenses(include_archived: bool = False) -> List[Dict[str, Any]]:
     """Get all paid expenses (Pagado phase)"""
     try:
         supabase = get_supabase_client()
@@ -150,12 +235,16 @@ def get_paid_expenses() -> List[Dict[str, Any]]:
             return []
             
         response = supabase.table('expenses').select('*').eq('phase', 'Pagado').is_('deleted_at', 'null').order('updated_at', desc=True).execute()
-        return response.data
+        expenses = response.data
+        if include_archived:
+            expenses = expenses + _get_archived_expenses(lambda q: q.eq('phase', 'Pagado'), 'updated_at')
+            expenses.sort(key=lambda e: e['updated_at'], reverse=True)
+        return expenses
     except Exception as e:
         st.error(f"Error getting paid expenses: {str(e)}")
         return []
 
-def get_all_expenses() -> List[Dict[str, Any]]:
+def get_all_expenses(include_archived: bool = False) -> List[Dict[str, Any]]:
     """Get all expenses (for admin)"""
     try:
         supabase = get_supabase_client()
@@ -163,12 +252,16 @@ def get_all_expenses() -> List[Dict[str, Any]]:
             return []
             
         response = supabase.table('expenses').select('*').is_('deleted_at', 'null').order('created_at', desc=True).execute()
-        return response.data
+        expenses = response.data
+        if include_archived:
+            expenses = expenses + _get_archived_expenses(lambda q: q)
+            expenses.sort(key=lambda e: e['created_at'], reverse=True)
+        return expenses
     except Exception as e:
         st.error(f"Error getting all expenses: {str(e)}")
         return []
 
-def get_expenses_by_phase(phase: str) -> List[Dict[str, Any]]:
+def get_expenses_by_phase(phase: str, include_archived: bool = False) -> List[Dict[str, Any]]:
     """Get expenses by phase (Creado, Aprobado, Pagado, Rechazado)"""
     try:
         supabase = get_supabase_client()
@@ -176,25 +269,38 @@ def get_expenses_by_phase(phase: str) -> List[Dict[str, Any]]:
             return []
             
         response = supabase.table('expenses').select('*').eq('phase', phase).is_('deleted_at', 'null').order('created_at', desc=True).execute()
-        return response.data
+        expenses = response.data
+        if include_archived:
+            expenses = expenses + _get_archived_expenses(lambda q: q.eq('phase', phase))
+            expenses.sort(key=lambda e: e['created_at'], reverse=True)
+        return expenses
     except Exception as e:
         st.error(f"Error getting expenses by phase: {str(e)}")
         return []
 
-def get_expenses_by_date_range(start_date: str, end_date: str) -> List[Dict[str, Any]]:
-    """Get expenses within a date range"""
+def get_expenses_by_date_range(start_date: str, end_date: str, include_archived: bool = False,
+                               with_categories: bool = False) -> List[Dict[str, Any]]:
+    """Get expenses within a date range; with_categories adds each row's category_ids"""
     try:
         supabase = get_supabase_client()
         if not supabase:
             return []
             
-        response = supabase.table('expenses').select('*').gte('created_at', start_date).lte('created_at', end_date).is_('deleted_at', 'null').order('created_at', desc=True).execute()
-        return response.data
+        select = '*, expense_categories(category_id)' if with_categories else '*'
+        response = supabase.table('expenses').select(select).gte('created_at', start_date).lte('created_at', end_date).is_('deleted_at', 'null').order('created_at', desc=True).execute()
+        expenses = [_flatten_expense_row(expense) for expense in response.data]
+        if include_archived:
+            archived = _get_archived_expenses(lambda q: q.gte('created_at', start_date).lte('created_at', end_date))
+            if with_categories:
+                _attach_archived_category_ids(archived)
+            expenses = expenses + archived
+            expenses.sort(key=lambda e: e['created_at'], reverse=True)
+        return expenses
     except Exception as e:
         st.error(f"Error getting expenses by date range: {str(e)}")
         return []
 
-def get_expenses_by_amount_range(min_amount: float, max_amount: float) -> List[Dict[str, Any]]:
+def get_expenses_by_amount_range(min_amount: float, max_amount: float, include_archived: bool = False) -> List[Dict[str, Any]]:
     """Get expenses within an amount range"""
     try:
         supabase = get_supabase_client()
@@ -202,12 +308,16 @@ def get_expenses_by_amount_range(min_amount: float, max_amount: float) -> List[D
             return []
             
         response = supabase.table('expenses').select('*').gte('amount', min_amount).lte('amount', max_amount).is_('deleted_at', 'null').order('amount', desc=True).execute()
-        return response.data
+        expenses = response.data
+        if include_archived:
+            expenses = expenses + _get_archived_expenses(lambda q: q.gte('amount', min_amount).lte('amount', max_amount), 'amount')
+            expenses.sort(key=lambda e: float(e['amount']), reverse=True)
+        return expenses
     except Exception as e:
         st.error(f"Error getting expenses by amount range: {str(e)}")
         return []
 
-def get_expenses_by_status(status: str) -> List[Dict[str, Any]]:
+def get_expenses_by_status(status: str, include_archived: bool = False) -> List[Dict[str, Any]]:
     """Get expenses by status (maps to phase field)"""
     # Map status to phase values
     status_to_phase = {
@@ -219,9 +329,9 @@ def get_expenses_by_status(status: str) -> List[Dict[str, Any]]:
     
     phase = status_to_phase.get(status)
     if phase:
-        return get_expenses_by_phase(phase)
+        return get_expenses_by_phase(phase, include_archived)
     else:
-        return get_all_expenses()
+        return get_all_expenses(include_archived)
 
 def get_user_roles(user_id: str) -> List[str]:
     """Get roles for a specific user"""
@@ -255,53 +365,60 @@ def get_users_by_role(role: str) -> List[Dict[str, Any]]:
         st.error(f"Error getting users by role: {str(e)}")
         return []
 
-def get_expense_statistics() -> Dict[str, Any]:
-    """Get expense statistics for dashboard"""
-    try:
+def _fetch_expense_statistics() -> Dict[str, Any]:
+    mirror = _read_mirror()
+    if mirror:
+        total_amount_cents, phase_counts = mirror.expense_totals()
+    else:
         supabase = get_supabase_client()
         if not supabase:
-            return {}
+            raise RuntimeError("Supabase client is not configured")
             
-        # Get total expenses
-        total_response = supabase.table('expenses').select('amount', count='exact').is_('deleted_at', 'null').execute()
-        total_expenses = len(total_response.data) if total_response.data else 0
-        
-        # Get total amount
-        amount_response = supabase.table('expenses').select('amount').is_('deleted_at', 'null').execute()
-        total_amount = sum(expense['amount'] for expense in amount_response.data) if amount_response.data else 0
-        
-        # Get expenses by phase
-        creado_count = len(get_expenses_by_phase('Creado'))
-        aprobado_count = len(get_expenses_by_phase('Aprobado'))
-        rechazado_count = len(get_expenses_by_phase('Rechazado'))
-        pagado_count = len(get_expenses_by_phase('Pagado'))
-        
-        return {
-            'total_expenses': total_expenses,
-            'total_amount': total_amount,
-            'creado_count': creado_count,
-            'aprobado_count': aprobado_count,
-            'rechazado_count': rechazado_count,
-            'pagado_count': pagado_count
-        }
+        # One request: amounts and phases of every live expense
+        response = supabase.table('expenses').select('amount, phase').is_('deleted_at', 'null').execute()
+        rows = response.data or []
+        total_amount_cents = sum_cents(expense['amount'] for expense in rows)
+        phase_counts = {}
+        for expense in rows:
+            phase_counts[expense['phase']] = phase_counts.get(expense['phase'], 0) + 1
+    
+    return {
+        'total_expenses': sum(phase_counts.values()),
+        'total_amount_cents': total_amount_cents,
+        'total_amount': from_cents(total_amount_cents),
+        'creado_count': phase_counts.get('Creado', 0),
+        'aprobado_count': phase_counts.get('Aprobado', 0),
+        'rechazado_count': phase_counts.get('Rechazado', 0),
+        'pagado_count': phase_counts.get('Pagado', 0)
+    }
+
+def get_expense_statistics() -> Dict[str, Any]:
+    """Get expense statistics for dashboard (shared by all sessions, see f_shared_cache)"""
+    try:
+        return get_shared_cache().get(('expense_statistics',), _fetch_expense_statistics)
     except Exception as e:
         st.error(f"Error getting expense statistics: {str(e)}")
         return {}
 
+def _fetch_recent_expenses(limit: int) -> List[Dict[str, Any]]:
+    mirror = _read_mirror()
+    if mirror:
+        return mirror.expenses(ordering=[('created_at', True)], limit=limit)
+    supabase = get_supabase_client()
+    if not supabase:
+        raise RuntimeError("Supabase client is not configured")
+    response = supabase.table('expenses').select('*').is_('deleted_at', 'null').order('created_at', desc=True).limit(limit).execute()
+    return response.data
+
 def get_recent_expenses(limit: int = 10) -> List[Dict[str, Any]]:
-    """Get recent expenses"""
+    """Get recent expenses (shared by all sessions, see f_shared_cache)"""
     try:
-        supabase = get_supabase_client()
-        if not supabase:
-            return []
-            
-        response = supabase.table('expenses').select('*').is_('deleted_at', 'null').order('created_at', desc=True).limit(limit).execute()
-        return response.data
+        return get_shared_cache().get(('recent_expenses', limit), lambda: _fetch_recent_expenses(limit))
     except Exception as e:
         st.error(f"Error getting recent expenses: {str(e)}")
         return []
 
-def search_expenses(query: str) -> List[Dict[str, Any]]:
+def search_expenses(query: str, include_archived: bool = False) -> List[Dict[str, Any]]:
     """Search expenses by description"""
     try:
         supabase = get_supabase_client()
@@ -310,20 +427,29 @@ def search_expenses(query: str) -> List[Dict[str, Any]]:
             
         # Search in description field
         response = supabase.table('expenses').select('*').ilike('description', f'%{query}%').is_('deleted_at', 'null').order('created_at', desc=True).execute()
-        return response.data
+        expenses = response.data
+        if include_archived:
+            expenses = expenses + _get_archived_expenses(lambda q: q.ilike('description', f'%{query}%'))
+            expenses.sort(key=lambda e: e['created_at'], reverse=True)
+        return expenses
     except Exception as e:
         st.error(f"Error searching expenses: {str(e)}")
         return []
 
+def _fetch_categories() -> List[Dict[str, Any]]:
+    mirror = _read_mirror()
+    if mirror:
+        return mirror.categories()
+    supabase = get_supabase_client()
+    if not supabase:
+        raise RuntimeError("Supabase client is not configured")
+    response = supabase.table('categories').select('*').is_('deleted_at', 'null').execute()
+    return response.data
+
 def get_categories() -> List[Dict[str, Any]]:
-    """Get all categories"""
+    """Get all categories (shared by all sessions, see f_shared_cache)"""
     try:
-        supabase = get_supabase_client()
-        if not supabase:
-            return []
-            
-        response = supabase.table('categories').select('*').is_('deleted_at', 'null').execute()
-        return response.data
+        return get_shared_cache().get(('categories',), _fetch_categories, ttl=300)
     except Exception as e:
         st.error(f"Error getting categories: {str(e)}")
         return []
@@ -459,4 +585,413 @@ def get_receivers_by_categories(category_ids: List[int]) -> List[Dict[str, Any]]
         return []
     except Exception as e:
         st.error(f"Error getting receivers by categories: {str(e)}")
-        return [] 
\ No newline at end of file
+        return []
+
+def get_payment_receipts(expense_id: int) -> List[Dict[str, Any]]:
+    """Get the payment receipts of an expense (with thumbnail_url for photos)"""
+    try:
+        # Use service role key to bypass RLS for payer queries
+        url = os.environ.get("SUPABASE_URL")
+        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not service_key:
+            st.error("Missing Supabase service role key. Cannot fetch receipts.")
+            return []
+            
+        # Create client with service role key to bypass RLS
+        supabase_admin = create_client(url, service_key)
+        response = supabase_admin.table('payment_receipts').select('*').eq('expense_id', expense_id).order('uploaded_at').execute()
+        return response.data
+    except Exception as e:
+        st.error(f"Error getting payment receipts: {str(e)}")
+        return []
+
+def get_expenses_without_receipts() -> List[Dict[str, Any]]:
+    """Get approved expenses that still need a payment receipt, in payment queue order"""
+    try:
+        # Use service role key; the function is only granted to service_role
+        url = os.environ.get("SUPABASE_URL")
+        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not service_key:
+            st.error("Missing Supabase service role key. Cannot fetch expenses.")
+            return []
+            
+        # Create client with service role key to bypass RLS
+        supabase_admin = create_client(url, service_key)
+        response = supabase_admin.rpc('approved_expenses_without_receipts').execute()
+        return response.data or []
+    except Exception as e:
+        st.error(f"Error getting expenses without receipts: {str(e)}")
+        return []
+
+def get_receipt_counts(expense_ids: List[int]) -> Dict[int, int]:
+    """Get the number of payment receipts per expense in one query"""
+    try:
+        if not expense_ids:
+            return {}
+            
+        # Use service role key; the function is only granted to service_role
+        url = os.environ.get("SUPABASE_URL")
+        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not service_key:
+            st.error("Missing Supabase service role key. Cannot fetch receipt counts.")
+            return {}
+            
+        # Create client with service role key to bypass RLS
+        supabase_admin = create_client(url, service_key)
+        response = supabase_admin.rpc('expense_receipt_counts', {'p_expense_ids': expense_ids}).execute()
+        return {row['expense_id']: row['receipts'] for row in response.data or []}
+    except Exception as e:
+        st.error(f"Error getting receipt counts: {str(e)}")
+        return {}
+
+# Everything a detail view shows, in one PostgREST request. Users are embedded through the
+# named foreign keys because expenses references users three times.
+EXPENSE_DETAIL_SELECT = (
+    "*, "
+    "requester:users!expenses_requester_id_fkey(id, name, email), "
+    "approver:users!expenses_approver_id_fkey(id, name, email), "
+    "payer:users!expenses_payer_id_fkey(id, name, email), "
+    "receiver:receivers!expenses_receiver_id_fkey(id, name, email), "
+    "expense_categories(category:categories(id, description)), "
+    "expense_accounts(account:accounts(id, description)), "
+    "quotes!quotes_expense_id_fkey(*, blob:file_blobs(content_hash)), "
+    "payment_receipts(*, blob:file_blobs(content_hash)), "
+    "comments(*, author:users(id, name)), "
+    "reembolsos(*, receiver:receivers(id, name))"
+)
+
+# Short-lived per-id cache for detail views, kept in the shared cache under
+# ('expense_detail', id) so every process using the sqlite or redis backend sees the same
+# entries. f_cud invalidates an id whenever it writes to that expense.
+EXPENSE_DETAIL_TTL = 30
+
+def _fetch_expense_detail(expense_id: int) -> Optional[Dict[str, Any]]:
+    # Use service role key so every related table is readable
+    url = os.environ.get("SUPABASE_URL")
+    service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not service_key:
+        raise RuntimeError("Missing Supabase service role key. Cannot fetch expense.")
+        
+    # Create client with service role key to bypass RLS
+    supabase_admin = create_client(url, service_key)
+    response = supabase_admin.table('expenses').select(EXPENSE_DETAIL_SELECT).eq('id', expense_id).limit(1).execute()
+    if not response.data:
+        return None
+    
+    expense = response.data[0]
+    # Flatten the junction tables into plain lists
+    expense['categories'] = [row['category'] for row in expense.pop('expense_categories', []) if row.get('category')]
+    expense['accounts'] = [row['account'] for row in expense.pop('expense_accounts', []) if row.get('account')]
+    expense['comments'] = sorted(expense.get('comments') or [], key=lambda c: c['created_at'])
+    # Content hash of each stored file (keys the local download cache); None for pre-dedup rows
+    for row in (expense.get('quotes') or []) + (expense.get('payment_receipts') or []):
+        row['content_hash'] = (row.pop('blob', None) or {}).get('content_hash')
+    return expense
+
+def get_expense_detail(expense_id: int) -> Optional[Dict[str, Any]]:
+    """Get an expense with its people, categories, accounts, quotes, receipts, comments and reimbursements"""
+    expense_id = int(expense_id)
+    try:
+        return get_shared_cache().get(('expense_detail', expense_id), lambda: _fetch_expense_detail(expense_id),
+                                      ttl=EXPENSE_DETAIL_TTL, stale_ttl=0)
+    except Exception as e:
+        st.error(f"Error getting expense detail: {str(e)}")
+        return None
+
+def invalidate_expense_detail(expense_id: int = None) -> None:
+    """Drop a cached expense detail after a write (all of them when no id is given)"""
+    if expense_id is None:
+        get_shared_cache().invalidate('expense_detail')
+    else:
+        get_shared_cache().discard(('expense_detail', int(expense_id)))
+
+# Columns list views need; everything else is loaded on demand with get_expense_detail()
+EXPENSE_SUMMARY_SELECT = (
+    "id, description, amount, phase, priority, priority_rank, payment_method, "
+    "created_at, updated_at, requester_id, "
+    "requester:users!expenses_requester_id_fkey(name)"
+)
+
+def _flatten_expense_row(expense: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace list-view embeds with plain fields: requester_name and category_ids"""
+    if 'requester' in expense:
+        requester = expense.pop('requester')
+        expense['requester_name'] = requester['name'] if requester else 'Usuario Desconocido'
+    if 'expense_categories' in expense:
+        expense['category_ids'] = [row['category_id'] for row in expense.pop('expense_categories') or []]
+    return expense
+
+def get_user_names(user_ids: List[str]) -> Dict[str, str]:
+    """Get names for many users in one query (id -> name)"""
+    try:
+        user_ids = list({uid for uid in user_ids if uid})
+        if not user_ids:
+            return {}
+            
+        # Use service role key to bypass RLS for admin queries
+        url = os.environ.get("SUPABASE_URL")
+        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not service_key:
+            st.error("Missing Supabase service role key. Cannot fetch users.")
+            return {}
+            
+        # Create client with service role key to bypass RLS
+        supabase_admin = create_client(url, service_key)
+        response = supabase_admin.table('users').select('id, name').in_('id', user_ids).execute()
+        return {row['id']: row['name'] for row in response.data}
+    except Exception as e:
+        st.error(f"Error getting user names: {str(e)}")
+        return {}
+
+def get_expense_changes_since(since: str, select: str = EXPENSE_SUMMARY_SELECT) -> List[Dict[str, Any]]:
+    """Get expenses updated at or after a timestamp, soft-deleted ones included (for incremental sync)"""
+    try:
+        # Use service role key so the requester embed is readable
+        url = os.environ.get("SUPABASE_URL")
+        service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+        if not url or not service_key:
+            st.error("Missing Supabase service role key. Cannot fetch expenses.")
+            return []
+            
+        # Create client with service role key to bypass RLS
+        supabase_admin = create_client(url, service_key)
+        response = supabase_admin.table('expenses').select(f"{select}, deleted_at").gte('updated_at', since).order('updated_at').execute()
+        for expense in response.data:
+            _flatten_expense_row(expense)
+        return response.data
+    except Exception as e:
+        st.error(f"Error getting expense changes: {str(e)}")
+        return []
+
+class ExpenseQuery:
+    """Composable filter over live expenses, compiled to PostgREST so only matching rows are sent
+
+        ExpenseQuery().phase('Creado').amount_between(0, 500).text('taxi').fetch()
+
+    Every filter method returns the query and ignores empty values, so pages can chain
+    their widget values directly. matches() evaluates the same filters on a row in memory.
+    """
+
+    def __init__(self, select: str = EXPENSE_SUMMARY_SELECT):
+        self.select = select
+        self.orders: List[Tuple[str, bool]] = []
+        self._phase = None
+        self._requester_id = None
+        self._ids = None
+        self._dates = None
+        self._amounts = None
+        self._category_ids = None
+        self._priorities = None
+        self._text = None
+
+    def phase(self, phase: Optional[str]) -> "ExpenseQuery":
+        if phase:
+            self._phase = phase
+        return self
+
+    def requester(self, user_id: Optional[str]) -> "ExpenseQuery":
+        if user_id:
+            self._requester_id = user_id
+        return self
+
+    def ids(self, expense_ids: List[int]) -> "ExpenseQuery":
+        self._ids = sorted(int(i) for i in expense_ids)
+        return self
+
+    def date_between(self, start: Optional[date], end: Optional[date], column: str = 'created_at') -> "ExpenseQuery":
+        """Rows whose column falls on a day in [start, end]"""
+        if start and end:
+            self._dates = (column, start, end)
+        return self
+
+    def amount_between(self, min_amount: Optional[float], max_amount: Optional[float]) -> "ExpenseQuery":
+        if min_amount is not None and max_amount is not None:
+            self._amounts = (float(min_amount), float(max_amount))
+        return self
+
+    def category_in(self, category_ids: List[int]) -> "ExpenseQuery":
+        if category_ids:
+            self._category_ids = sorted(int(i) for i in category_ids)
+        return self
+
+    def priority_in(self, priorities: List[str]) -> "ExpenseQuery":
+        if priorities:
+            self._priorities = sorted(priorities)
+        return self
+
+    def text(self, query: Optional[str]) -> "ExpenseQuery":
+        """Case-insensitive substring of the description"""
+        if query and query.strip():
+            self._text = query.strip()
+        return self
+
+    def order_by(self, column: str, desc: bool = False) -> "ExpenseQuery":
+        self.orders.append((column, desc))
+        return self
+
+    def ordering(self) -> List[Tuple[str, bool]]:
+        """Sort keys as (column, descending); newest first unless order_by() was called"""
+        return self.orders or [('created_at', True)]
+
+    def key(self) -> str:
+        """Stable identity of the filters, select and order (e.g. for caching the result)"""
+        return repr((self.select, self._phase, self._requester_id, self._ids, self._dates, self._amounts,
+                     self._category_ids, self._priorities, self._text, self.ordering()))
+
+    def _select_clause(self) -> str:
+        # !inner turns the category embed into a semi-join, so the filter drops whole expenses
+        if self._category_ids:
+            return f"{self.select}, expense_categories!inner(category_id)"
+        return self.select
+
+    def delta_select(self) -> str:
+        """Columns incremental syncs need to re-evaluate matches() on changed rows"""
+        if self._category_ids:
+            return f"{self.select}, expense_categories(category_id)"
+        return self.select
+
+    def apply(self, query):
+        """Add the filters to a PostgREST query builder"""
+        if self._phase:
+            query = query.eq('phase', self._phase)
+        if self._requester_id:
+            query = query.eq('requester_id', self._requester_id)
+        if self._ids is not None:
+            query = query.in_('id', self._ids)
+        if self._dates:
+            column, start, end = self._dates
+            query = query.gte(column, start.isoformat()).lt(column, (end + timedelta(days=1)).isoformat())
+        if self._amounts:
+            query = query.gte('amount', self._amounts[0]).lte('amount', self._amounts[1])
+        if self._category_ids:
+            query = query.in_('expense_categories.category_id', self._category_ids)
+        if self._priorities:
+            query = query.in_('priority', self._priorities)
+        if self._text:
+            query = query.ilike('description', f'%{self._text}%')
+        return query
+
+    def to_sql(self) -> Tuple[str, List[Any]]:
+        """The filters as a WHERE clause and parameters for the read mirror (expenses aliased e)"""
+        clauses, params = ["1 = 1"], []
+        if self._phase:
+            clauses.append("e.phase = ?")
+            params.append(self._phase)
+        if self._requester_id:
+            clauses.append("e.requester_id = ?")
+            params.append(self._requester_id)
+        if self._ids is not None:
+            clauses.append(f"e.id IN ({', '.join('?' for _ in self._ids)})")
+            params.extend(self._ids)
+        if self._dates:
+            column, start, end = self._dates
+            clauses.append(f"e.{column} >= ? AND e.{column} < ?")
+            params.extend([start.isoformat(), (end + timedelta(days=1)).isoformat()])
+        if self._amounts:
+            clauses.append("e.amount BETWEEN ? AND ?")
+            params.extend(self._amounts)
+        if self._category_ids:
+            clauses.append("EXISTS (SELECT 1 FROM expense_categories ec WHERE ec.expense_id = e.id "
+                           f"AND ec.category_id IN ({', '.join('?' for _ in self._category_ids)}))")
+            params.extend(self._category_ids)
+        if self._priorities:
+            clauses.append(f"e.priority IN ({', '.join('?' for _ in self._priorities)})")
+            params.extend(self._priorities)
+        if self._text:
+            clauses.append("contains_ci(e.description, ?)")
+            params.append(self._text)
+        return " AND ".join(clauses), params
+
+    def matches(self, expense: Dict[str, Any]) -> bool:
+        """Whether a row (e.g. one just returned by a write) belongs to this query's result
+
+        Rows that carry no category_ids, such as write results, are not filtered by category.
+        """
+        if expense.get('deleted_at'):
+            return False
+        if self._phase and expense.get('phase') != self._phase:
+            return False
+        if self._requester_id and expense.get('requester_id') != self._requester_id:
+            return False
+        if self._ids is not None and expense.get('id') not in self._ids:
+            return False
+        if self._dates:
+            column, start, end = self._dates
+            if not start.isoformat() <= (expense.get(column) or '')[:10] <= end.isoformat():
+                return False
+        if self._amounts and not self._amounts[0] <= float(expense.get('amount') or 0) <= self._amounts[1]:
+            return False
+        if self._category_ids and 'category_ids' in expense and not set(self._category_ids) & set(expense['category_ids']):
+            return False
+        if self._priorities and expense.get('priority') not in self._priorities:
+            return False
+        if self._text and self._text.lower() not in (expense.get('description') or '').lower():
+            return False
+        return True
+
+    def fetch(self) -> List[Dict[str, Any]]:
+        """Run the query and return the matching rows"""
+        try:
+            mirror = _read_mirror() if self.select == EXPENSE_SUMMARY_SELECT else None
+            if mirror:
+                where, params = self.to_sql()
+                return mirror.expense_summaries(where, params, self.ordering(), with_categories=bool(self._category_ids))
+            
+            # Use service role key so the requester embed is readable
+            url = os.environ.get("SUPABASE_URL")
+            service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+            if not url or not service_key:
+                st.error("Missing Supabase service role key. Cannot fetch expenses.")
+                return []
+                
+            # Create client with service role key to bypass RLS
+            supabase_admin = create_client(url, service_key)
+            query = self.apply(supabase_admin.table('expenses').select(self._select_clause()).is_('deleted_at', 'null'))
+            for column, desc in self.ordering():
+                query = query.order(column, desc=desc)
+            response = query.execute()
+            return [_flatten_expense_row(expense) for expense in response.data]
+        except Exception as e:
+            st.error(f"Error querying expenses: {str(e)}")
+            return []
+
+# Shared-cache queries that change whenever an expense is written
+EXPENSE_SHARED_QUERIES = ('expense_statistics', 'recent_expenses', 'review_queue')
+
+def invalidate_shared_reads(*names: str) -> None:
+    """Drop shared-cache results after a write (see EXPENSE_SHARED_QUERIES)"""
+    get_shared_cache().invalidate(*names)
+    if READ_FROM_MIRROR:
+        # Pull the write into the mirror now; _mirror_changed drops the cache again once it lands
+        mirror = get_read_mirror(_on_change=_mirror_changed)
+        tables = set(EXPENSE_TABLES) if set(names) & set(EXPENSE_SHARED_QUERIES) else set()
+        if 'categories' in names:
+            tables.add('categories')
+        if mirror and tables:
+            mirror.request_sync(*tables)
+
+def _mirror_changed(tables) -> None:
+    """Called by the mirror's syncer after a pass that changed rows"""
+    names = set()
+    if set(tables) & set(EXPENSE_TABLES):
+        names.update(EXPENSE_SHARED_QUERIES)
+    if 'categories' in tables:
+        names.add('categories')
+    if names:
+        get_shared_cache().invalidate(*names)
+
+def _read_mirror():
+    """The read mirror when READ_FROM_MIRROR is set and it is fresh enough, else None (read Supabase)"""
+    if not READ_FROM_MIRROR:
+        return None
+    mirror = get_read_mirror(_on_change=_mirror_changed)
+    if mirror is None:
+        global _read_mirror_disabled_logged
+        if not _read_mirror_disabled_logged:
+            _read_mirror_disabled_logged = True
+            logger.warning("Read mirror disabled: missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY; reading from Supabase")
+        return None
+    staleness = mirror.staleness()
+    if staleness is None or staleness > READ_MIRROR_MAX_STALENESS:
+        return None
+    return mirror
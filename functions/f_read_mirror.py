@@ -0,0 +1,368 @@
+import streamlit as st
+import os
+import time
+import socket
+import sqlite3
+import tempfile
+import threading
+import traceback
+from datetime import datetime, timedelta
+from supabase import create_client, Client
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from functions.f_money import to_cents
+
+# Local SQLite copy of the tables behind dashboards, reports and list pages. A background
+# syncer pulls rows changed since a per-table watermark (updated_at, or created_at for tables
+# that are only inserted and deleted), including soft deletes, plus the tombstones recorded
+# for hard deletes (db_setup/read_mirror_sync.sql). f_read serves heavy read-only queries from
+# here when PAGOS_READ_MIRROR=1 and the mirror is no more than a bounded number of seconds behind.
+#  - WAL mode: readers in every session thread never wait on the syncer
+#  - one file per host: all app processes read it; a lease lets one of them run the timed sync
+#  - writes made through f_cud wake the syncer (request_sync) so they show up within a pass
+MIRROR_PATH = os.environ.get("PAGOS_READ_MIRROR_PATH", os.path.join(tempfile.gettempdir(), "pagos-read-mirror.sqlite3"))
+SYNC_INTERVAL = float(os.environ.get("PAGOS_READ_MIRROR_INTERVAL", "15"))
+SYNC_PAGE_SIZE = 1000
+# Re-read this many seconds before each watermark: a transaction that commits late can carry
+# an updated_at older than rows already seen. Re-applied rows are no-ops.
+SYNC_OVERLAP_SECONDS = 5
+LEASE_SECONDS = 60
+TOMBSTONE_RETENTION_DAYS = 7
+
+# table -> (primary key columns, mirrored columns, watermark column)
+MIRROR_TABLES: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...], str]] = {
+    'users': (('id',), ('id', 'name', 'email', 'created_at', 'updated_at', 'deleted_at'), 'updated_at'),
+    'user_roles': (('user_id', 'role'), ('user_id', 'role', 'created_at'), 'created_at'),
+    'categories': (('id',), ('id', 'description', 'created_at', 'updated_at', 'deleted_at'), 'updated_at'),
+    'accounts': (('id',), ('id', 'category_id', 'description', 'created_at', 'updated_at', 'deleted_at'), 'updated_at'),
+    'receivers': (('id',), ('id', 'name', 'email', 'phone', 'role', 'created_by', 'created_date',
+                            'created_at', 'updated_at', 'deleted_at'), 'updated_at'),
+    'receiver_categories': (('receiver_id', 'category_id'), ('receiver_id', 'category_id', 'created_at'), 'created_at'),
+    'receiver_accounts': (('receiver_id', 'account_id'), ('receiver_id', 'account_id', 'created_at'), 'created_at'),
+    'expenses': (('id',), ('id', 'amount', 'account_id', 'category_id', 'requester_id', 'approver_id', 'payer_id',
+                           'receiver_id', 'approved_quote_id', 'description', 'payment_method', 'payment_receipt',
+                           'phase', 'priority', 'priority_rank', 'date_created',
+                           'created_at', 'updated_at', 'deleted_at'), 'updated_at'),
+    'expense_categories': (('expense_id', 'category_id'), ('expense_id', 'category_id', 'created_at'), 'created_at'),
+    'expense_accounts': (('expense_id', 'account_id'), ('expense_id', 'account_id', 'created_at'), 'created_at'),
+}
+
+# Tables an expense write can touch
+EXPENSE_TABLES = ('expenses', 'expense_categories', 'expense_accounts')
+
+MIRROR_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_expenses_phase ON expenses(phase, deleted_at)",
+    "CREATE INDEX IF NOT EXISTS idx_expenses_queue ON expenses(phase, priority_rank DESC, created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_expenses_requester_id ON expenses(requester_id)",
+    "CREATE INDEX IF NOT EXISTS idx_expenses_created_at ON expenses(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_expenses_updated_at ON expenses(updated_at)",
+    "CREATE INDEX IF NOT EXISTS idx_expense_categories_category_id ON expense_categories(category_id)",
+    "CREATE INDEX IF NOT EXISTS idx_expense_accounts_account_id ON expense_accounts(account_id)",
+    "CREATE INDEX IF NOT EXISTS idx_receiver_categories_category_id ON receiver_categories(category_id)",
+    "CREATE INDEX IF NOT EXISTS idx_receiver_accounts_account_id ON receiver_accounts(account_id)",
+    "CREATE INDEX IF NOT EXISTS idx_user_roles_role ON user_roles(role)",
+    "CREATE INDEX IF NOT EXISTS idx_accounts_category_id ON accounts(category_id)",
+)
+
+EXPENSE_COLUMNS = MIRROR_TABLES['expenses'][1]
+
+def _version(timestamp: str) -> float:
+    """Comparable value of a PostgREST timestamp (fractional digits vary between rows)"""
+    return datetime.fromisoformat(timestamp).timestamp()
+
+def _contains_ci(haystack: Optional[str], needle: Optional[str]) -> bool:
+    # SQLite's lower() only folds ASCII; descriptions are Spanish
+    return bool(haystack) and needle is not None and needle.casefold() in haystack.casefold()
+
+def order_clause(ordering: Iterable[Tuple[str, bool]], alias: str = '') -> str:
+    """ORDER BY terms with PostgREST's NULL placement (last ascending, first descending)"""
+    prefix = f"{alias}." if alias else ''
+    terms = []
+    for column, desc in ordering:
+        terms.append(f"{prefix}{column} IS NULL {'DESC' if desc else 'ASC'}")
+        terms.append(f"{prefix}{column} {'DESC' if desc else 'ASC'}")
+    return ", ".join(terms)
+
+class ReadMirror:
+    """SQLite copy of MIRROR_TABLES, kept current by sync_once()/run()"""
+
+    def __init__(self, path: str = MIRROR_PATH, on_change: Callable[[Set[str]], None] = None):
+        self.path = path
+        self.on_change = on_change
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self)}"
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._requested: Set[str] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._create_schema()
+
+    def _conn(self) -> sqlite3.Connection:
+        """Connection for the calling thread (sqlite3 connections are not shared between threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.create_function("contains_ci", 2, _contains_ci, deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    def _create_schema(self) -> None:
+        conn = self._conn()
+        for table, (keys, columns, _) in MIRROR_TABLES.items():
+            extra = ", amount_cents INTEGER" if table == 'expenses' else ""
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)}{extra}, "
+                         f"_version REAL NOT NULL, PRIMARY KEY ({', '.join(keys)}))")
+        for statement in MIRROR_INDEXES:
+            conn.execute(statement)
+        conn.execute("CREATE TABLE IF NOT EXISTS sync_meta (name TEXT PRIMARY KEY, watermark TEXT, synced_at REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS sync_lease (id INTEGER PRIMARY KEY CHECK (id = 1), owner TEXT, expires_at REAL)")
+
+    def _meta(self, name: str) -> Tuple[Optional[str], Optional[float]]:
+        row = self._conn().execute("SELECT watermark, synced_at FROM sync_meta WHERE name = ?", (name,)).fetchone()
+        return (row['watermark'], row['synced_at']) if row else (None, None)
+
+    def _set_meta(self, conn: sqlite3.Connection, name: str, watermark: Optional[str]) -> None:
+        conn.execute("INSERT INTO sync_meta (name, watermark, synced_at) VALUES (?, ?, ?) "
+                     "ON CONFLICT(name) DO UPDATE SET watermark = excluded.watermark, synced_at = excluded.synced_at",
+                     (name, watermark, time.time()))
+
+    def _pages(self, client: Client, table: str, columns: str, version: str, keys: Tuple[str, ...],
+               since: Optional[str], where: Callable = None) -> Iterator[List[Dict[str, Any]]]:
+        """Rows with version >= since (every row when since is None), one page at a time
+
+        Pages walk the watermark column (keyset), so rows updated while paging are picked up
+        by the next pass instead of shifting an offset. A page that is entirely one timestamp
+        (a bulk insert) is finished by offset within that timestamp before moving past it.
+        """
+        def base():
+            query = client.table(table).select(columns)
+            query = where(query) if where else query
+            return query
+
+        def ordered(query):
+            for key in keys:
+                query = query.order(key)
+            return query
+
+        cursor, strict = since, False
+        while True:
+            query = base()
+            if cursor is not None:
+                query = query.gt(version, cursor) if strict else query.gte(version, cursor)
+            page = ordered(query.order(version)).range(0, SYNC_PAGE_SIZE - 1).execute().data or []
+            yield page
+            if len(page) < SYNC_PAGE_SIZE:
+                return
+            last = page[-1][version]
+            if page[0][version] == last:
+                offset = SYNC_PAGE_SIZE
+                while True:
+                    rest = ordered(base().eq(version, last)).range(offset, offset + SYNC_PAGE_SIZE - 1).execute().data or []
+                    yield rest
+                    if len(rest) < SYNC_PAGE_SIZE:
+                        break
+                    offset += SYNC_PAGE_SIZE
+                cursor, strict = last, True
+            else:
+                cursor, strict = last, False
+
+    @staticmethod
+    def _since(watermark: Optional[str]) -> Optional[str]:
+        if watermark is None:
+            return None
+        return (datetime.fromisoformat(watermark) - timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat()
+
+    def _sync_tombstones(self, client: Client) -> Set[str]:
+        """Apply hard deletes; a row re-inserted after its tombstone (newer version) is kept
+
+        Always covers every mirrored table, so one watermark serves partial syncs too.
+        """
+        changed = set()
+        watermark, _ = self._meta('_tombstones')
+        conn = self._conn()
+        for page in self._pages(client, 'mirror_tombstones', 'id, table_name, row_key, deleted_at', 'deleted_at',
+                                ('id',), self._since(watermark), lambda q: q.in_('table_name', list(MIRROR_TABLES))):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for tombstone in page:
+                    table = tombstone['table_name']
+                    keys = MIRROR_TABLES[table][0]
+                    condition = " AND ".join(f"{key} = ?" for key in keys)
+                    cursor = conn.execute(f"DELETE FROM {table} WHERE {condition} AND _version < ?",
+                                          [tombstone['row_key'].get(key) for key in keys] + [_version(tombstone['deleted_at'])])
+                    if cursor.rowcount:
+                        changed.add(table)
+                    if watermark is None or _version(tombstone['deleted_at']) > _version(watermark):
+                        watermark = tombstone['deleted_at']
+                self._set_meta(conn, '_tombstones', watermark)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return changed
+
+    def _sync_table(self, client: Client, table: str) -> bool:
+        """Upsert rows changed since the table's watermark; True when anything changed"""
+        keys, columns, version = MIRROR_TABLES[table]
+        watermark, _ = self._meta(table)
+        stored = columns + (('amount_cents',) if table == 'expenses' else ()) + ('_version',)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in stored if column not in keys)
+        statement = (f"INSERT INTO {table} ({', '.join(stored)}) VALUES ({', '.join('?' for _ in stored)}) "
+                     f"ON CONFLICT({', '.join(keys)}) DO UPDATE SET {updates} WHERE excluded._version > {table}._version")
+        changed = False
+        conn = self._conn()
+        for page in self._pages(client, table, ", ".join(columns), version, keys, self._since(watermark)):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for row in page:
+                    values = [row.get(column) for column in columns]
+                    if table == 'expenses':
+                        values.append(to_cents(row.get('amount')))
+                    values.append(_version(row[version]))
+                    if conn.execute(statement, values).rowcount:
+                        changed = True
+                    if watermark is None or _version(row[version]) > _version(watermark):
+                        watermark = row[version]
+                self._set_meta(conn, table, watermark)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return changed
+
+    def sync_once(self, client: Client, tables: Iterable[str] = None) -> Set[str]:
+        """Pull changes for tables (all by default); returns the tables whose rows changed
+
+        Tombstones are read before rows, so every row fetched afterwards was live when read.
+        """
+        tables = list(tables or MIRROR_TABLES)
+        with self._sync_lock:
+            _, last_checked = self._meta('_tombstones')
+            if last_checked is not None and time.time() - last_checked > TOMBSTONE_RETENTION_DAYS * 86400:
+                # Tombstones this mirror never saw may have been pruned
+                self.rebuild()
+            changed = self._sync_tombstones(client)
+            for table in tables:
+                if self._sync_table(client, table):
+                    changed.add(table)
+        if changed and self.on_change:
+            self.on_change(changed)
+        return changed
+
+    def rebuild(self) -> None:
+        """Drop every mirrored row and watermark; the next sync copies the tables again"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        for table in MIRROR_TABLES:
+            conn.execute(f"DELETE FROM {table}")
+        conn.execute("DELETE FROM sync_meta")
+        conn.execute("COMMIT")
+
+    def acquire_lease(self) -> bool:
+        """Whether this mirror may run the timed sync (one process per host at a time)"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT owner, expires_at FROM sync_lease WHERE id = 1").fetchone()
+            if row and row['owner'] != self.owner and row['expires_at'] > now:
+                conn.execute("COMMIT")
+                return False
+            conn.execute("INSERT INTO sync_lease (id, owner, expires_at) VALUES (1, ?, ?) "
+                         "ON CONFLICT(id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at",
+                         (self.owner, now + LEASE_SECONDS))
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def request_sync(self, *tables: str) -> None:
+        """Wake the syncer to pull tables (all when none given) now instead of at the next interval"""
+        self._requested.update(tables or MIRROR_TABLES)
+        self._wake.set()
+
+    def run(self, client: Client, interval: float = SYNC_INTERVAL, stop: threading.Event = None) -> None:
+        """Sync every interval while holding the lease, and whenever request_sync() is called"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                if self._requested:
+                    requested, self._requested = self._requested, set()
+                    self.sync_once(client, requested)
+                if self.acquire_lease():
+                    self.sync_once(client)
+            except Exception:
+                # The mirror falls behind and f_read routes to Supabase until a pass succeeds
+                traceback.print_exc()
+            self._wake.wait(interval)
+            self._wake.clear()
+
+    def start(self, client: Client, interval: float = SYNC_INTERVAL) -> None:
+        """Run the syncer in a daemon thread of this process"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, args=(client, interval), name="read-mirror-sync", daemon=True)
+            self._thread.start()
+
+    def staleness(self) -> Optional[float]:
+        """Seconds since the least recently synced table caught up; None before the first full pass"""
+        rows = self._conn().execute(
+            f"SELECT COUNT(*) AS synced, MIN(synced_at) AS oldest FROM sync_meta "
+            f"WHERE name IN ({', '.join('?' for _ in MIRROR_TABLES)})", list(MIRROR_TABLES)
+        ).fetchone()
+        if rows['synced'] < len(MIRROR_TABLES):
+            return None
+        return time.time() - rows['oldest']
+
+    # Queries below return the same shapes as the f_read functions they stand in for
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self._conn().execute(sql, list(params))]
+
+    def expense_totals(self) -> Tuple[int, Dict[str, int]]:
+        """Total cents and count per phase of live expenses"""
+        rows = self.query("SELECT phase, COUNT(*) AS count, COALESCE(SUM(amount_cents), 0) AS cents "
+                          "FROM expenses WHERE deleted_at IS NULL GROUP BY phase")
+        return sum(row['cents'] for row in rows), {row['phase']: row['count'] for row in rows}
+
+    def expenses(self, where: str = "1 = 1", params: Iterable[Any] = (), ordering: Iterable[Tuple[str, bool]] = (),
+                 limit: int = None) -> List[Dict[str, Any]]:
+        """Live expense rows (mirrored columns) matching a WHERE clause"""
+        sql = f"SELECT {', '.join(EXPENSE_COLUMNS)} FROM expenses WHERE deleted_at IS NULL AND ({where})"
+        if ordering:
+            sql += f" ORDER BY {order_clause(ordering)}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self.query(sql, params)
+
+    def expense_summaries(self, where: str, params: Iterable[Any], ordering: Iterable[Tuple[str, bool]],
+                          with_categories: bool = False) -> List[Dict[str, Any]]:
+        """Rows shaped like ExpenseQuery.fetch(): summary columns, requester_name and optionally category_ids"""
+        categories = (", (SELECT group_concat(category_id) FROM expense_categories ec WHERE ec.expense_id = e.id) AS category_ids"
+                      if with_categories else "")
+        sql = (f"SELECT e.id, e.description, e.amount, e.phase, e.priority, e.priority_rank, e.payment_method, "
+               f"e.created_at, e.updated_at, e.requester_id, COALESCE(u.name, 'Usuario Desconocido') AS requester_name{categories} "
+               f"FROM expenses e LEFT JOIN users u ON u.id = e.requester_id "
+               f"WHERE e.deleted_at IS NULL AND ({where}) ORDER BY {order_clause(ordering, 'e')}")
+        rows = self.query(sql, params)
+        if with_categories:
+            for row in rows:
+                row['category_ids'] = [int(i) for i in row['category_ids'].split(',')] if row['category_ids'] else []
+        return rows
+
+    def categories(self) -> List[Dict[str, Any]]:
+        return self.query("SELECT id, description, created_at, updated_at, deleted_at FROM categories "
+                          "WHERE deleted_at IS NULL ORDER BY id")
+
+@st.cache_resource
+def get_read_mirror(_on_change: Callable[[Set[str]], None] = None) -> Optional[ReadMirror]:
+    """This process's mirror with its syncer thread running; None without service role credentials"""
+    url = os.environ.get("SUPABASE_URL")
+    service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not service_key:
+        return None
+    mirror = ReadMirror(MIRROR_PATH, on_change=_on_change)
+    mirror.start(create_client(url, service_key))
+    return mirror
@@ -0,0 +1,148 @@
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+from functions.f_money import to_cents, from_cents
+
+# Compact records for the expense rows a session keeps (working sets). A slotted object
+# has no per-instance __dict__, amounts are int cents, repeated labels are interned and
+# requesters are shared UserRef objects, so a list row costs a fraction of the JSON dict
+# it was built from. Timestamps stay as the ISO strings PostgREST sent and are parsed
+# on first use. Records also answer record['field'] / record.get(), so pages and
+# components written against dict rows keep working.
+
+class UserRef:
+    """Id and display name of a user referenced by an expense"""
+    __slots__ = ('id', 'name')
+
+    def __init__(self, user_id: Optional[str], name: Optional[str]):
+        self.id = user_id
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"UserRef({self.id!r}, {self.name!r})"
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+class Expense:
+    """One expense list row: the EXPENSE_SUMMARY_SELECT columns plus category ids"""
+    __slots__ = ('id', 'description', 'amount_cents', 'phase', 'priority', 'priority_rank',
+                 'payment_method', 'requester', 'category_ids', '_created_at', '_updated_at',
+                 '_created_dt', '_updated_dt')
+
+    # Keys readable with record['key'] / record.get('key')
+    KEYS = frozenset({'id', 'description', 'amount', 'amount_cents', 'phase', 'priority', 'priority_rank',
+                      'payment_method', 'requester_id', 'requester_name', 'category_ids',
+                      'created_at', 'updated_at'})
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any], users: Dict[str, UserRef] = None) -> "Expense":
+        """Build from a PostgREST row (flattened by f_read or not); users shares UserRefs across rows"""
+        record = cls.__new__(cls)
+        record.id = int(row['id'])
+        record.description = row.get('description')
+        record.amount_cents = to_cents(row.get('amount'))
+        record.phase = _intern(row.get('phase'))
+        record.priority = _intern(row.get('priority'))
+        record.priority_rank = row.get('priority_rank')
+        record.payment_method = _intern(row.get('payment_method'))
+        record.requester = _user_ref(row, users)
+        category_ids = row.get('category_ids')
+        record.category_ids = tuple(category_ids) if category_ids is not None else None
+        record._created_at = row.get('created_at')
+        record._updated_at = row.get('updated_at')
+        record._created_dt = None
+        record._updated_dt = None
+        return record
+
+    def merged(self, row: Dict[str, Any], users: Dict[str, UserRef] = None) -> "Expense":
+        """New record with the columns present in row (e.g. a write result) replacing this one's"""
+        current = self.to_dict()
+        current.update({key: value for key, value in row.items() if key in self.KEYS})
+        if 'requester_id' in row and row['requester_id'] != self.requester_id and 'requester_name' not in row:
+            current.pop('requester_name', None)
+        return Expense.from_row(current, users)
+
+    @property
+    def amount(self) -> float:
+        return from_cents(self.amount_cents)
+
+    @property
+    def requester_id(self) -> Optional[str]:
+        return self.requester.id if self.requester else None
+
+    @property
+    def requester_name(self) -> Optional[str]:
+        return self.requester.name if self.requester else None
+
+    @property
+    def created_at(self) -> Optional[str]:
+        return self._created_at
+
+    @property
+    def updated_at(self) -> Optional[str]:
+        return self._updated_at
+
+    @property
+    def created_dt(self) -> Optional[datetime]:
+        if self._created_dt is None and self._created_at:
+            self._created_dt = datetime.fromisoformat(self._created_at)
+        return self._created_dt
+
+    @property
+    def updated_dt(self) -> Optional[datetime]:
+        if self._updated_dt is None and self._updated_at:
+            self._updated_dt = datetime.fromisoformat(self._updated_at)
+        return self._updated_dt
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = getattr(self, key) if key in self.KEYS else None
+        return default if value is None else value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.KEYS and getattr(self, key) is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: getattr(self, key) for key in self.KEYS if key != 'amount_cents'}
+
+    def __repr__(self) -> str:
+        return f"Expense(id={self.id}, phase={self.phase!r}, amount_cents={self.amount_cents})"
+
+def _user_ref(row: Dict[str, Any], users: Optional[Dict[str, UserRef]]) -> Optional[UserRef]:
+    user_id = row.get('requester_id')
+    name = row.get('requester_name')
+    if name is None and isinstance(row.get('requester'), dict):
+        name = row['requester'].get('name')
+    if user_id is None and name is None:
+        return None
+    if users is None:
+        return UserRef(user_id, name)
+    ref = users.get(user_id)
+    if ref is None or (name is not None and ref.name != name):
+        ref = users[user_id] = UserRef(user_id, name)
+    return ref
+
+def expense_records(rows: List[Dict[str, Any]], users: Dict[str, UserRef] = None) -> List[Expense]:
+    """Records for many rows, sharing one UserRef per requester"""
+    users = {} if users is None else users
+    return [Expense.from_row(row, users) for row in rows]
+
+def record_size(obj: Any, seen: set = None) -> int:
+    """Approximate deep size in bytes of rows, records and the containers holding them"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(record_size(k, seen) + record_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(record_size(item, seen) for item in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(record_size(getattr(obj, slot), seen) for slot in obj.__slots__ if hasattr(obj, slot))
+    return size
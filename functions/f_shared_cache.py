@@ -0,0 +1,143 @@
+import streamlit as st
+import time
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from functions.f_cache_backends import CacheBackend, cache_backend_from_env, dumps, loads
+
+# Process-wide cache for reads that are the same for every user (dashboard statistics,
+# recent expenses, the review queue head, categories). Keys are tuples whose first item
+# names the query, e.g. ('recent_expenses', 10).
+#  - single flight: concurrent misses of a key wait on one loader call
+#  - stale-while-revalidate: for stale_ttl seconds after expiry the old value is returned
+#    at once while one background refresh runs
+# So a burst of sessions costs one Supabase request per key per TTL. Values are pickled
+# into the backend, so every read returns its own copy.
+# Entries live in a CacheBackend (f_cache_backends): with the sqlite or redis backend every
+# worker process on the host reads the same entries, and they survive restarts. Timestamps
+# are wall-clock for that reason. Single flight and refreshes are coordinated per process.
+DEFAULT_TTL = 30
+DEFAULT_STALE_TTL = 300
+REFRESH_WORKERS = 2
+
+class SharedCache:
+    """Thread-safe TTL cache with request coalescing and background refresh"""
+
+    def __init__(self, backend: Optional[CacheBackend] = None, refresh_workers: int = REFRESH_WORKERS):
+        self._lock = threading.Lock()
+        # Stored per key: (value, fresh_until, stale_until), tagged with the query name
+        self._backend = backend if backend is not None else cache_backend_from_env()
+        self._inflight: Dict[Tuple, Future] = {}
+        # Bumped by invalidate() so a load that started earlier does not store its result
+        self._generations: Dict[Hashable, int] = {}
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "loads": 0, "backend_errors": 0}
+
+    @staticmethod
+    def _storage_key(key: Tuple) -> str:
+        return repr(key)
+
+    def _read(self, key: Tuple) -> Optional[Tuple[Any, float, float]]:
+        """Stored entry, or None when missing or the backend is unavailable"""
+        try:
+            data = self._backend.get(self._storage_key(key))
+            return loads(data) if data is not None else None
+        except Exception:
+            self.stats["backend_errors"] += 1
+            traceback.print_exc()
+            return None
+
+    def _write(self, key: Tuple, entry: Tuple[Any, float, float], ttl: float) -> None:
+        try:
+            self._backend.set(self._storage_key(key), dumps(entry), ttl, tags=(str(key[0]),))
+        except Exception:
+            self.stats["backend_errors"] += 1
+            traceback.print_exc()
+
+    def get(self, key: Tuple, loader: Callable[[], Any], ttl: float = DEFAULT_TTL,
+            stale_ttl: float = DEFAULT_STALE_TTL) -> Any:
+        """Cached value of key, calling loader at most once at a time per key
+
+        Exceptions from loader reach every caller waiting on that load and are not cached.
+        """
+        entry = self._read(key)
+        now = time.time()
+        if entry and now < entry[1]:
+            with self._lock:
+                self.stats["hits"] += 1
+            return entry[0]
+        with self._lock:
+            if entry and now < entry[2]:
+                self.stats["stale_hits"] += 1
+                if key not in self._inflight:
+                    future = self._inflight[key] = Future()
+                    self._executor.submit(self._load, key, loader, ttl, stale_ttl, future, True)
+                return entry[0]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if leader:
+            self._load(key, loader, ttl, stale_ttl, future, False)
+        return future.result()
+
+    def _load(self, key: Tuple, loader: Callable[[], Any], ttl: float, stale_ttl: float,
+              future: Future, background: bool) -> None:
+        with self._lock:
+            generation = self._generations.get(key[0], 0)
+        try:
+            value = loader()
+        except BaseException as e:
+            if background:
+                # The stale value keeps being served until it runs out
+                traceback.print_exc()
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            return
+
+        now = time.time()
+        with self._lock:
+            self.stats["loads"] += 1
+            current = self._generations.get(key[0], 0) == generation
+        if current:
+            self._write(key, (value, now + ttl, now + ttl + stale_ttl), ttl + stale_ttl)
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_result(value)
+
+    def invalidate(self, *names: Hashable) -> None:
+        """Drop every key of the named queries (all keys when no name is given)"""
+        try:
+            if names:
+                self._backend.invalidate_tags(*(str(name) for name in names))
+            else:
+                self._backend.clear()
+        except Exception:
+            self.stats["backend_errors"] += 1
+            traceback.print_exc()
+        with self._lock:
+            for name in names or {key[0] for key in self._inflight}:
+                self._generations[name] = self._generations.get(name, 0) + 1
+
+    def discard(self, *keys: Tuple) -> None:
+        """Drop single keys, e.g. one expense's detail, leaving the rest of their query cached"""
+        for key in keys:
+            try:
+                self._backend.delete(self._storage_key(key))
+            except Exception:
+                self.stats["backend_errors"] += 1
+                traceback.print_exc()
+        with self._lock:
+            for name in {key[0] for key in keys}:
+                self._generations[name] = self._generations.get(name, 0) + 1
+
+@st.cache_resource
+def get_shared_cache() -> SharedCache:
+    """Cache shared by all sessions of this app process (storage per PAGOS_CACHE_BACKEND)"""
+    return SharedCache()
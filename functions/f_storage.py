@@ -0,0 +1,219 @@
+import streamlit as st
+import os
+import time
+import base64
+import hashlib
+import requests
+from supabase import create_client, Client
+from typing import Dict, Optional, Any
+
+# Supabase Storage requires 6 MB chunks for resumable (TUS) uploads.
+# Files up to one chunk go in a single request; larger files are sent chunk by chunk,
+# so at most one chunk is copied out of the uploaded file's buffer at a time.
+# Objects are stored at <sha256>.<ext> and recorded in file_blobs (db_setup/file_blobs.sql),
+# so identical files are uploaded once per bucket.
+CHUNK_SIZE = 6 * 1024 * 1024
+MAX_CHUNK_RETRIES = 3
+
+@st.cache_resource
+def get_storage_session() -> requests.Session:
+    """Keep-alive HTTP session reused for all Supabase Storage requests"""
+    return requests.Session()
+
+@st.cache_resource
+def get_storage_admin_client() -> Client:
+    """Service role client for the file_blobs table, cached across uploads"""
+    url = os.environ.get("SUPABASE_URL")
+    service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not service_key:
+        return None
+    return create_client(url, service_key)
+
+def _storage_config(action: str = "upload file") -> Optional[Dict[str, str]]:
+    """Storage base URL and service role headers; action names the operation in the error"""
+    url = os.environ.get("SUPABASE_URL")
+    service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not service_key:
+        st.error(f"Missing Supabase service role key. Cannot {action}.")
+        return None
+    return {
+        "url": url.rstrip('/'),
+        "authorization": f"Bearer {service_key}",
+        "apikey": service_key
+    }
+
+def file_view(file) -> memoryview:
+    """Zero-copy view over an UploadedFile (or any BytesIO) buffer; release it when done"""
+    if hasattr(file, 'getbuffer'):
+        return file.getbuffer()
+    return memoryview(file.getvalue())
+
+def public_url(bucket_name: str, storage_path: str) -> str:
+    """Public URL of a storage object (same value as storage.get_public_url, without a client)"""
+    url = os.environ.get("SUPABASE_URL", "").rstrip('/')
+    return f"{url}/storage/v1/object/public/{bucket_name}/{storage_path}"
+
+def _upload_single(session: requests.Session, config: Dict[str, str], bucket_name: str,
+                   storage_path: str, view: memoryview, content_type: str) -> None:
+    """Upload a file that fits in one chunk with a single POST, retrying on failure"""
+    headers = {
+        "Authorization": config["authorization"],
+        "apikey": config["apikey"],
+        "Content-Type": content_type
+    }
+    endpoint = f"{config['url']}/storage/v1/object/{bucket_name}/{storage_path}"
+
+    for attempt in range(MAX_CHUNK_RETRIES):
+        try:
+            response = session.post(endpoint, headers=headers, data=bytes(view), timeout=60)
+            # 409: the object is already there (content-addressed path uploaded concurrently)
+            if response.ok or response.status_code == 409:
+                return
+            error = f"{response.status_code} {response.text}"
+            # Client errors (duplicate path, bad bucket, too large) will not succeed on retry
+            if 400 <= response.status_code < 500:
+                break
+        except requests.RequestException as e:
+            error = str(e)
+        time.sleep(2 ** attempt)
+
+    raise RuntimeError(f"Upload failed: {error}")
+
+def _tus_metadata(bucket_name: str, storage_path: str, content_type: str) -> str:
+    """Upload-Metadata header value: comma-separated key/base64-value pairs"""
+    values = {
+        "bucketName": bucket_name,
+        "objectName": storage_path,
+        "contentType": content_type
+    }
+    return ",".join(f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in values.items())
+
+def _tus_server_offset(session: requests.Session, location: str, headers: Dict[str, str]) -> Optional[int]:
+    """Ask the server how many bytes of a resumable upload it has stored"""
+    try:
+        response = session.head(location, headers=headers, timeout=30)
+        if response.ok and 'Upload-Offset' in response.headers:
+            return int(response.headers['Upload-Offset'])
+    except requests.RequestException:
+        pass
+    return None
+
+def _upload_resumable(session: requests.Session, config: Dict[str, str], bucket_name: str,
+                      storage_path: str, view: memoryview, content_type: str) -> None:
+    """Upload a large file with the TUS protocol, retrying individual chunks"""
+    headers = {
+        "Authorization": config["authorization"],
+        "apikey": config["apikey"],
+        "Tus-Resumable": "1.0.0"
+    }
+
+    create = session.post(
+        f"{config['url']}/storage/v1/upload/resumable",
+        headers={
+            **headers,
+            "Upload-Length": str(len(view)),
+            "Upload-Metadata": _tus_metadata(bucket_name, storage_path, content_type)
+        },
+        timeout=30
+    )
+    if create.status_code == 409:
+        return
+    if create.status_code != 201:
+        raise RuntimeError(f"Could not start resumable upload: {create.status_code} {create.text}")
+    location = create.headers['Location']
+
+    offset = 0
+    failures = 0
+    while offset < len(view):
+        chunk = view[offset:offset + CHUNK_SIZE]
+        try:
+            response = session.patch(
+                location,
+                headers={
+                    **headers,
+                    "Upload-Offset": str(offset),
+                    "Content-Type": "application/offset+octet-stream"
+                },
+                data=bytes(chunk),
+                timeout=60
+            )
+            new_offset = int(response.headers['Upload-Offset']) if response.status_code == 204 else None
+        except requests.RequestException:
+            new_offset = None
+
+        if new_offset is None:
+            failures += 1
+            if failures > MAX_CHUNK_RETRIES:
+                raise RuntimeError(f"Chunk at offset {offset} failed after {MAX_CHUNK_RETRIES} retries")
+            time.sleep(2 ** (failures - 1))
+            # The chunk may have (partly) landed before the error; resume from the server's offset
+            new_offset = _tus_server_offset(session, location, headers)
+            if new_offset is None or new_offset <= offset:
+                continue
+
+        failures = 0
+        offset = new_offset
+
+def find_blob(bucket_name: str, content_hash: str) -> Optional[Dict[str, Any]]:
+    """Look up an already-stored object by content hash"""
+    supabase_admin = get_storage_admin_client()
+    if not supabase_admin:
+        return None
+    response = supabase_admin.table('file_blobs').select('*').eq('bucket', bucket_name).eq('content_hash', content_hash).limit(1).execute()
+    return response.data[0] if response.data else None
+
+def register_blob(bucket_name: str, content_hash: str, storage_path: str, file_size: int, content_type: str) -> Optional[Dict[str, Any]]:
+    """Record a stored object in file_blobs; returns the existing row if another upload got there first"""
+    supabase_admin = get_storage_admin_client()
+    if not supabase_admin:
+        return None
+    blob_data = {
+        "bucket": bucket_name,
+        "content_hash": content_hash,
+        "storage_path": storage_path,
+        "file_size": file_size,
+        "content_type": content_type
+    }
+    supabase_admin.table('file_blobs').upsert(blob_data, on_conflict='bucket,content_hash', ignore_duplicates=True).execute()
+    return find_blob(bucket_name, content_hash)
+
+def upload_file(file, bucket_name: str = "quotes") -> Optional[Dict[str, Any]]:
+    """Upload a file to Supabase Storage, deduplicated by SHA-256
+
+    The file is hashed straight from its buffer (no copy). If the same bytes are
+    already in the bucket the existing object is linked and nothing is uploaded;
+    otherwise it is stored at <sha256>.<ext>. Returns file_url, file_name,
+    file_size, storage_path, content_hash, blob_id and deduplicated.
+    """
+    config = _storage_config()
+    if not config:
+        return None
+
+    file_extension = file.name.split('.')[-1].lower() if '.' in file.name else ''
+    content_type = file.type or "application/octet-stream"
+
+    with file_view(file) as view:
+        file_size = len(view)
+        content_hash = hashlib.sha256(view).hexdigest()
+
+        blob = find_blob(bucket_name, content_hash)
+        deduplicated = blob is not None
+        if not deduplicated:
+            storage_path = f"{content_hash}.{file_extension}" if file_extension else content_hash
+            session = get_storage_session()
+            if file_size <= CHUNK_SIZE:
+                _upload_single(session, config, bucket_name, storage_path, view, content_type)
+            else:
+                _upload_resumable(session, config, bucket_name, storage_path, view, content_type)
+            blob = register_blob(bucket_name, content_hash, storage_path, file_size, content_type)
+
+    storage_path = blob['storage_path'] if blob else storage_path
+    return {
+        "file_url": public_url(bucket_name, storage_path),
+        "file_name": file.name,
+        "file_size": file_size,
+        "storage_path": storage_path,
+        "content_hash": content_hash,
+        "blob_id": blob['id'] if blob else None,
+        "deduplicated": deduplicated
+    }
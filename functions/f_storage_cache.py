@@ -0,0 +1,126 @@
+import streamlit as st
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from functions.f_storage import get_storage_session, _storage_config
+
+# Downloaded quotes and receipts are kept on local disk, bounded by size and evicted
+# least-recently-used first, so repeated reviews of the same documents are local reads.
+# Objects uploaded by f_storage live at <sha256>.<ext>, so a path never changes content;
+# content_hash is still part of the key for objects stored under other names.
+CACHE_DIR = os.environ.get("PAGOS_STORAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pagos-storage-cache"))
+CACHE_MAX_BYTES = int(os.environ.get("PAGOS_STORAGE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+class DiskLRUCache:
+    """Size-bounded directory of cached objects; recency is kept in memory and in file mtimes"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        """Rebuild the index from disk, oldest first, so a restart keeps the cache warm"""
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key))
+            return data
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._entries.pop(key, 0)
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        # Write to a temp file and rename so readers never see a partial object
+        tmp_path = f"{self._path(key)}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+
+        evicted = []
+        with self._lock:
+            self._total -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total += len(data)
+            while self._total > self.max_bytes and self._entries:
+                old_key, size = self._entries.popitem(last=False)
+                self._total -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes}
+
+@st.cache_resource
+def get_download_cache() -> DiskLRUCache:
+    """Disk cache shared by all sessions of this app process"""
+    return DiskLRUCache(CACHE_DIR, CACHE_MAX_BYTES)
+
+def _cache_key(bucket_name: str, storage_path: str, content_hash: str = None) -> str:
+    key = hashlib.sha256(f"{bucket_name}/{storage_path}#{content_hash or ''}".encode()).hexdigest()
+    extension = storage_path.rsplit('.', 1)[-1].lower() if '.' in storage_path else 'bin'
+    return f"{key}.{extension}"
+
+def download_file(bucket_name: str, storage_path: str, content_hash: str = None) -> Optional[bytes]:
+    """Bytes of a storage object, served from the local cache when possible"""
+    cache = get_download_cache()
+    key = _cache_key(bucket_name, storage_path, content_hash)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    config = _storage_config("download file")
+    if not config:
+        return None
+    response = get_storage_session().get(
+        f"{config['url']}/storage/v1/object/authenticated/{bucket_name}/{storage_path}",
+        headers={"Authorization": config["authorization"], "apikey": config["apikey"]},
+        timeout=60
+    )
+    if not response.ok:
+        raise RuntimeError(f"Download failed: {response.status_code} {response.text}")
+    data = response.content
+    cache.put(key, data)
+    return data
+
+def storage_path_from_url(file_url: str) -> Optional[Tuple[str, str]]:
+    """(bucket, path) of a public object URL as stored in quotes/payment_receipts.file_url"""
+    marker = "/storage/v1/object/public/"
+    if not file_url or marker not in file_url:
+        return None
+    bucket_name, _, storage_path = file_url.split(marker, 1)[1].partition('/')
+    return bucket_name, storage_path.split('?', 1)[0]
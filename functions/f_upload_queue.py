@@ -0,0 +1,265 @@
+import streamlit as st
+import io
+import os
+import time
+import socket
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple, Any
+from functions.f_storage import upload_file, get_storage_admin_client
+from functions.f_cud import log_expense_event
+from functions.f_read import invalidate_expense_detail
+from functions.f_images import get_image_pool, is_image, normalize_image
+
+# Uploads run in a small in-process thread pool; upload_jobs (db_setup/upload_jobs.sql)
+# records each one so pages can poll its state. An expense's attachment status is its
+# latest job's status; expenses itself is never written, so uploads do not move its
+# updated_at (the transition RPC's concurrency check) or the sync watermarks. The file bytes only live in the process
+# that queued the job, so each open job carries that process (owner) and a heartbeat it
+# refreshes. A job whose owner is gone or whose heartbeat went stale is marked failed and
+# the user is asked to upload again; jobs of other live workers are left alone.
+UPLOAD_WORKERS = 4
+MAX_JOB_ATTEMPTS = 2
+HEARTBEAT_SECONDS = 30
+UPLOAD_POLL_SECONDS = 3
+STALE_AFTER_SECONDS = 120
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+JOB_BUCKETS = {
+    "quote": "quotes",
+    "receipt": "receipts"
+}
+
+class _QueuedFile(io.BytesIO):
+    """In-memory copy of an UploadedFile that outlives the Streamlit rerun that received it"""
+    def __init__(self, data: bytes, name: str, file_type: str):
+        super().__init__(data)
+        self.name = name
+        self.type = file_type
+
+@st.cache_resource
+def get_upload_executor() -> ThreadPoolExecutor:
+    """Worker pool shared by all sessions, plus the heartbeat thread for its jobs"""
+    threading.Thread(target=_heartbeat_loop, name="upload-heartbeat", daemon=True).start()
+    return ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _owner_is_gone(owner: Optional[str]) -> bool:
+    """Whether owner is a process on this host that no longer runs (other hosts rely on the heartbeat)"""
+    host, _, pid = (owner or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit() or owner == WORKER_ID:
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+def _heartbeat_loop() -> None:
+    """Keep this process's open jobs alive and fail the ones abandoned by other processes"""
+    while True:
+        try:
+            get_storage_admin_client().table('upload_jobs').update({
+                "heartbeat_at": _now().isoformat()
+            }).eq('owner', WORKER_ID).in_('status', ['pending', 'uploading']).execute()
+            fail_interrupted_jobs()
+        except Exception:
+            traceback.print_exc()
+        time.sleep(HEARTBEAT_SECONDS)
+
+def fail_interrupted_jobs() -> int:
+    """Mark open jobs whose worker process is gone or stopped sending heartbeats as failed"""
+    supabase_admin = get_storage_admin_client()
+    if not supabase_admin:
+        return 0
+    response = supabase_admin.table('upload_jobs').select('id, owner, heartbeat_at').in_('status', ['pending', 'uploading']).execute()
+    cutoff = _now() - timedelta(seconds=STALE_AFTER_SECONDS)
+    abandoned = [
+        job for job in response.data or []
+        if job.get('owner') != WORKER_ID and (
+            not job.get('heartbeat_at')
+            or datetime.fromisoformat(job['heartbeat_at']) < cutoff
+            or _owner_is_gone(job.get('owner'))
+        )
+    ]
+    if not abandoned:
+        return 0
+    # Only jobs still open: one may have finished since the select
+    interrupted = supabase_admin.table('upload_jobs').update({
+        "status": "failed",
+        "error": "Interrumpido por un reinicio de la aplicación"
+    }).in_('id', [job['id'] for job in abandoned]).in_('status', ['pending', 'uploading']).execute().data or []
+    return len(interrupted)
+
+def _update_job(job_id: int, update_data: Dict[str, Any]) -> None:
+    get_storage_admin_client().table('upload_jobs').update(update_data).eq('id', job_id).execute()
+
+def _prepare_image(file: _QueuedFile) -> Tuple[_QueuedFile, Optional[_QueuedFile]]:
+    """Downsize, recompress and strip a photo in the image process pool; returns (file, thumbnail)"""
+    if not is_image(file):
+        return file, None
+    try:
+        normalized, thumbnail = get_image_pool().submit(normalize_image, file.getvalue()).result()
+    except Exception:
+        # Undecodable image: keep the original rather than failing the upload
+        traceback.print_exc()
+        return file, None
+    stem = file.name.rsplit('.', 1)[0]
+    return (_QueuedFile(normalized, f"{stem}.jpg", "image/jpeg"),
+            _QueuedFile(thumbnail, f"{stem}_thumb.jpg", "image/jpeg"))
+
+def _insert_attachment(job: Dict[str, Any], file_info: Dict[str, Any], thumbnail_info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Create the quotes / payment_receipts row for a finished upload"""
+    supabase_admin = get_storage_admin_client()
+    row = {
+        **(job.get('payload') or {}),
+        "expense_id": job['expense_id'],
+        "file_url": file_info["file_url"],
+        "file_name": file_info["file_name"],
+        "file_size": file_info["file_size"],
+        "blob_id": file_info["blob_id"],
+        "thumbnail_url": thumbnail_info["file_url"] if thumbnail_info else None
+    }
+    if job['kind'] == 'receipt':
+        row.update({"payer_id": job['created_by'], "uploaded_at": datetime.now().isoformat()})
+        table = 'payment_receipts'
+    else:
+        table = 'quotes'
+    response = supabase_admin.table(table).insert(row).execute()
+    return response.data[0]
+
+def _run_upload_job(job: Dict[str, Any], file: _QueuedFile) -> None:
+    """Worker body: upload, create the attachment row and record the result on the job"""
+    file, thumbnail = _prepare_image(file)
+    error = None
+    for attempt in range(1, MAX_JOB_ATTEMPTS + 1):
+        try:
+            _update_job(job['id'], {"status": "uploading", "attempts": attempt})
+            file.seek(0)
+            file_info = upload_file(file, job['bucket'])
+            if not file_info:
+                raise RuntimeError("Storage is not configured")
+            thumbnail_info = None
+            if thumbnail:
+                thumbnail.seek(0)
+                thumbnail_info = upload_file(thumbnail, job['bucket'])
+            attachment = _insert_attachment(job, file_info, thumbnail_info)
+            break
+        except Exception as e:
+            error = str(e)
+            traceback.print_exc()
+    else:
+        _update_job(job['id'], {"status": "failed", "error": error})
+        return
+
+    _update_job(job['id'], {"status": "done", "error": None, "result_id": attachment['id']})
+    # The new quote / receipt shows in the expense's detail view
+    invalidate_expense_detail(job['expense_id'])
+    event_type = 'receipt_uploaded' if job['kind'] == 'receipt' else 'quote_created'
+    detail_key = 'receipt_id' if job['kind'] == 'receipt' else 'quote_id'
+    log_expense_event(job['expense_id'], job['created_by'], event_type, details={detail_key: attachment['id']})
+
+def _run_upload_job_safely(job: Dict[str, Any], file: _QueuedFile) -> None:
+    try:
+        _run_upload_job(job, file)
+    except Exception:
+        # Nothing is waiting on the future; make sure failures reach the logs
+        traceback.print_exc()
+
+def enqueue_upload(expense_id: int, kind: str, file, created_by: str, payload: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+    """Queue an attachment upload for an existing expense and return the job row
+
+    kind is 'quote' or 'receipt'; payload holds extra columns for the quotes /
+    payment_receipts row (e.g. receiver_id and total for a quote).
+    """
+    try:
+        supabase_admin = get_storage_admin_client()
+        if not supabase_admin:
+            st.error("Missing Supabase service role key. Cannot upload file.")
+            return None
+
+        # Copy the bytes now: the UploadedFile is released when this run ends
+        queued_file = _QueuedFile(file.getvalue(), file.name, file.type)
+
+        job_data = {
+            "expense_id": expense_id,
+            "kind": kind,
+            "bucket": JOB_BUCKETS[kind],
+            "file_name": file.name,
+            "file_size": len(queued_file.getbuffer()),
+            "payload": payload,
+            "created_by": created_by,
+            "owner": WORKER_ID,
+            "heartbeat_at": _now().isoformat()
+        }
+        response = supabase_admin.table('upload_jobs').insert(job_data).execute()
+        if not response.data:
+            st.error("Failed to queue upload")
+            return None
+        job = response.data[0]
+
+        get_upload_executor().submit(_run_upload_job_safely, job, queued_file)
+        return job
+    except Exception as e:
+        st.error(f"Error queuing upload: {str(e)}")
+        return None
+
+def get_upload_job(job_id: int) -> Optional[Dict[str, Any]]:
+    """Current state of one upload job"""
+    try:
+        response = get_storage_admin_client().table('upload_jobs').select('*').eq('id', job_id).execute()
+        return response.data[0] if response.data else None
+    except Exception as e:
+        st.error(f"Error fetching upload job: {str(e)}")
+        return None
+
+def get_upload_jobs_by_user(user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Most recent upload jobs queued by a user"""
+    try:
+        response = get_storage_admin_client().table('upload_jobs').select('*').eq('created_by', user_id).order('created_at', desc=True).limit(limit).execute()
+        return response.data
+    except Exception as e:
+        st.error(f"Error fetching upload jobs: {str(e)}")
+        return []
+
+UPLOAD_STATUS_LABELS = {
+    "pending": "⏳ En cola",
+    "uploading": "📤 Subiendo",
+    "done": "✅ Listo",
+    "failed": "❌ Falló"
+}
+
+def _has_open_jobs(jobs: List[Dict[str, Any]]) -> bool:
+    return any(job['status'] in ('pending', 'uploading') for job in jobs)
+
+def show_upload_jobs(user_id: str) -> None:
+    """Show the user's recent uploads, polling every UPLOAD_POLL_SECONDS while any of them is open"""
+    # Starts this process's heartbeat, which also fails jobs abandoned by dead workers
+    get_upload_executor()
+    polling = _has_open_jobs(get_upload_jobs_by_user(user_id, limit=5))
+
+    # Only this panel reruns while polling; once every job has finished, one full rerun
+    # redraws the page without the timer
+    @st.fragment(run_every=UPLOAD_POLL_SECONDS if polling else None)
+    def upload_jobs_panel():
+        jobs = get_upload_jobs_by_user(user_id, limit=5)
+        if polling and not _has_open_jobs(jobs):
+            st.rerun(scope="app")
+        if not jobs:
+            return
+        st.write("**Archivos recientes**")
+        for job in jobs:
+            label = UPLOAD_STATUS_LABELS.get(job['status'], job['status'])
+            line = f"{label} · {job['file_name']} (gasto #{job['expense_id']})"
+            if job['status'] == 'failed' and job.get('error'):
+                line += f" — {job['error']}"
+            st.caption(line)
+
+    upload_jobs_panel()
@@ -0,0 +1,104 @@
+import streamlit as st
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Any
+from functions.f_read import ExpenseQuery, get_expense_changes_since
+from functions.f_records import Expense, expense_records
+
+# Each session keeps the expense lists it has loaded (its working set). Mutations in f_cud
+# patch or drop the affected row from the row the server returned, so a triage session does
+# not refetch a whole list after every action. Every RECONCILE_SECONDS a list is brought
+# up to date with only the rows changed since its newest updated_at (the watermark).
+# updated_at is the writing transaction's start time, so a row can commit with a timestamp
+# older than rows already seen: each reconcile re-reads RECONCILE_OVERLAP_SECONDS before
+# the watermark (merging a row twice is harmless), and only rows read from the server move
+# the watermark, never this session's own write results.
+# Lists are keyed by their ExpenseQuery; only the most recently used few are kept.
+# Rows are kept as compact Expense records (functions/f_records.py), not JSON dicts.
+RECONCILE_SECONDS = 30
+MAX_WORKING_SETS = 8
+RECONCILE_OVERLAP_SECONDS = 5
+
+def _sets() -> Dict[str, Dict[str, Any]]:
+    return st.session_state.setdefault('expense_working_sets', {})
+
+def _belongs(working_set: Dict[str, Any], expense: Expense) -> bool:
+    return working_set['query'].matches(expense)
+
+def _sorted(working_set: Dict[str, Any]) -> List[Expense]:
+    rows = list(working_set['rows'].values())
+    # Stable sorts from the last key to the first; None sorts last whatever the direction
+    for key, descending in reversed(working_set['query'].ordering()):
+        if descending:
+            rows.sort(key=lambda e: (e.get(key) is not None, e.get(key)), reverse=True)
+        else:
+            rows.sort(key=lambda e: (e.get(key) is None, e.get(key)))
+    return rows
+
+def _merge(working_set: Dict[str, Any], expense: Dict[str, Any], advance: bool = True) -> None:
+    """Insert, update or drop one row according to its current state
+
+    advance moves the watermark to the row's updated_at; only for rows read by a reconcile.
+    """
+    rows = working_set['rows']
+    expense_id = int(expense['id'])
+    current = rows.get(expense_id)
+    if expense.get('deleted_at'):
+        rows.pop(expense_id, None)
+    else:
+        # Keep fields only the list query had (e.g. requester_name, category_ids)
+        merged = current.merged(expense, working_set['users']) if current else Expense.from_row(expense, working_set['users'])
+        if _belongs(working_set, merged):
+            rows[expense_id] = merged
+        else:
+            rows.pop(expense_id, None)
+    updated_at = expense.get('updated_at')
+    if advance and updated_at and datetime.fromisoformat(updated_at) > datetime.fromisoformat(working_set['watermark']):
+        working_set['watermark'] = updated_at
+
+def _reconcile(working_set: Dict[str, Any]) -> None:
+    since = datetime.fromisoformat(working_set['watermark']) - timedelta(seconds=RECONCILE_OVERLAP_SECONDS)
+    for expense in get_expense_changes_since(since.isoformat(), working_set['query'].delta_select()):
+        _merge(working_set, expense)
+    working_set['checked_at'] = time.monotonic()
+
+def get_working_set(query: ExpenseQuery) -> List[Expense]:
+    """Rows matching a query, loaded once per session and kept current incrementally"""
+    sets = _sets()
+    name = query.key()
+    working_set = sets.pop(name, None)
+    if working_set is None:
+        users = {}
+        records = expense_records(query.fetch(), users)
+        working_set = {
+            'rows': {record.id: record for record in records},
+            'users': users,
+            'query': query,
+            'watermark': max((record.updated_at for record in records if record.updated_at),
+                             key=datetime.fromisoformat, default='1970-01-01T00:00:00+00:00'),
+            'checked_at': time.monotonic()
+        }
+    elif time.monotonic() - working_set['checked_at'] > RECONCILE_SECONDS:
+        _reconcile(working_set)
+    # Most recently used last; drop the oldest lists beyond the limit
+    sets[name] = working_set
+    while len(sets) > MAX_WORKING_SETS:
+        del sets[next(iter(sets))]
+    return _sorted(working_set)
+
+def apply_expense_change(expense: Dict[str, Any]) -> None:
+    """Patch every loaded list with the server's representation of a changed expense"""
+    for working_set in _sets().values():
+        _merge(working_set, expense, advance=False)
+
+def discard_expense(expense_id: int) -> None:
+    """Drop a deleted expense from every loaded list"""
+    for working_set in _sets().values():
+        working_set['rows'].pop(int(expense_id), None)
+
+def reset_working_set(query: Optional[ExpenseQuery] = None) -> None:
+    """Forget a loaded list (all of them when no query is given) so the next read refetches it"""
+    if query is None:
+        _sets().clear()
+    else:
+        _sets().pop(query.key(), None)
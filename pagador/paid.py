@@ -1,5 +1,9 @@
 import streamlit as st
-from functions.f_read import get_paid_expenses, get_user_by_id
+from functions.f_read import ExpenseQuery, get_categories, get_expense_detail
+from functions.f_storage_cache import download_file, storage_path_from_url
+from functions.f_components import show_expense_detail, show_expense_table
+from functions.f_working_set import get_working_set
+from functions.f_money import sum_cents, mean_cents, format_money
 from datetime import datetime, timedelta
 
 st.subheader("Gastos Pagados")
@@ -11,18 +15,17 @@ if not user:
     st.error("❌ No hay usuario autenticado.")
     st.stop()
 
-# Get paid expenses
-paid_expenses = get_paid_expenses()
-
 # Filters
 st.subheader("🔍 Filtros")
 
+categories = {c['description']: c['id'] for c in get_categories()}
+
 col1, col2, col3 = st.columns(3)
 
 with col1:
     category_filter = st.selectbox(
         "📂 Categoría",
-        ["Todas", "Alimentación", "Transporte", "Hospedaje", "Materiales", "Equipamiento", "Servicios", "Otros"]
+        ["Todas"] + list(categories)
     )
 
 with col2:
@@ -41,24 +44,22 @@ with col3:
         step=100.0
     )
 
-# Filter expenses
-filtered_expenses = paid_expenses
-
-if category_filter != "Todas":
-    filtered_expenses = [e for e in filtered_expenses if e.get('category') == category_filter]
-
-if len(date_range) == 2:
-    start_date = date_range[0].strftime("%Y-%m-%d")
-    end_date = date_range[1].strftime("%Y-%m-%d")
-    filtered_expenses = [e for e in filtered_expenses if start_date <= e['paid_at'][:10] <= end_date]
-
-filtered_expenses = [e for e in filtered_expenses if amount_range[0] <= e['amount'] <= amount_range[1]]
+# Paid expense summaries; details are loaded for the selected row only.
+# There is no paid_at column: the Pagado transition is the last update of a paid expense.
+# Filters are applied by the database, newest decision first.
+query = (ExpenseQuery()
+         .phase('Pagado')
+         .category_in([categories[category_filter]] if category_filter != "Todas" else [])
+         .date_between(*(date_range if len(date_range) == 2 else (None, None)), column='updated_at')
+         .amount_between(*amount_range)
+         .order_by('updated_at', desc=True))
+filtered_expenses = get_working_set(query)
 
 # Summary metrics
 if filtered_expenses:
-    total_amount = sum(e['amount'] for e in filtered_expenses)
-    avg_amount = total_amount / len(filtered_expenses)
-    recent_count = len([e for e in filtered_expenses if e['paid_at'][:10] >= (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")])
+    total_cents = sum_cents(e['amount'] for e in filtered_expenses)
+    avg_cents = mean_cents(total_cents, len(filtered_expenses))
+    recent_count = len([e for e in filtered_expenses if e['updated_at'][:10] >= (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")])
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -66,10 +67,10 @@ if filtered_expenses:
         st.metric("✅ Total Pagados", len(filtered_expenses))
     
     with col2:
-        st.metric("💰 Monto Total", f"${total_amount:,.2f}")
+        st.metric("💰 Monto Total", format_money(total_cents))
     
     with col3:
-        st.metric("📊 Promedio", f"${avg_amount:,.2f}")
+        st.metric("📊 Promedio", format_money(avg_cents))
     
     with col4:
         st.metric("🕒 Últimos 7 días", recent_count)
@@ -78,95 +79,35 @@ if filtered_expenses:
 st.subheader(f"📋 Gastos Pagados ({len(filtered_expenses)})")
 
 if filtered_expenses:
-    # Sort by payment date (newest first)
-    filtered_expenses.sort(key=lambda x: x['paid_at'], reverse=True)
-    
-    for expense in filtered_expenses:
-        # Get user info
-        requester = get_user_by_id(expense['user_id'])
-        approver = get_user_by_id(expense['approved_by'])
-        payer = get_user_by_id(expense['paid_by'])
-        
-        requester_name = requester['name'] if requester else 'Usuario Desconocido'
-        approver_name = approver['name'] if approver else 'Aprobador Desconocido'
-        payer_name = payer['name'] if payer else 'Pagador Desconocido'
-        
-        with st.expander(f"✅ ${expense['amount']:.2f} - {expense['description']} (por {requester_name})"):
-            col1, col2, col3 = st.columns([2, 2, 1])
-            
-            with col1:
-                st.write(f"**ID:** {expense['id']}")
-                st.write(f"**Solicitante:** {requester_name}")
-                st.write(f"**Descripción:** {expense['description']}")
-                st.write(f"**Categoría:** {expense.get('category', 'N/A')}")
-                st.write(f"**Fecha de gasto:** {expense.get('expense_date', expense['created_at'][:10])}")
-            
-            with col2:
-                st.write(f"**Monto:** ${expense['amount']:.2f}")
-                st.write(f"**Aprobado por:** {approver_name}")
-                st.write(f"**Pagado por:** {payer_name}")
-                st.write(f"**Fecha de pago:** {expense['paid_at'][:10]}")
-                st.write(f"**Proveedor:** {expense.get('vendor', 'N/A')}")
-            
-            with col3:
-                if st.button("👁️ Ver Detalles", key=f"view_{expense['id']}"):
-                    st.session_state.view_expense = expense
-                    st.rerun()
-            
-            # Show comments if any
-            if expense.get('comments'):
-                st.markdown("---")
-                st.write("**💬 Comentarios del solicitante:**")
-                st.write(expense['comments'])
-            
-            if expense.get('approver_comments'):
-                st.markdown("---")
-                st.write("**💬 Comentarios del aprobador:**")
-                st.write(expense['approver_comments'])
+    selected_id = show_expense_table(filtered_expenses, key="paid_expenses_table")
     
-    # View expense details
-    if 'view_expense' in st.session_state:
-        expense = st.session_state.view_expense
-        requester = get_user_by_id(expense['user_id'])
-        approver = get_user_by_id(expense['approved_by'])
-        payer = get_user_by_id(expense['paid_by'])
-        
+    if selected_id:
         st.markdown("---")
         st.subheader("👁️ Detalles del Gasto")
+        show_expense_detail(selected_id)
         
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write(f"**ID:** {expense['id']}")
-            st.write(f"**Solicitante:** {requester['name'] if requester else 'N/A'}")
-            st.write(f"**Email del solicitante:** {requester['email'] if requester else 'N/A'}")
-            st.write(f"**Descripción:** {expense['description']}")
-            st.write(f"**Categoría:** {expense.get('category', 'N/A')}")
-            st.write(f"**Monto:** ${expense['amount']:.2f}")
-            st.write(f"**Prioridad:** {expense.get('priority', 'N/A')}")
-        
-        with col2:
-            st.write(f"**Estado:** {expense['status']}")
-            st.write(f"**Aprobado por:** {approver['name'] if approver else 'N/A'}")
-            st.write(f"**Pagado por:** {payer['name'] if payer else 'N/A'}")
-            st.write(f"**Fecha de pago:** {expense['paid_at'][:10]}")
-            st.write(f"**Fecha de gasto:** {expense.get('expense_date', expense['created_at'][:10])}")
-            st.write(f"**Proveedor:** {expense.get('vendor', 'N/A')}")
-            st.write(f"**Método de pago:** {expense.get('payment_method', 'N/A')}")
-        
-        if expense.get('comments'):
-            st.markdown("---")
-            st.write("**💬 Comentarios del solicitante:**")
-            st.write(expense['comments'])
-        
-        if expense.get('approver_comments'):
-            st.markdown("---")
-            st.write("**💬 Comentarios del aprobador:**")
-            st.write(expense['approver_comments'])
-        
-        if st.button("❌ Cerrar"):
-            del st.session_state.view_expense
-            st.rerun()
+        # Receipt downloads come from the local storage cache after the first view
+        detail = get_expense_detail(selected_id)
+        if detail and detail.get('payment_receipts'):
+            st.write("**⬇️ Descargar comprobantes:**")
+            for receipt in detail['payment_receipts']:
+                location = storage_path_from_url(receipt['file_url'])
+                if not location:
+                    st.markdown(f"[{receipt.get('file_name') or 'Comprobante'}]({receipt['file_url']})")
+                    continue
+                try:
+                    data = download_file(*location, content_hash=receipt.get('content_hash'))
+                except Exception as e:
+                    st.error(f"Error descargando {receipt.get('file_name')}: {str(e)}")
+                    continue
+                if data is None:
+                    continue
+                st.download_button(
+                    f"⬇️ {receipt.get('file_name') or 'Comprobante'}",
+                    data=data,
+                    file_name=receipt.get('file_name') or location[1],
+                    key=f"download_receipt_{receipt['id']}"
+                )
 
 else:
-    st.success("🎉 ¡No hay gastos pagados!") 
\ No newline at end of file
+    st.success("🎉 ¡No hay gastos pagados!")
@@ -1,6 +1,10 @@
 import streamlit as st
-from functions.f_read import get_approved_expenses, get_user_by_id
-from functions.f_cud import mark_expense_as_paid
+from functions.f_read import ExpenseQuery, get_categories, get_receipt_counts
+from functions.f_cud import mark_expense_as_paid, get_claimed_batch, release_expenses, batch_released
+from functions.f_components import show_expense_detail, show_expense_table
+from functions.f_working_set import get_working_set
+from functions.f_records import expense_records
+from functions.f_money import sum_cents, format_money
 from datetime import datetime, timedelta
 
 st.subheader("Gastos Por Pagar")
@@ -12,21 +16,35 @@ if not user:
     st.error("❌ No hay usuario autenticado.")
     st.stop()
 
-# Get approved expenses (these are ready to be paid)
-approved_expenses = get_approved_expenses()
+# Work mode: claim a personal batch so payers don't pay the same expenses
+col1, col2, col3 = st.columns([2, 1, 1])
 
-# Filter out expenses that are already paid
-to_pay_expenses = [e for e in approved_expenses if e['status'] == 'approved']
+with col1:
+    view_mode = st.radio("📥 Vista", ["Mi lote", "Todos"], horizontal=True)
+
+with col2:
+    batch_size = st.number_input("Tamaño del lote", min_value=1, max_value=50, value=5, step=1)
+
+take_batch = False
+with col3:
+    if view_mode == "Mi lote":
+        if batch_released('Aprobado'):
+            take_batch = st.button("📥 Tomar lote")
+        elif st.button("↩️ Liberar lote"):
+            release_expenses(user['id'], 'Aprobado')
+            st.rerun()
 
 # Filters
 st.subheader("🔍 Filtros")
 
+categories = {c['description']: c['id'] for c in get_categories()}
+
 col1, col2, col3 = st.columns(3)
 
 with col1:
     category_filter = st.selectbox(
         "📂 Categoría",
-        ["Todas", "Alimentación", "Transporte", "Hospedaje", "Materiales", "Equipamiento", "Servicios", "Otros"]
+        ["Todas"] + list(categories)
     )
 
 with col2:
@@ -44,20 +62,29 @@ with col3:
         step=100.0
     )
 
-# Filter expenses
-filtered_expenses = to_pay_expenses
-
-if category_filter != "Todas":
-    filtered_expenses = [e for e in filtered_expenses if e.get('category') == category_filter]
-
-if priority_filter != "Todas":
-    filtered_expenses = [e for e in filtered_expenses if e.get('priority') == priority_filter]
-
-filtered_expenses = [e for e in filtered_expenses if amount_range[0] <= e['amount'] <= amount_range[1]]
+# Filters are applied by the database: most urgent, then oldest first
+query = (ExpenseQuery()
+         .phase('Aprobado')
+         .category_in([categories[category_filter]] if category_filter != "Todas" else [])
+         .priority_in([priority_filter] if priority_filter != "Todas" else [])
+         .amount_between(*amount_range)
+         .order_by('priority_rank', desc=True)
+         .order_by('created_at'))
+
+if view_mode == "Mi lote":
+    # Claim (a database write) only when returning to "Mi lote" or taking a new batch; other reruns
+    # reuse the session's batch
+    claimed_ids = get_claimed_batch(user['id'], 'Aprobado', int(batch_size),
+                                    refresh=take_batch or st.session_state.get('to_pay_view_mode') != "Mi lote")
+    filtered_expenses = expense_records(query.ids(claimed_ids).fetch()) if claimed_ids else []
+else:
+    # Loaded once per session and patched by each payment
+    filtered_expenses = get_working_set(query)
+st.session_state.to_pay_view_mode = view_mode
 
 # Summary metrics
 if filtered_expenses:
-    total_amount = sum(e['amount'] for e in filtered_expenses)
+    total_cents = sum_cents(e['amount'] for e in filtered_expenses)
     urgent_count = len([e for e in filtered_expenses if e.get('priority') == 'Urgente'])
     high_count = len([e for e in filtered_expenses if e.get('priority') == 'Alta'])
     
@@ -67,7 +94,7 @@ if filtered_expenses:
         st.metric("💳 Por Pagar", len(filtered_expenses))
     
     with col2:
-        st.metric("💰 Monto Total", f"${total_amount:,.2f}")
+        st.metric("💰 Monto Total", format_money(total_cents))
     
     with col3:
         st.metric("🚨 Urgentes", urgent_count)
@@ -78,78 +105,34 @@ if filtered_expenses:
 # Display expenses
 st.subheader(f"📋 Gastos Por Pagar ({len(filtered_expenses)})")
 
-if filtered_expenses:
-    # Sort by priority and approval date
-    priority_order = {"Urgente": 4, "Alta": 3, "Media": 2, "Baja": 1}
-    filtered_expenses.sort(key=lambda x: (priority_order.get(x.get('priority', 'Media'), 0), x['approved_at']), reverse=True)
+@st.fragment
+def payment_panel(expenses):
+    """Grid, pay action and confirm form; clicks rerun only this fragment, not the page"""
+    # Receipt counts for the whole list in one query
+    receipt_counts = get_receipt_counts([e['id'] for e in expenses])
     
-    for expense in filtered_expenses:
-        # Get user info
-        requester = get_user_by_id(expense['user_id'])
-        approver = get_user_by_id(expense['approved_by'])
-        
-        requester_name = requester['name'] if requester else 'Usuario Desconocido'
-        approver_name = approver['name'] if approver else 'Aprobador Desconocido'
-        
-        # Priority color
-        priority_colors = {
-            'Urgente': '🔴',
-            'Alta': '🟠',
-            'Media': '🟡',
-            'Baja': '🟢'
-        }
-        
-        priority_icon = priority_colors.get(expense.get('priority', 'Media'), '⚪')
-        
-        with st.expander(f"{priority_icon} ${expense['amount']:.2f} - {expense['description']} (por {requester_name})"):
-            col1, col2, col3 = st.columns([2, 2, 1])
-            
-            with col1:
-                st.write(f"**ID:** {expense['id']}")
-                st.write(f"**Solicitante:** {requester_name}")
-                st.write(f"**Descripción:** {expense['description']}")
-                st.write(f"**Categoría:** {expense.get('category', 'N/A')}")
-                st.write(f"**Fecha de gasto:** {expense.get('expense_date', expense['created_at'][:10])}")
-            
-            with col2:
-                st.write(f"**Monto:** ${expense['amount']:.2f}")
-                st.write(f"**Aprobado por:** {approver_name}")
-                st.write(f"**Fecha de aprobación:** {expense['approved_at'][:10]}")
-                st.write(f"**Proveedor:** {expense.get('vendor', 'N/A')}")
-                st.write(f"**Método de pago:** {expense.get('payment_method', 'N/A')}")
-            
-            with col3:
-                # Payment actions
-                if st.button("💳 Marcar como Pagado", key=f"pay_{expense['id']}"):
-                    st.session_state.pay_expense = expense
-                    st.rerun()
-                
-                if st.button("👁️ Ver Detalles", key=f"view_{expense['id']}"):
-                    st.session_state.view_expense = expense
-                    st.rerun()
-            
-            # Show comments if any
-            if expense.get('comments'):
-                st.markdown("---")
-                st.write("**💬 Comentarios del solicitante:**")
-                st.write(expense['comments'])
-            
-            if expense.get('approver_comments'):
-                st.markdown("---")
-                st.write("**💬 Comentarios del aprobador:**")
-                st.write(expense['approver_comments'])
+    # A new key clears the grid selection once the selected row has left the list
+    table_version = st.session_state.get('to_pay_table_version', 0)
+    selected_id = show_expense_table(
+        expenses,
+        key=f"to_pay_expenses_table_{table_version}",
+        extra_columns={"Comprobantes": [receipt_counts.get(e['id'], 0) for e in expenses]}
+    )
+    expense = next((e for e in expenses if e['id'] == selected_id), None)
+    
+    if not expense:
+        return
+    
+    if st.button("💳 Marcar como Pagado", key=f"pay_{expense['id']}"):
+        st.session_state.pay_expense_id = expense['id']
     
     # Payment form
-    if 'pay_expense' in st.session_state:
-        expense = st.session_state.pay_expense
-        requester = get_user_by_id(expense['user_id'])
-        
+    if st.session_state.get('pay_expense_id') == expense['id']:
         st.markdown("---")
         st.subheader("💳 Marcar como Pagado")
         
         with st.form("pay_expense_form"):
             st.write(f"**Marcando como pagado:** {expense['description']} por ${expense['amount']:.2f}")
-            st.write(f"**Solicitante:** {requester['name'] if requester else 'N/A'}")
             
             payment_date = st.date_input(
                 "📅 Fecha de pago",
@@ -175,59 +158,32 @@ if filtered_expenses:
             with col1:
                 submitted = st.form_submit_button("💳 Confirmar Pago")
             with col2:
-                if st.form_submit_button("❌ Cancelar"):
-                    del st.session_state.pay_expense
-                    st.rerun()
+                cancelled = st.form_submit_button("❌ Cancelar")
+            
+            if cancelled:
+                del st.session_state.pay_expense_id
+                st.rerun(scope="fragment")
             
             if submitted:
                 # Mark as paid
-                if mark_expense_as_paid(expense['id'], user['id'], payment_date.strftime("%Y-%m-%d")):
-                    st.success("💳 Gasto marcado como pagado exitosamente!")
-                    del st.session_state.pay_expense
-                    st.rerun()
+                if mark_expense_as_paid(expense['id'], user['id'], payment_date.strftime("%Y-%m-%d"), expense.get('updated_at')):
+                    # The expense has left the Aprobado phase: drop it from the list in place
+                    expenses.remove(expense)
+                    del st.session_state.pay_expense_id
+                    st.session_state.to_pay_table_version = table_version + 1
+                    st.toast("💳 Gasto marcado como pagado exitosamente!")
+                    st.rerun(scope="fragment")
     
-    # View expense details
-    if 'view_expense' in st.session_state:
-        expense = st.session_state.view_expense
-        requester = get_user_by_id(expense['user_id'])
-        approver = get_user_by_id(expense['approved_by'])
-        
-        st.markdown("---")
-        st.subheader("👁️ Detalles del Gasto")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write(f"**ID:** {expense['id']}")
-            st.write(f"**Solicitante:** {requester['name'] if requester else 'N/A'}")
-            st.write(f"**Email del solicitante:** {requester['email'] if requester else 'N/A'}")
-            st.write(f"**Descripción:** {expense['description']}")
-            st.write(f"**Categoría:** {expense.get('category', 'N/A')}")
-            st.write(f"**Monto:** ${expense['amount']:.2f}")
-            st.write(f"**Prioridad:** {expense.get('priority', 'N/A')}")
-        
-        with col2:
-            st.write(f"**Estado:** {expense['status']}")
-            st.write(f"**Aprobado por:** {approver['name'] if approver else 'N/A'}")
-            st.write(f"**Fecha de aprobación:** {expense['approved_at'][:10]}")
-            st.write(f"**Fecha de gasto:** {expense.get('expense_date', expense['created_at'][:10])}")
-            st.write(f"**Proveedor:** {expense.get('vendor', 'N/A')}")
-            st.write(f"**Método de pago:** {expense.get('payment_method', 'N/A')}")
-            st.write(f"**Tipo de reembolso:** {expense.get('reimbursement_type', 'N/A')}")
-        
-        if expense.get('comments'):
-            st.markdown("---")
-            st.write("**💬 Comentarios del solicitante:**")
-            st.write(expense['comments'])
-        
-        if expense.get('approver_comments'):
-            st.markdown("---")
-            st.write("**💬 Comentarios del aprobador:**")
-            st.write(expense['approver_comments'])
-        
-        if st.button("❌ Cerrar"):
-            del st.session_state.view_expense
-            st.rerun()
+    st.markdown("---")
+    st.subheader("👁️ Detalles del Gasto")
+    show_expense_detail(expense['id'])
+
+if filtered_expenses:
+    # Already ordered by priority and age on the server (priority_rank)
+    payment_panel(filtered_expenses)
+
+elif view_mode == "Mi lote" and batch_released('Aprobado'):
+    st.info("↩️ Lote liberado. Pulsa \"📥 Tomar lote\" para reclamar uno nuevo.")
 
 else:
-    st.success("🎉 ¡No hay gastos por pagar!") 
\ No newline at end of file
+    st.success("🎉 ¡No hay gastos por pagar!")
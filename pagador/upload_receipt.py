@@ -1,7 +1,6 @@
 import streamlit as st
-from functions.f_read import get_expenses_by_phase, get_expense_by_id
-from functions.f_cud import upload_payment_receipt
-from datetime import datetime
+from functions.f_read import get_expenses_without_receipts
+from functions.f_upload_queue import enqueue_upload, show_upload_jobs
 
 st.subheader("📄 Subir Comprobante de Pago")
 
@@ -12,17 +11,14 @@ if not user:
     st.error("No hay usuario autenticado.")
     st.stop()
 
-# Get approved expenses that need payment receipts
-approved_expenses = get_expenses_by_phase("Aprobado")
+# Approved expenses with no receipt yet (anti-join on payment_receipts, computed in the database)
+expenses_without_receipts = get_expenses_without_receipts()
 
-if not approved_expenses:
+if not expenses_without_receipts:
     st.info("No hay gastos aprobados que requieran comprobantes de pago.")
+    show_upload_jobs(user["id"])
     st.stop()
 
-# Filter expenses that don't have payment receipts yet
-# (This would require a function to check if receipt exists)
-expenses_without_receipts = approved_expenses
-
 st.subheader("Gastos Aprobados Pendientes de Comprobante")
 
 # Display expenses in a table
@@ -56,7 +52,7 @@ if expenses_without_receipts:
 st.subheader("Subir Comprobante de Pago")
 
 # Expense selection
-expense_options = {f"{exp['id']} - {exp['description']}": exp['id'] for exp in expenses_without_receipts}
+expense_options = {f"{exp['id']} - {exp['description']}": exp for exp in expenses_without_receipts}
 selected_expense_key = st.selectbox(
     "Seleccionar Gasto",
     options=list(expense_options.keys()),
@@ -64,10 +60,9 @@ selected_expense_key = st.selectbox(
 )
 
 if selected_expense_key:
-    selected_expense_id = expense_options[selected_expense_key]
-    
-    # Get expense details
-    expense_details = get_expense_by_id(selected_expense_id)
+    # The worklist rows are full expense rows; no need to fetch the expense again
+    expense_details = expense_options[selected_expense_key]
+    selected_expense_id = expense_details['id']
     
     if expense_details:
         # Show expense details
@@ -90,14 +85,9 @@ if selected_expense_key:
         # Submit button
         if st.button("📤 Subir Comprobante", type="primary"):
             if receipt_file:
-                # Upload the receipt
-                if upload_payment_receipt(selected_expense_id, receipt_file, user["id"]):
-                    st.success("✅ Comprobante de pago subido exitosamente!")
-                    st.balloons()
-                    
-                    # Update expense status to paid
-                    # This would require an additional function to mark expense as paid
-                    st.info("El gasto ha sido marcado como pagado.")
+                # Queue the receipt; a background worker uploads it and creates the record
+                if enqueue_upload(selected_expense_id, "receipt", receipt_file, user["id"]):
+                    st.success("✅ Comprobante en cola. Se está subiendo en segundo plano.")
                 else:
                     st.error("❌ Error al subir el comprobante de pago.")
             else:
@@ -106,3 +96,6 @@ if selected_expense_key:
         st.error("No se pudo obtener la información del gasto seleccionado.")
 else:
     st.info("Selecciona un gasto para subir su comprobante de pago.")
+
+# Background uploads queued from this page
+show_upload_jobs(user["id"])
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Purge expenses and receivers soft-deleted more than N days ago
+"""
+
+import time
+import argparse
+from archive_expenses import get_supabase_admin_client
+
+def purge_table(supabase_admin, function_name: str, params: dict, batch_size: int, pause: float) -> int:
+    """Walk one table in keyset batches through a purge RPC, returns total purged"""
+    total_purged = 0
+    batches = 0
+    after_id = 0
+    started = time.time()
+
+    while True:
+        response = supabase_admin.rpc(function_name, {
+            **params,
+            'batch_size': batch_size,
+            'after_id': after_id
+        }).execute()
+
+        result = response.data[0] if response.data else {'purged': 0, 'last_id': after_id}
+        if result['last_id'] == after_id:
+            break
+
+        after_id = result['last_id']
+        total_purged += result['purged']
+        batches += 1
+        print(f"   🧹 Batch {batches}: purged {result['purged']} (up to id {after_id})")
+
+        # Give autovacuum and concurrent writers room between batches
+        if pause:
+            time.sleep(pause)
+
+    elapsed = time.time() - started
+    rate = total_purged / elapsed if elapsed > 0 else 0
+    print(f"✅ {function_name}: {total_purged} rows in {batches} batches, {elapsed:.1f}s ({rate:.0f} rows/s)")
+    return total_purged
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Purge rows soft-deleted more than N days ago")
+    parser.add_argument("--older-than-days", type=int, default=30, help="Only purge rows deleted more than this many days ago")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows purged per transaction")
+    parser.add_argument("--pause", type=float, default=0.1, help="Seconds to wait between batches")
+    parser.add_argument("--archive", action="store_true", help="Move expenses to the archive tables instead of dropping them")
+    parser.add_argument("--tombstone-days", type=int, default=7, help="Drop read mirror tombstones older than this many days")
+    args = parser.parse_args()
+
+    print("🧹 Purging soft-deleted rows")
+    print("=" * 40)
+    print(f"   Older than: {args.older_than_days} days")
+    print(f"   Batch size: {args.batch_size}")
+    print(f"   Mode: {'archive' if args.archive else 'hard delete'}")
+
+    supabase_admin = get_supabase_admin_client()
+    if not supabase_admin:
+        return
+
+    try:
+        purge_table(supabase_admin, 'purge_deleted_expenses', {
+            'older_than_days': args.older_than_days,
+            'archive': args.archive
+        }, args.batch_size, args.pause)
+
+        purge_table(supabase_admin, 'purge_deleted_receivers', {
+            'older_than_days': args.older_than_days
+        }, args.batch_size, args.pause)
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+
+    try:
+        # Only present once db_setup/read_mirror_sync.sql has been applied
+        response = supabase_admin.rpc('prune_mirror_tombstones', {'older_than_days': args.tombstone_days}).execute()
+        print(f"✅ prune_mirror_tombstones: {response.data or 0} rows")
+    except Exception as e:
+        print(f"⚠️ Skipped read mirror tombstones: {str(e)}")
+
+if __name__ == "__main__":
+    main()
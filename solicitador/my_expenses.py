@@ -1,6 +1,10 @@
 import streamlit as st
-from functions.f_read import get_expenses_by_user, get_expense_by_id
+from functions.f_read import ExpenseQuery, get_categories
+from functions.f_working_set import get_working_set
+from functions.f_components import show_expense_detail
+from functions.f_frame import ExpenseFrame
 from functions.f_cud import update_expense, delete_expense
+from functions.f_money import format_money
 from datetime import datetime
 
 st.subheader("Mis Gastos")
@@ -12,24 +16,23 @@ if not user:
     st.error("❌ No hay usuario autenticado.")
     st.stop()
 
-# Get user's expenses
-expenses = get_expenses_by_user(user['id'])
-
 # Filters
 st.subheader("🔍 Filtros")
 
+categories = {c['description']: c['id'] for c in get_categories()}
+
 col1, col2, col3 = st.columns(3)
 
 with col1:
     status_filter = st.selectbox(
         "📊 Estado",
-        ["Todos", "pending", "approved", "rejected", "paid"]
+        ["Todos", "Creado", "Aprobado", "Rechazado", "Pagado"]
     )
 
 with col2:
     category_filter = st.selectbox(
         "📂 Categoría",
-        ["Todas", "Alimentación", "Transporte", "Hospedaje", "Materiales", "Equipamiento", "Servicios", "Otros"]
+        ["Todas"] + list(categories)
     )
 
 with col3:
@@ -38,58 +41,54 @@ with col3:
         placeholder="Buscar en descripción..."
     )
 
-# Filter expenses
-filtered_expenses = expenses
-
-if status_filter != "Todos":
-    filtered_expenses = [e for e in filtered_expenses if e['status'] == status_filter]
-
-if category_filter != "Todas":
-    filtered_expenses = [e for e in filtered_expenses if e.get('category') == category_filter]
-
-if search_query:
-    filtered_expenses = [e for e in filtered_expenses if search_query.lower() in e['description'].lower()]
+# Filters are applied by the database; only this user's matching expenses are fetched, newest first
+query = (ExpenseQuery()
+         .requester(user['id'])
+         .phase(None if status_filter == "Todos" else status_filter)
+         .category_in([categories[category_filter]] if category_filter != "Todas" else [])
+         .text(search_query))
+filtered_expenses = get_working_set(query)
 
 # Summary metrics
 if filtered_expenses:
-    total_amount = sum(e['amount'] for e in filtered_expenses)
-    pending_amount = sum(e['amount'] for e in filtered_expenses if e['status'] == 'pending')
-    approved_amount = sum(e['amount'] for e in filtered_expenses if e['status'] == 'approved')
-    paid_amount = sum(e['amount'] for e in filtered_expenses if e['status'] == 'paid')
+    # One grouped pass over the amounts instead of a sum per phase
+    frame = ExpenseFrame.from_rows(filtered_expenses)
+    phase_cents = frame.sum_by('phase')['amount_cents']
+    total_cents = frame.total_cents()
+    pending_cents = phase_cents.get('Creado', 0)
+    approved_cents = phase_cents.get('Aprobado', 0)
+    paid_cents = phase_cents.get('Pagado', 0)
     
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("💰 Total", f"${total_amount:,.2f}")
+        st.metric("💰 Total", format_money(total_cents))
     
     with col2:
-        st.metric("⏳ Pendientes", f"${pending_amount:,.2f}")
+        st.metric("⏳ Pendientes", format_money(pending_cents))
     
     with col3:
-        st.metric("✅ Aprobados", f"${approved_amount:,.2f}")
+        st.metric("✅ Aprobados", format_money(approved_cents))
     
     with col4:
-        st.metric("💳 Pagados", f"${paid_amount:,.2f}")
+        st.metric("💳 Pagados", format_money(paid_cents))
 
 # Display expenses
 st.subheader(f"📋 Mis Gastos ({len(filtered_expenses)})")
 
 if filtered_expenses:
-    # Sort by creation date (newest first)
-    filtered_expenses.sort(key=lambda x: x['created_at'], reverse=True)
-    
     for expense in filtered_expenses:
         # Status color mapping
         status_colors = {
-            'pending': '🟡',
-            'approved': '🟢',
-            'rejected': '🔴',
-            'paid': '🟦'
+            'Creado': '🟡',
+            'Aprobado': '🟢',
+            'Rechazado': '🔴',
+            'Pagado': '🟦'
         }
         
-        status_icon = status_colors.get(expense['status'], '⚪')
+        status_icon = status_colors.get(expense['phase'], '⚪')
         
-        with st.expander(f"{status_icon} ${expense['amount']:.2f} - {expense['description']} ({expense['status']})"):
+        with st.expander(f"{status_icon} ${expense['amount']:.2f} - {expense['description']} ({expense['phase']})"):
             col1, col2, col3 = st.columns([2, 2, 1])
             
             with col1:
@@ -100,7 +99,7 @@ if filtered_expenses:
                 st.write(f"**Prioridad:** {expense.get('priority', 'N/A')}")
             
             with col2:
-                st.write(f"**Estado:** {expense['status']}")
+                st.write(f"**Estado:** {expense['phase']}")
                 st.write(f"**Monto:** ${expense['amount']:.2f}")
                 st.write(f"**Proveedor:** {expense.get('vendor', 'N/A')}")
                 st.write(f"**Método de pago:** {expense.get('payment_method', 'N/A')}")
@@ -114,29 +113,32 @@ if filtered_expenses:
             
             with col3:
                 # Status-specific actions
-                if expense['status'] == 'pending':
+                if expense['phase'] == 'Creado':
                     if st.button("✏️ Editar", key=f"edit_{expense['id']}"):
-                        st.session_state.edit_expense = expense
+                        st.session_state.edit_expense_id = expense['id']
                         st.rerun()
                     
                     if st.button("🗑️ Cancelar", key=f"cancel_{expense['id']}"):
-                        if delete_expense(expense['id']):
+                        if delete_expense(expense['id'], user['id']):
                             st.success("🗑️ Gasto cancelado!")
                             st.rerun()
                 
-                elif expense['status'] == 'rejected':
+                elif expense['phase'] == 'Rechazado':
                     if expense.get('approver_comments'):
                         st.info(f"💬 Comentario: {expense['approver_comments']}")
                 
                 # View details button
                 if st.button("👁️ Ver Detalles", key=f"view_{expense['id']}"):
-                    st.session_state.view_expense = expense
+                    st.session_state.view_expense_id = expense['id']
                     st.rerun()
     
-    # Edit expense form
-    if 'edit_expense' in st.session_state:
-        expense = st.session_state.edit_expense
-        
+    # Edit expense form; the session keeps only the id, the row comes from the current list
+    edit_id = st.session_state.get('edit_expense_id')
+    expense = next((e for e in filtered_expenses if e['id'] == edit_id), None) if edit_id else None
+    if edit_id and not expense:
+        del st.session_state.edit_expense_id
+    
+    if expense:
         st.markdown("---")
         st.subheader("✏️ Editar Gasto")
         
@@ -154,7 +156,7 @@ if filtered_expenses:
                 submitted = st.form_submit_button("💾 Guardar Cambios")
             with col2:
                 if st.form_submit_button("❌ Cancelar"):
-                    del st.session_state.edit_expense
+                    del st.session_state.edit_expense_id
                     st.rerun()
             
             if submitted:
@@ -166,48 +168,19 @@ if filtered_expenses:
                     "comments": comments
                 }
                 
-                if update_expense(expense['id'], update_data):
+                if update_expense(expense['id'], update_data, user['id']):
                     st.success("✅ Gasto actualizado exitosamente!")
-                    del st.session_state.edit_expense
+                    del st.session_state.edit_expense_id
                     st.rerun()
     
     # View expense details
-    if 'view_expense' in st.session_state:
-        expense = st.session_state.view_expense
-        
+    if 'view_expense_id' in st.session_state:
         st.markdown("---")
         st.subheader("👁️ Detalles del Gasto")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write(f"**ID:** {expense['id']}")
-            st.write(f"**Descripción:** {expense['description']}")
-            st.write(f"**Categoría:** {expense.get('category', 'N/A')}")
-            st.write(f"**Monto:** ${expense['amount']:.2f}")
-            st.write(f"**Estado:** {expense['status']}")
-            st.write(f"**Prioridad:** {expense.get('priority', 'N/A')}")
-        
-        with col2:
-            st.write(f"**Fecha de gasto:** {expense.get('expense_date', expense['created_at'][:10])}")
-            st.write(f"**Proveedor:** {expense.get('vendor', 'N/A')}")
-            st.write(f"**Método de pago:** {expense.get('payment_method', 'N/A')}")
-            st.write(f"**Tipo de reembolso:** {expense.get('reimbursement_type', 'N/A')}")
-            st.write(f"**Número de recibo:** {expense.get('receipt_number', 'N/A')}")
-            st.write(f"**Creado:** {expense['created_at'][:10]}")
-        
-        if expense.get('comments'):
-            st.markdown("---")
-            st.write("**💬 Comentarios:**")
-            st.write(expense['comments'])
-        
-        if expense.get('approver_comments'):
-            st.markdown("---")
-            st.write("**💬 Comentarios del aprobador:**")
-            st.write(expense['approver_comments'])
+        show_expense_detail(st.session_state.view_expense_id)
         
         if st.button("❌ Cerrar"):
-            del st.session_state.view_expense
+            del st.session_state.view_expense_id
             st.rerun()
 
 else:
@@ -1,8 +1,7 @@
 import streamlit as st
 from functions.f_read import get_categories, get_accounts_by_category, get_receivers_by_categories, get_receivers
-from functions.f_cud import create_expense, upload_file_to_supabase, create_reimbursement
-from datetime import datetime
-import uuid
+from functions.f_cud import create_expense, create_reimbursement
+from functions.f_upload_queue import enqueue_upload, show_upload_jobs
 
 # Get current user
 user = st.session_state.user
@@ -187,14 +186,6 @@ if st.button("💾 Crear Gasto", type="primary"):
     elif is_reimbursement and not reimbursement_receiver_id:
         st.error("❌ Por favor selecciona un recibidor para el reembolso.")
     else:
-        # Upload quotation file if provided
-        quotation_info = None
-        if quotation_file:
-            quotation_info = upload_file_to_supabase(quotation_file, "quotes")
-            if not quotation_info:
-                st.error("Error al subir el archivo de cotización.")
-                st.stop()
-        
         # Get vendor name from selected provider
         category_ids = [category_options[cat] for cat in selected_categories]
         available_receivers = get_receivers_by_categories(category_ids)
@@ -214,17 +205,23 @@ if st.button("💾 Crear Gasto", type="primary"):
             "status": "pending"
         }
         
-        # Add quotation info if uploaded
-        if quotation_info:
-            expense_data.update({
-                "quotation_file_url": quotation_info["file_url"],
-                "quotation_file_name": quotation_info["file_name"],
-                "quotation_file_size": quotation_info["file_size"]
-            })
-        
         # Create the expense
         new_expense = create_expense(expense_data)
         if new_expense:
+            # The quotation is uploaded in the background; the expense is already saved
+            if quotation_file:
+                queued = enqueue_upload(
+                    expense_id=new_expense['id'],
+                    kind="quote",
+                    file=quotation_file,
+                    created_by=user["id"],
+                    payload={"receiver_id": selected_provider, "total": amount, "descripcion": description}
+                )
+                if queued:
+                    st.info("📤 La cotización se está subiendo en segundo plano.")
+                else:
+                    st.warning("⚠️ Gasto creado pero no se pudo subir la cotización.")
+            
             # If it's a reimbursement, create the reimbursement record
             if is_reimbursement and reimbursement_receiver_id:
                 reimbursement_created = create_reimbursement(
@@ -240,4 +237,7 @@ if st.button("💾 Crear Gasto", type="primary"):
                 st.success("✅ Gasto creado exitosamente!")
             st.balloons()
         else:
-            st.error("❌ Error al crear el gasto. Por favor intenta de nuevo.") 
\ No newline at end of file
+            st.error("❌ Error al crear el gasto. Por favor intenta de nuevo.") 
+
+# Background uploads queued from this page
+show_upload_jobs(user["id"])
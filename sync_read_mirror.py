@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Keep the local SQLite read mirror in sync with Supabase (see functions/f_read_mirror.py)
+"""
+
+import time
+import argparse
+from archive_expenses import get_supabase_admin_client
+from functions.f_read_mirror import ReadMirror, MIRROR_PATH, SYNC_INTERVAL
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Incrementally copy Supabase tables into the local read mirror")
+    parser.add_argument("--path", default=MIRROR_PATH, help="SQLite file of the mirror")
+    parser.add_argument("--interval", type=float, default=SYNC_INTERVAL, help="Seconds between sync passes")
+    parser.add_argument("--once", action="store_true", help="Run one pass and exit")
+    parser.add_argument("--rebuild", action="store_true", help="Drop the mirrored rows and copy every table again")
+    args = parser.parse_args()
+
+    print("🪞 Read mirror sync")
+    print("=" * 40)
+    print(f"   Mirror: {args.path}")
+    print(f"   Mode: {'single pass' if args.once else f'every {args.interval:g}s'}")
+
+    supabase_admin = get_supabase_admin_client()
+    if not supabase_admin:
+        return
+
+    mirror = ReadMirror(args.path)
+    if args.rebuild:
+        mirror.rebuild()
+        print("   🧹 Mirror emptied, copying every table")
+
+    try:
+        if args.once:
+            started = time.time()
+            changed = mirror.sync_once(supabase_admin)
+            print(f"✅ Synced in {time.time() - started:.1f}s; changed: {', '.join(sorted(changed)) or 'nothing'}")
+        else:
+            # Same loop the app runs in-process; the lease keeps one syncer per mirror file
+            mirror.run(supabase_admin, args.interval)
+    except KeyboardInterrupt:
+        print("👋 Stopped")
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+
+if __name__ == "__main__":
+    main()
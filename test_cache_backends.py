@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Exercise the f_cache_backends stores (memory LRU, SQLite, Redis protocol) against a fake clock.
+Runs under pytest, or directly: python test_cache_backends.py
+"""
+
+import os
+import fnmatch
+import tempfile
+import functions.f_cache_backends as backends
+from functions.f_cache_backends import MemoryLRUBackend, SQLiteBackend, RedisBackend
+
+class FakeClock:
+    """Stands in for the time module so TTLs expire without sleeping"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+class FakeRedis:
+    """Local stand-in for the Redis commands RedisBackend uses (GET, SET PX, DELETE, SADD, PEXPIRE NX/GT, SMEMBERS, SCAN)"""
+
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.data = {}
+        self.expires_at = {}
+
+    def _alive(self, key: str) -> bool:
+        if key in self.expires_at and self.expires_at[key] <= self.clock.time():
+            self.data.pop(key, None)
+            self.expires_at.pop(key, None)
+        return key in self.data
+
+    def get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    def set(self, key, value, px=None):
+        self.data[key] = value
+        self.expires_at.pop(key, None)
+        if px is not None:
+            self.expires_at[key] = self.clock.time() + px / 1000
+        return True
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                removed += 1
+            self.data.pop(key, None)
+            self.expires_at.pop(key, None)
+        return removed
+
+    def sadd(self, key, *members):
+        members_set = self.data[key] if self._alive(key) else set()
+        members_set.update(m.encode() if isinstance(m, str) else m for m in members)
+        self.data[key] = members_set
+        return len(members)
+
+    def pexpire(self, key, ms, nx=False, gt=False):
+        if not self._alive(key):
+            return False
+        expires_at = self.clock.time() + ms / 1000
+        current = self.expires_at.get(key)
+        # NX: only without a TTL; GT: only to a later expiry (no TTL counts as never expiring)
+        if (nx and current is not None) or (gt and (current is None or expires_at <= current)):
+            return False
+        self.expires_at[key] = expires_at
+        return True
+
+    def smembers(self, key):
+        return set(self.data[key]) if self._alive(key) else set()
+
+    def scan_iter(self, match="*"):
+        return iter([k for k in list(self.data) if self._alive(k) and fnmatch.fnmatchcase(k, match)])
+
+def make_backends(clock: FakeClock, directory: str):
+    return {
+        "memory": MemoryLRUBackend(max_entries=16),
+        "sqlite": SQLiteBackend(os.path.join(directory, "cache.sqlite3")),
+        "redis": RedisBackend(FakeRedis(clock)),
+    }
+
+def check_get_set(backend) -> None:
+    assert backend.get("missing") is None
+    backend.set("a", b"1", ttl=60)
+    assert backend.get("a") == b"1"
+    backend.set("a", b"2", ttl=60)
+    assert backend.get("a") == b"2"
+    backend.delete("a")
+    assert backend.get("a") is None
+
+def check_ttl_expiry(backend, clock: FakeClock) -> None:
+    backend.set("short", b"s", ttl=5)
+    backend.set("long", b"l", ttl=60)
+    clock.advance(4)
+    assert backend.get("short") == b"s"
+    clock.advance(2)
+    assert backend.get("short") is None
+    assert backend.get("long") == b"l"
+
+def check_invalidate_tags(backend) -> None:
+    backend.set("expenses-1", b"e1", ttl=60, tags=["expenses"])
+    backend.set("expenses-2", b"e2", ttl=60, tags=["expenses", "reports"])
+    backend.set("categories", b"c", ttl=60, tags=["categories"])
+    backend.set("untagged", b"u", ttl=60)
+    backend.invalidate_tags("expenses")
+    assert backend.get("expenses-1") is None
+    assert backend.get("expenses-2") is None
+    assert backend.get("categories") == b"c"
+    assert backend.get("untagged") == b"u"
+    # A key written after the invalidation is cached again and reachable through its tag
+    backend.set("expenses-1", b"e1", ttl=60, tags=["expenses"])
+    assert backend.get("expenses-1") == b"e1"
+    backend.invalidate_tags("expenses", "categories")
+    assert backend.get("expenses-1") is None
+    assert backend.get("categories") is None
+    assert backend.get("untagged") == b"u"
+
+def check_clear(backend) -> None:
+    backend.set("a", b"1", ttl=60, tags=["t"])
+    backend.set("b", b"2", ttl=60)
+    backend.clear()
+    assert backend.get("a") is None
+    assert backend.get("b") is None
+    backend.invalidate_tags("t")  # nothing left to drop; must not fail
+
+def run_all(clock: FakeClock, directory: str) -> None:
+    for backend in make_backends(clock, directory).values():
+        for check in (check_get_set, check_invalidate_tags, check_clear):
+            check(backend)
+        check_ttl_expiry(backend, clock)
+        backend.clear()
+
+def test_backends(monkeypatch, tmp_path):
+    """get/set/TTL expiry/invalidate_tags/clear behave the same on every backend"""
+    clock = FakeClock()
+    monkeypatch.setattr(backends, "time", clock)
+    run_all(clock, str(tmp_path))
+
+def test_memory_lru_eviction():
+    """The least recently read entry is evicted first, and leaves its tag sets"""
+    backend = MemoryLRUBackend(max_entries=2)
+    backend.set("a", b"1", ttl=60, tags=["t"])
+    backend.set("b", b"2", ttl=60, tags=["t"])
+    assert backend.get("a") == b"1"
+    backend.set("c", b"3", ttl=60)
+    assert backend.get("b") is None
+    assert backend.get("a") == b"1"
+    assert backend._tags["t"] == {"a"}
+
+def test_sqlite_prune(monkeypatch, tmp_path):
+    """Every PRUNE_EVERY writes, expired entries and their tag rows are deleted"""
+    clock = FakeClock()
+    monkeypatch.setattr(backends, "time", clock)
+    backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    backend.PRUNE_EVERY = 3
+    backend.set("old", b"o", ttl=5, tags=["t"])
+    clock.advance(10)
+    backend.set("new-1", b"1", ttl=60, tags=["t"])
+    backend.set("new-2", b"2", ttl=60)
+    keys = {row[0] for row in backend._conn.execute("SELECT key FROM cache_entries")}
+    tagged = {row[0] for row in backend._conn.execute("SELECT key FROM cache_tags")}
+    assert keys == {"new-1", "new-2"}
+    assert tagged == {"new-1"}
+
+def test_redis_tag_sets_expire(monkeypatch):
+    """Tag sets live as long as their longest-lived key, and clear() only touches the prefix"""
+    clock = FakeClock()
+    client = FakeRedis(clock)
+    client.set("other:key", b"x")
+    backend = RedisBackend(client)
+    backend.set("a", b"1", ttl=5, tags=["t"])
+    backend.set("b", b"2", ttl=30, tags=["t"])
+    clock.advance(10)
+    assert client.smembers("pagos:cache:tag:t") == {b"a", b"b"}
+    clock.advance(30)
+    assert client.smembers("pagos:cache:tag:t") == set()
+    backend.set("c", b"3", ttl=60)
+    backend.clear()
+    assert backend.get("c") is None
+    assert client.get("other:key") == b"x"
+
+def test_redis_short_ttl_keeps_tag_set(monkeypatch):
+    """A short-TTL write does not shorten the tag set of a longer-lived key"""
+    clock = FakeClock()
+    backend = RedisBackend(FakeRedis(clock))
+    backend.set("long", b"l", ttl=60, tags=["t"])
+    backend.set("short", b"s", ttl=5, tags=["t"])
+    clock.advance(10)
+    assert backend.get("long") == b"l"
+    backend.invalidate_tags("t")
+    assert backend.get("long") is None
+
+def test_cache_backend_is_abstract():
+    """Backends must implement every method"""
+    class Partial(backends.CacheBackend):
+        def get(self, key):
+            return None
+    try:
+        Partial()
+    except TypeError:
+        return
+    raise AssertionError("CacheBackend subclasses missing methods should not instantiate")
+
+def main():
+    """Main function"""
+    print("🧪 Cache backend checks")
+    print("=" * 40)
+    original_time = backends.time
+    clock = FakeClock()
+    backends.time = clock
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            run_all(clock, directory)
+        print("✅ memory, sqlite and redis backends passed")
+    except AssertionError:
+        print("❌ A cache backend check failed")
+        raise
+    finally:
+        backends.time = original_time
+
+if __name__ == "__main__":
+    main()
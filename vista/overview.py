@@ -1,6 +1,7 @@
 import streamlit as st
 from functions.f_read import get_expense_statistics, get_recent_expenses, get_all_expenses
 from functions.f_read import get_pending_expenses, get_approved_expenses, get_paid_expenses
+from functions.f_money import format_money, mean_cents
 import plotly.express as px
 from datetime import datetime, timedelta
 
@@ -31,7 +32,7 @@ with col1:
 with col2:
     st.metric(
         label="Monto Total",
-        value=f"${stats.get('total_amount', 0):,.2f}",
+        value=format_money(stats.get('total_amount_cents', 0)),
         delta=None
     )
 
@@ -67,10 +68,10 @@ with col2:
     )
 
 with col3:
-    avg_amount = stats.get('total_amount', 0) / stats.get('total_expenses', 1) if stats.get('total_expenses', 0) > 0 else 0
+    avg_cents = mean_cents(stats.get('total_amount_cents', 0), stats.get('total_expenses', 0))
     st.metric(
         label="Promedio",
-        value=f"${avg_amount:,.2f}",
+        value=format_money(avg_cents),
         delta=None
     )
 